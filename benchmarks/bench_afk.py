@@ -0,0 +1,48 @@
+import asyncio
+import random
+import time
+import irc_pugbot.afk
+
+
+def per_player_handles(loop, nicks, events, timeout):
+    handles = {nick: loop.call_later(timeout, print, nick) for nick in nicks}
+    start = time.perf_counter()
+    for nick in events:
+        handles[nick].cancel()
+        handles[nick] = loop.call_later(timeout, print, nick)
+    elapsed = time.perf_counter() - start
+    for handle in handles.values():
+        handle.cancel()
+    return elapsed
+
+
+def timer_wheel(loop, nicks, events, timeout):
+    tracker = irc_pugbot.afk.AfkTracker(loop, timeout, 60, print, print)
+    for nick in nicks:
+        tracker.track(nick)
+    start = time.perf_counter()
+    for nick in events:
+        tracker.active(nick)
+    elapsed = time.perf_counter() - start
+    for nick in nicks:
+        tracker.untrack(nick)
+    return elapsed
+
+
+def main(player_counts=(100, 1000, 10000), event_count=200000, timeout=600, seed=0):
+    rng = random.Random(seed)
+    loop = asyncio.new_event_loop()
+    try:
+        for player_count in player_counts:
+            nicks = ['player{0}'.format(i) for i in range(player_count)]
+            events = [rng.choice(nicks) for i in range(event_count)]
+            handles = per_player_handles(loop, nicks, events, timeout)
+            wheel = timer_wheel(loop, nicks, events, timeout)
+            print('{0:6d} players: call_later {1:6.2f}us/event, timer wheel {2:6.2f}us/event'.format(
+                player_count, handles / event_count * 1e6, wheel / event_count * 1e6))
+    finally:
+        loop.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+import random
+import sys
+import time
+import irc_pugbot.history
+import irc_pugbot.pug
+
+
+def random_game(nicks, rng):
+    players = rng.sample(nicks, 20)
+    teams = [dict(zip(irc_pugbot.pug.CLASSES, players[:9])), dict(zip(irc_pugbot.pug.CLASSES, players[9:18]))]
+    picks = [(i % 2, class_, teams[i % 2][class_]) for i, class_ in enumerate(irc_pugbot.pug.CLASSES[1:] * 2)]
+    return teams, picks, players[18:]
+
+
+def main(player_counts=(1000, 10000, 50000), games=20000, lookups=200000, seed=0):
+    rng = random.Random(seed)
+    for player_count in player_counts:
+        nicks = ['player{0}'.format(i) for i in range(player_count)]
+        # a core of regulars plays most games so pairs repeat as they do on a real server
+        regulars = nicks[:min(200, player_count)]
+        history = irc_pugbot.history.PickHistory()
+        start = time.perf_counter()
+        for _ in range(games):
+            pool = regulars if rng.random() < 0.7 else nicks
+            history.record(*random_game(pool, rng))
+        record_time = time.perf_counter() - start
+        pairs = [(rng.choice(regulars), rng.choice(nicks)) for _ in range(lookups)]
+        start = time.perf_counter()
+        for a, b in pairs:
+            history.is_combo(a, b)
+        lookup_time = time.perf_counter() - start
+        print('{0:6d} players: record {1:6.1f}us/game  lookup {2:5.2f}us  {3:8d} pairs  {4:6.1f}MB matrix'.format(
+            player_count, record_time / games * 1e6, lookup_time / lookups * 1e6, len(history.pairs),
+            sys.getsizeof(history.pairs) / 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+import unittest.mock
+import irc.bot
+import irc.parser
+import irc_pugbot.irc
+import irc_pugbot.manager
+import irc_pugbot.pug
+from benchmarks.fakeserver import FakeIrcServer
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+CHANNEL = '#pug'
+PROBE_NICK = 'benchprobe'
+PROBE_CLASS = 'medic'
+HIGHER_IS_BETTER = ('commands_per_second',)
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(int(len(samples) * fraction), len(samples) - 1)]
+
+
+def connect_to(server, loop):
+    @asyncio.coroutine
+    def connect(*args):
+        return (yield from loop.create_connection(
+            lambda: irc.parser.StreamProtocol(loop=loop), '127.0.0.1', server.port))
+    return connect
+
+
+class Driver:
+    """Simulated clients churning add/remove/need/pick/nick against IrcPug"""
+
+    def __init__(self, server, ircpug, clients, rng):
+        self.server = server
+        self.ircpug = ircpug
+        self.rng = rng
+        self.nicks = ['client{0}'.format(i) for i in range(clients)]
+        self.renames = itertools.count()
+
+    def pick(self):
+        for pug in self.ircpug.manager.picking_pugs(CHANNEL):
+            captain = pug.captains[pug.picking_team]
+            team = pug.teams[pug.picking_team]
+            for nick, player in pug.staged_players.items():
+                free = [c for c in player.classes if c not in team]
+                if free:
+                    self.server.send_as(captain, CHANNEL, ';pick {0} {1}'.format(nick, free[0]))
+                    return True
+        return False
+
+    def step(self):
+        roll = self.rng.random()
+        i = self.rng.randrange(len(self.nicks))
+        nick = self.nicks[i]
+        if roll < 0.45:
+            classes = self.rng.sample(irc_pugbot.pug.CLASSES, self.rng.randint(1, 3))
+            if self.rng.random() < 0.2:
+                classes.append('captain')
+            self.server.send_as(nick, CHANNEL, ';add {0}'.format(' '.join(classes)))
+        elif roll < 0.65:
+            self.server.send_as(nick, CHANNEL, ';remove')
+        elif roll < 0.75:
+            self.server.send_as(nick, CHANNEL, ';need')
+        elif roll < 0.95:
+            if not self.pick():
+                self.server.send_as(nick, CHANNEL, ';need')
+        else:
+            new_nick = 'renamed{0}'.format(next(self.renames))
+            self.server.nick_change(nick, new_nick)
+            self.nicks[i] = new_nick
+
+    @asyncio.coroutine
+    def probe(self):
+        """Round trip of a ;list from a nick outside the churn; the churn never sends ;list"""
+        probe = self.server.probe('{0}s:'.format(PROBE_CLASS))
+        self.server.send_as(PROBE_NICK, CHANNEL, ';list {0}'.format(PROBE_CLASS))
+        return (yield from asyncio.wait_for(probe, 10, loop=self.server.loop))
+
+    @asyncio.coroutine
+    def run(self, commands, probe_every):
+        latencies = []
+        start = time.perf_counter()
+        for i in range(commands):
+            self.step()
+            if i % probe_every == 0:
+                latencies.append((yield from self.probe()))
+        yield from self.probe()
+        return time.perf_counter() - start, latencies
+
+
+def measure_throughput(clients, commands, probe_every, seed):
+    loop = asyncio.new_event_loop()
+    server = FakeIrcServer(loop)
+    loop.run_until_complete(server.start())
+    bot = irc.bot.IrcBot('127.0.0.1', 'pugbot', loop=loop)
+    bot.config.update({'TF2_PUG_CHANNEL': CHANNEL, 'TF2_PUG_SEND_RATE': 1e9, 'TF2_PUG_SEND_BURST': 1e9})
+    ircpug = irc_pugbot.irc.IrcPug(bot)
+    try:
+        with unittest.mock.patch('irc.client._connect', new=connect_to(server, loop)):
+            loop.run_until_complete(bot.start())
+            loop.run_until_complete(asyncio.wait_for(server.connected, 10, loop=loop))
+            driver = Driver(server, ircpug, clients, random.Random(seed))
+            elapsed, latencies = loop.run_until_complete(driver.run(commands, probe_every))
+    finally:
+        server.close()
+        loop.close()
+    return {
+        'commands_per_second': (commands + len(latencies)) / elapsed,
+        'p50_latency_ms': percentile(latencies, 0.5) * 1000,
+        'p99_latency_ms': percentile(latencies, 0.99) * 1000,
+    }
+
+
+def measure_lobby_memory(lobbies, players_per_lobby, seed):
+    rng = random.Random(seed)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    manager = irc_pugbot.manager.PugManager(irc_pugbot.pug.Tf2HighlanderPug)
+    for i in range(lobbies):
+        channel = '#pug{0}'.format(i)
+        manager.add_channel(channel)
+        pug = manager.open_pug(channel)
+        for j in range(players_per_lobby):
+            pug.add('{0}_player{1}'.format(channel, j), rng.sample(irc_pugbot.pug.CLASSES, rng.randint(1, 3)), rng.random() < 0.2)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return {'bytes_per_lobby': (after - before) / lobbies}
+
+
+def measure(args):
+    """Median of each result over args.runs runs"""
+    runs = []
+    for _ in range(args.runs):
+        results = measure_throughput(args.clients, args.commands, args.probe_every, args.seed)
+        results.update(measure_lobby_memory(args.lobbies, 24, args.seed))
+        runs.append(results)
+    return {name: statistics.median(results[name] for results in runs) for name in runs[0]}
+
+
+def baseline(results, args):
+    return {
+        'machine': platform.node(),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'python': platform.python_version(),
+        'runs': args.runs,
+        'options': {'clients': args.clients, 'commands': args.commands, 'probe_every': args.probe_every,
+                    'lobbies': args.lobbies, 'seed': args.seed},
+        'results': results,
+    }
+
+
+def check(results, recorded, tolerance):
+    """Results worse than the recorded baseline by more than tolerance, as a fraction of it"""
+    failures = []
+    for name, value in sorted(results.items()):
+        expected = recorded['results'].get(name)
+        if expected is None:
+            continue
+        if name in HIGHER_IS_BETTER:
+            if value < expected * (1 - tolerance):
+                failures.append('{0} {1:.1f} below baseline {2:.1f}'.format(name, value, expected))
+        elif value > expected * (1 + tolerance):
+            failures.append('{0} {1:.1f} above baseline {2:.1f}'.format(name, value, expected))
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Drive IrcPug through a local fake IRC server')
+    parser.add_argument('--clients', type=int, default=300)
+    parser.add_argument('--commands', type=int, default=20000)
+    parser.add_argument('--probe-every', type=int, default=50)
+    parser.add_argument('--lobbies', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--runs', type=int, default=3, help='report the median of this many runs')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--record', action='store_true', help='record the results as the baseline of this machine')
+    parser.add_argument('--check', action='store_true', help='exit non-zero when a result regresses past the baseline, skipped without one')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args(argv)
+    if args.check and not args.record and not os.path.exists(args.baseline):
+        print('SKIPPED: no baseline at {0}; run with --record on the CI machine to enable the regression check'.format(
+            args.baseline))
+        return 0
+    results = measure(args)
+    for name, value in sorted(results.items()):
+        print('{0:>20}: {1:.2f}'.format(name, value))
+    if args.record:
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline(results, args), f, indent=4, sort_keys=True)
+    elif args.check:
+        with open(args.baseline) as f:
+            recorded = json.load(f)
+        print('Baseline: {0} runs on {1} ({2}, python {3})'.format(
+            recorded['runs'], recorded['machine'], recorded['processor'], recorded['python']))
+        failures = check(results, recorded, args.tolerance)
+        for failure in failures:
+            print('REGRESSION: ' + failure)
+        return 1 if failures else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
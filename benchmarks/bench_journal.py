@@ -0,0 +1,59 @@
+import asyncio
+import os
+import random
+import shutil
+import tempfile
+import time
+import irc_pugbot.journal
+import irc_pugbot.manager
+import irc_pugbot.pug
+
+
+def write_journal(path, loop, events, channel_count, rng):
+    journal = irc_pugbot.journal.Journal(path, loop=loop, snapshot_interval=events + 1)
+    manager = irc_pugbot.manager.PugManager(irc_pugbot.pug.Tf2HighlanderPug)
+    journal.attach(manager)
+    channels = ['#pug{0}'.format(i) for i in range(channel_count)]
+    for channel in channels:
+        manager.add_channel(channel)
+    while journal.seq < events:
+        pug = manager.open_pug(rng.choice(channels))
+        nick = 'nick{0}'.format(rng.randrange(30))
+        if nick in pug.unstaged_players and rng.random() < 0.5:
+            pug.remove(nick)
+        else:
+            pug.add(nick, rng.sample(irc_pugbot.pug.CLASSES, rng.randint(1, 3)), rng.random() < 0.2)
+        if len(journal.pending) >= 10000:
+            journal.flush()
+    loop.run_until_complete(journal.flush())
+    journal.executor.shutdown()
+
+
+def main(events=1000000, channel_count=24, seed=0):
+    rng = random.Random(seed)
+    loop = asyncio.new_event_loop()
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'pug')
+    try:
+        start = time.perf_counter()
+        write_journal(path, loop, events, channel_count, rng)
+        written = time.perf_counter() - start
+        size = os.path.getsize(path + '.journal')
+        start = time.perf_counter()
+        journal = irc_pugbot.journal.Journal(path, loop=loop)
+        state, entries = journal.load()
+        loaded = time.perf_counter() - start
+        manager = irc_pugbot.manager.PugManager(irc_pugbot.pug.Tf2HighlanderPug)
+        for key, event, args in entries:
+            manager.apply(key, event, args)
+        replayed = time.perf_counter() - start
+        journal.executor.shutdown()
+        print('{0} events ({1:.1f} MB): record {2:.2f}s, parse {3:.2f}s, replay total {4:.2f}s ({5:.0f} events/s)'.format(
+            len(entries), size / 1e6, written, loaded, replayed, len(entries) / replayed))
+    finally:
+        shutil.rmtree(directory)
+        loop.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+import asyncio
+import os
+import random
+import shutil
+import tempfile
+import time
+import irc_pugbot.logs
+
+TEMPLATES = [
+    'L 10/18/2026 - 20:{m:02d}:{s:02d}: "{a}<{i}><[U:1:{i}]><Red>" triggered "damage" against '
+    '"{b}<{j}><[U:1:{j}]><Blue>" (damage "{n}") (weapon "tf_projectile_rocket")\n',
+    'L 10/18/2026 - 20:{m:02d}:{s:02d}: "{a}<{i}><[U:1:{i}]><Red>" killed "{b}<{j}><[U:1:{j}]><Blue>" '
+    'with "scattergun" (attacker_position "0 0 0") (victim_position "1 1 1")\n',
+    'L 10/18/2026 - 20:{m:02d}:{s:02d}: "{a}<{i}><[U:1:{i}]><Red>" triggered "healed" against '
+    '"{b}<{j}><[U:1:{j}]><Blue>" (healing "{n}")\n',
+    'L 10/18/2026 - 20:{m:02d}:{s:02d}: "{a}<{i}><[U:1:{i}]><Red>" triggered "kill assist" against '
+    '"{b}<{j}><[U:1:{j}]><Blue>" (assister_position "0 0 0")\n',
+    'L 10/18/2026 - 20:{m:02d}:{s:02d}: "{a}<{i}><[U:1:{i}]><Red>" say "gg"\n',
+    'L 10/18/2026 - 20:{m:02d}:{s:02d}: World triggered "Round_Start"\n',
+]
+
+
+def write_corpus(directory, games, lines, players, rng):
+    paths = []
+    names = ['player{0}'.format(i) for i in range(players)]
+    for game in range(games):
+        path = os.path.join(directory, 'L{0:04d}.log'.format(game))
+        with open(path, 'w') as f:
+            for line in range(lines):
+                i, j = rng.sample(range(players), 2)
+                f.write(rng.choice(TEMPLATES).format(m=line // 60 % 60, s=line % 60, a=names[i], b=names[j],
+                                                     i=i, j=j, n=rng.randint(1, 150)))
+        paths.append(path)
+    return paths
+
+
+@asyncio.coroutine
+def ingest_all(pipeline, paths):
+    return (yield from asyncio.gather(*[pipeline.ingest(path) for path in paths], loop=pipeline.loop))
+
+
+def main(games=16, lines=50000, players=18, workers=4, seed=0):
+    rng = random.Random(seed)
+    directory = tempfile.mkdtemp()
+    try:
+        paths = write_corpus(directory, games, lines, players, rng)
+        total = games * lines
+        print('corpus: {0} logs, {1} lines, {2:.1f}MB'.format(
+            games, total, sum(os.path.getsize(path) for path in paths) / 1e6))
+
+        start = time.perf_counter()
+        sequential = [irc_pugbot.logs.parse_log(path) for path in paths]
+        elapsed = time.perf_counter() - start
+        print('sequential:        {0:7.2f}s  {1:9.0f} lines/s'.format(elapsed, total / elapsed))
+
+        loop = asyncio.new_event_loop()
+        pipeline = irc_pugbot.logs.IngestPipeline(loop, workers=workers)
+        try:
+            loop.run_until_complete(pipeline.ingest(paths[0]))
+            start = time.perf_counter()
+            results = loop.run_until_complete(ingest_all(pipeline, paths))
+            elapsed = time.perf_counter() - start
+        finally:
+            pipeline.close()
+            loop.close()
+        print('pipeline {0} procs: {1:7.2f}s  {2:9.0f} lines/s'.format(workers, elapsed, total / elapsed))
+        if [totals for totals, _ in results] != sequential:
+            print('  MISMATCH: pipeline totals differ from sequential parsing')
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+import random
+import time
+import irc_pugbot.irc
+import irc_pugbot.pug
+from benchmarks.utils import RecordingBot, VirtualLoop, command, run_command
+
+
+def main(channel_count=48, commands=50000, seed=0):
+    rng = random.Random(seed)
+    loop = VirtualLoop()
+    channels = ['#pug{0}'.format(i) for i in range(channel_count)]
+    config = {'TF2_PUG_CHANNEL': channels[0], 'TF2_PUG_CHANNELS': channels[1:],
+              'TF2_PUG_SEND_RATE': 1e9, 'TF2_PUG_SEND_BURST': 1e9}
+    bot = RecordingBot(config, loop)
+    ircpug = irc_pugbot.irc.IrcPug(bot)
+    start = time.perf_counter()
+    for i in range(commands):
+        channel = rng.choice(channels)
+        nick = '{0}_nick{1}'.format(channel, rng.randrange(40))
+        roll = rng.random()
+        if roll < 0.6:
+            classes = rng.sample(irc_pugbot.pug.CLASSES, rng.randint(1, 3))
+            if rng.random() < 0.2:
+                classes.append('captain')
+            run_command(ircpug.add_command(bot, command(nick, channel, classes=classes)))
+        elif roll < 0.9:
+            run_command(ircpug.remove_command(bot, command(nick, channel)))
+        else:
+            run_command(ircpug.need_command(bot, command(nick, channel)))
+    elapsed = time.perf_counter() - start
+    lobbies = sum(1 for _ in ircpug.manager)
+    print('{0} channels, {1} lobbies: {2:.0f} commands/s, {3} messages sent'.format(
+        channel_count, lobbies, commands / elapsed, bot.sent))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+import random
+import time
+import irc_pugbot.matching
+import irc_pugbot.pug
+
+
+def churn(matcher, pool_size, operations, rng):
+    timings = []
+    for i in range(operations):
+        nick = 'nick{0}'.format(rng.randrange(pool_size))
+        if nick in matcher and rng.random() < 0.5:
+            start = time.perf_counter()
+            matcher.remove(nick)
+        else:
+            classes = rng.sample(irc_pugbot.pug.CLASSES, rng.randint(1, 3))
+            start = time.perf_counter()
+            matcher.add(nick, classes)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main(pool_sizes=(20, 100, 500, 2000), operations=20000, seed=0):
+    rng = random.Random(seed)
+    for pool_size in pool_sizes:
+        matcher = irc_pugbot.matching.SlotMatcher({c: 2 for c in irc_pugbot.pug.CLASSES})
+        timings = sorted(churn(matcher, pool_size, operations, rng))
+        print('pool {0:5d}: mean {1:7.2f}us  p99 {2:7.2f}us  max {3:8.2f}us'.format(
+            pool_size,
+            sum(timings) / len(timings) * 1e6,
+            timings[int(len(timings) * 0.99)] * 1e6,
+            timings[-1] * 1e6))
+
+
+if __name__ == '__main__':
+    main()
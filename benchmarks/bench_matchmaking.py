@@ -0,0 +1,43 @@
+import random
+import time
+import irc_pugbot.formats
+import irc_pugbot.matchmaking
+import irc_pugbot.pug
+import irc_pugbot.ratings
+
+
+def random_queue(format_, size, rng):
+    classes = format_.allowed_classes
+    return {'player{0}'.format(i): irc_pugbot.pug.Player(rng.sample(classes, rng.randint(1, min(3, len(classes)))))
+            for i in range(size)}
+
+
+def main(pool_sizes=(18, 50, 100, 500, 2000), trials=200, seed=0, target_ms=10):
+    rng = random.Random(seed)
+    ratings = irc_pugbot.ratings.Ratings()
+    for format_ in (irc_pugbot.formats.HIGHLANDER, irc_pugbot.formats.SIXES, irc_pugbot.formats.FOURS):
+        print(format_.name)
+        for pool_size in pool_sizes:
+            timings = []
+            formed = 0
+            for i in range(trials):
+                players = random_queue(format_, pool_size, rng)
+                for nick in players:
+                    ratings.ratings[nick] = rng.gauss(1500, 200)
+                start = time.perf_counter()
+                teams = irc_pugbot.matchmaking.form_game(players, format_, ratings)
+                timings.append(time.perf_counter() - start)
+                formed += teams is not None
+            timings.sort()
+            print('  pool {0:5d}: mean {1:6.2f}ms  p99 {2:6.2f}ms  max {3:6.2f}ms  formed {4:3d}/{5}'.format(
+                pool_size,
+                sum(timings) / len(timings) * 1e3,
+                timings[int(len(timings) * 0.99)] * 1e3,
+                timings[-1] * 1e3,
+                formed, trials))
+            if pool_size == 500 and timings[-1] * 1e3 > target_ms:
+                print('  SLOW: forming a game from 500 players took over {0}ms'.format(target_ms))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,29 @@
+import asyncio
+import time
+import irc_pugbot.metrics
+from benchmarks.utils import run_command
+
+
+@asyncio.coroutine
+def handler(bot, message):
+    return message
+
+
+def main(calls=100000, repeats=15):
+    metrics = irc_pugbot.metrics.Metrics()
+    wrapped = metrics.wrap('need', handler)
+    functions = [('plain', handler), ('instrumented', wrapped)]
+    timings = {name: float('inf') for name, _ in functions}
+    for _ in range(repeats):
+        for name, function in functions:
+            start = time.perf_counter()
+            for i in range(calls):
+                run_command(function(None, i))
+            timings[name] = min(timings[name], (time.perf_counter() - start) / calls)
+    print('best of {0}: plain {1:.3f}us, instrumented {2:.3f}us, overhead {3:.3f}us per call'.format(
+        repeats, timings['plain'] * 1e6, timings['instrumented'] * 1e6,
+        (timings['instrumented'] - timings['plain']) * 1e6))
+
+
+if __name__ == '__main__':
+    main()
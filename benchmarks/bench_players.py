@@ -0,0 +1,62 @@
+import random
+import time
+import tracemalloc
+import irc_pugbot.pug
+
+
+def tuple_need_highlander(players):
+    """need_highlander as it was over (classes, captain) tuples"""
+    class_count = {c: 2 for c in irc_pugbot.pug.CLASSES}
+    captain_count = 2
+    player_count = 18
+    for nick, (classes, captain) in players.items():
+        player_count -= 1
+        if captain and captain_count > 0:
+            captain_count -= 1
+        for class_ in classes:
+            if class_count[class_] > 0:
+                class_count[class_] -= 1
+    class_count = {class_: count for class_, count in class_count.items() if count > 0}
+    return captain_count, player_count, class_count
+
+
+def build(entries, make):
+    tracemalloc.start()
+    players = {nick: make(classes, captain) for nick, classes, captain in entries}
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return players, size
+
+
+def timed(function, players, repeat):
+    start = time.perf_counter()
+    for i in range(repeat):
+        function(players)
+    return (time.perf_counter() - start) / repeat
+
+
+def main(player_count=10000, repeat=20, seed=0):
+    rng = random.Random(seed)
+    entries = [('player{0}'.format(i), rng.sample(irc_pugbot.pug.CLASSES, rng.randint(1, 4)), rng.random() < 0.2)
+               for i in range(player_count)]
+    tuples, tuple_size = build(entries, lambda classes, captain: (list(classes), captain))
+    records, record_size = build(entries, irc_pugbot.pug.Player)
+    tuple_time = timed(tuple_need_highlander, tuples, repeat)
+    record_time = timed(irc_pugbot.pug.need_highlander, records, repeat)
+    medic = irc_pugbot.pug.CLASS_BITS['medic']
+    list_tuple_time = timed(lambda players: [p for p, (cs, _) in players.items() if 'medic' in cs], tuples, repeat)
+    list_record_time = timed(lambda players: [p for p, player in players.items() if player.mask & medic], records, repeat)
+    index = irc_pugbot.pug.ClassIndex()
+    for nick, player in records.items():
+        index.add(nick, player.classes)
+    list_index_time = timed(lambda index: index.players('medic'), index, repeat)
+    print('{0} players'.format(player_count))
+    print('  memory:          tuples {0:8.0f} B/player, Player {1:8.0f} B/player'.format(
+        tuple_size / player_count, record_size / player_count))
+    print('  need_highlander: tuples {0:8.2f} ms,       Player {1:8.2f} ms'.format(tuple_time * 1e3, record_time * 1e3))
+    print('  list medic:      tuples {0:8.2f} ms,       Player {1:8.2f} ms,  ClassIndex {2:8.2f} ms'.format(
+        list_tuple_time * 1e3, list_record_time * 1e3, list_index_time * 1e3))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+import random
+import time
+import irc_pugbot.formats
+import irc_pugbot.pug
+import irc_pugbot.ratings
+
+
+def staged_pool(player_count, rng):
+    players = {}
+    ratings = irc_pugbot.ratings.Ratings()
+    for i in range(player_count):
+        nick = 'player{0}'.format(i)
+        players[nick] = irc_pugbot.pug.Player(rng.sample(irc_pugbot.pug.CLASSES, rng.randint(1, 3)))
+        ratings.ratings[nick] = rng.gauss(1500, 200)
+    ratings.ratings.update({'cap0': rng.gauss(1500, 200), 'cap1': rng.gauss(1500, 200)})
+    return players, ratings
+
+
+def main(pool_sizes=(16, 20, 24), rounds=50, time_limit=irc_pugbot.ratings.AUTO_PICK_TIME, seed=0):
+    rng = random.Random(seed)
+    for pool_size in pool_sizes:
+        timings = []
+        gaps = []
+        failed = 0
+        for i in range(rounds):
+            players, ratings = staged_pool(pool_size, rng)
+            start = time.perf_counter()
+            teams = irc_pugbot.ratings.balanced_teams(['cap0', 'cap1'], players, 8, irc_pugbot.formats.HIGHLANDER.class_max, ratings, time_limit)
+            timings.append(time.perf_counter() - start)
+            if teams is None:
+                failed += 1
+                continue
+            sums = [ratings.get(c) + sum(ratings.get(n) for n in team) for c, team in zip(['cap0', 'cap1'], teams)]
+            gaps.append(abs(sums[0] - sums[1]))
+        timings.sort()
+        gaps.sort()
+        print('pool {0:3d}: mean {1:6.2f}ms  max {2:6.2f}ms  median gap {3:7.2f}  max gap {4:7.2f}  no split {5}'.format(
+            pool_size, sum(timings) / len(timings) * 1e3, timings[-1] * 1e3,
+            gaps[len(gaps) // 2] if gaps else 0, gaps[-1] if gaps else 0, failed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+import asyncio
+import os
+import random
+import shutil
+import tempfile
+import time
+import irc_pugbot.pug
+import irc_pugbot.stats
+
+
+def random_game(rng, pool_size):
+    nicks = ['player{0}'.format(i) for i in rng.sample(range(pool_size), 18)]
+    captains = nicks[:2]
+    teams = [dict(zip(irc_pugbot.pug.CLASSES, nicks[2 + i * 8:10 + i * 8])) for i in range(2)]
+    picks = []
+    for i in range(8):
+        for team in (0, 1):
+            class_ = irc_pugbot.pug.CLASSES[i]
+            picks.append((team, class_, teams[team][class_]))
+    for team, captain in zip(teams, captains):
+        team['spy'] = captain
+    return captains, teams, picks
+
+
+def timed(loop, coroutine_function, repeat, *args):
+    start = time.perf_counter()
+    for i in range(repeat):
+        loop.run_until_complete(coroutine_function(*args))
+    return (time.perf_counter() - start) / repeat
+
+
+def main(game_count=100000, pool_size=5000, repeat=200, seed=0):
+    rng = random.Random(seed)
+    directory = tempfile.mkdtemp()
+    loop = asyncio.new_event_loop()
+    try:
+        store = irc_pugbot.stats.StatsStore(os.path.join(directory, 'stats.db'), loop=loop)
+        start = time.perf_counter()
+        for i in range(game_count):
+            game_id = store.record_game('#pug', *random_game(rng, pool_size))
+            store.record_result(game_id, rng.choice([0, 1, None]))
+            if i % 1000 == 999:
+                loop.run_until_complete(store.flush())
+        loop.run_until_complete(store.flush())
+        elapsed = time.perf_counter() - start
+        print('{0} games written in {1:.1f}s ({2:.0f} games/s)'.format(game_count, elapsed, game_count / elapsed))
+        nick = 'player{0}'.format(rng.randrange(pool_size))
+        print('player stats:      {0:8.3f} ms'.format(timed(loop, store.player_stats, repeat, nick) * 1e3))
+        print('class pick rates:  {0:8.3f} ms'.format(timed(loop, store.class_pick_rates, repeat) * 1e3))
+        print('leaderboard cached:{0:8.3f} ms'.format(timed(loop, store.leaderboard, repeat, 'wins') * 1e3))
+        start = time.perf_counter()
+        store.record_game('#pug', *random_game(rng, pool_size))
+        loop.run_until_complete(store.leaderboard('wins'))
+        print('game + leaderboard:{0:8.3f} ms'.format((time.perf_counter() - start) * 1e3))
+        loop.run_until_complete(store.close())
+    finally:
+        loop.close()
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+import random
+import irc_pugbot.irc
+import irc_pugbot.pug
+from benchmarks.utils import RecordingBot, VirtualLoop, command, run_command
+
+
+def session_events(rng, duration=3600.0, bursts=6, burst_size=30, burst_length=20.0):
+    """Timed add/remove commands for one peak hour in one channel"""
+    events = []
+    for burst in range(bursts):
+        start = duration * burst / bursts
+        for i in range(burst_size):
+            nick = 'b{0}_player{1}'.format(burst, i)
+            at = start + rng.uniform(0, burst_length)
+            classes = rng.sample(irc_pugbot.pug.CLASSES, rng.randint(1, 3))
+            if rng.random() < 0.15:
+                classes.append('captain')
+            events.append((at, 'add', nick, classes))
+            if rng.random() < 0.3:
+                events.append((at + rng.uniform(1, 60), 'remove', nick, None))
+            if rng.random() < 0.2:
+                events.append((at + rng.uniform(1, 90), 'add', nick, classes))
+    return sorted(events, key=lambda event: event[0])
+
+
+def run_session(events, status_delay):
+    loop = VirtualLoop()
+    config = {'TF2_PUG_CHANNEL': '#pug', 'TF2_PUG_STATUS_DELAY': status_delay,
+              'TF2_PUG_SEND_RATE': 1e9, 'TF2_PUG_SEND_BURST': 1e9}
+    bot = RecordingBot(config, loop)
+    ircpug = irc_pugbot.irc.IrcPug(bot)
+    for at, name, nick, classes in events:
+        loop.advance(at - loop.time())
+        if name == 'add':
+            run_command(ircpug.add_command(bot, command(nick, '#pug', classes=classes)))
+        else:
+            run_command(ircpug.remove_command(bot, command(nick, '#pug')))
+    loop.advance(3600)
+    return bot
+
+
+def main(seed=0):
+    events = session_events(random.Random(seed))
+    print('{0} add/remove commands in one simulated peak hour'.format(len(events)))
+    for status_delay in [None, 2, 5, 10]:
+        bot = run_session(events, status_delay)
+        print('status delay {0!s:>4}: {1:5d} messages, {2:7d} bytes'.format(status_delay, bot.sent, bot.bytes_sent))
+
+
+if __name__ == '__main__':
+    main()
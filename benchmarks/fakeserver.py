@@ -0,0 +1,78 @@
+import asyncio
+import collections
+import time
+
+
+class FakeIrcServer:
+    """In-process stand-in for an IRC server hosting one bot connection
+
+    Simulated clients are not separate connections: their commands are
+    written to the bot as PRIVMSG/NICK lines with the client's prefix.
+    Everything the bot sends is recorded, and reply probes let a caller wait
+    for the next bot line starting with a given prefix.
+    """
+
+    def __init__(self, loop, server_name='fake.irc'):
+        self.loop = loop
+        self.server_name = server_name
+        self.server = None
+        self.port = None
+        self.writer = None
+        self.connected = asyncio.Future(loop=loop)
+        self.received = collections.Counter()
+        self.bytes_received = 0
+        self.probes = collections.deque()
+
+    @asyncio.coroutine
+    def start(self):
+        self.server = yield from asyncio.start_server(self.handle, '127.0.0.1', 0, loop=self.loop)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.server.close()
+
+    @asyncio.coroutine
+    def handle(self, reader, writer):
+        self.writer = writer
+        nick = None
+        while True:
+            line = yield from reader.readline()
+            if not line:
+                break
+            self.bytes_received += len(line)
+            command, _, rest = line.decode().rstrip('\r\n').partition(' ')
+            self.received[command] += 1
+            if command == 'NICK':
+                nick = rest.lstrip(':')
+            elif command == 'USER':
+                self.write(':{0} 001 {1} :Welcome'.format(self.server_name, nick))
+                self.write(':{0} 005 {1} TARGMAX=PRIVMSG:4 :are supported by this server'.format(self.server_name, nick))
+                if not self.connected.done():
+                    self.connected.set_result(None)
+            elif command == 'PING':
+                self.write(':{0} PONG {1}'.format(self.server_name, rest))
+            elif command == 'PRIVMSG':
+                self.bot_said(rest.partition(' :')[2])
+
+    def write(self, line):
+        self.writer.write((line + '\r\n').encode())
+
+    def send_as(self, nick, target, text):
+        self.write(':{0}!{0}@bench.example.com PRIVMSG {1} :{2}'.format(nick, target, text))
+
+    def nick_change(self, old_nick, new_nick):
+        self.write(':{0}!{0}@bench.example.com NICK :{1}'.format(old_nick, new_nick))
+
+    def probe(self, prefix):
+        """Future resolved with the round trip time of the next bot line starting with prefix"""
+        future = asyncio.Future(loop=self.loop)
+        self.probes.append((prefix, future, time.perf_counter()))
+        return future
+
+    def bot_said(self, text):
+        if self.probes and text.startswith(self.probes[0][0]):
+            prefix, future, sent_at = self.probes.popleft()
+            if not future.done():
+                future.set_result(time.perf_counter() - sent_at)
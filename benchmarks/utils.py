@@ -0,0 +1,36 @@
+import asyncio
+import types
+from tests.utils import VirtualLoop
+
+
+class RecordingBot:
+    """Just enough of irc.bot.IrcBot for IrcPug to register and reply"""
+
+    def __init__(self, config, loop):
+        self.config = config
+        self.loop = loop
+        self.sent = 0
+        self.bytes_sent = 0
+
+    def add_handler(self, name, handler):
+        pass
+
+    def add_command_handler(self, name, handler, params=None, last_param_type=None):
+        pass
+
+    def send_privmsg(self, target, message):
+        self.sent += 1
+        self.bytes_sent += len('PRIVMSG {0} :{1}\r\n'.format(target, message).encode())
+
+
+def command(sender, target, **params):
+    return types.SimpleNamespace(sender=sender, target=target, params=types.SimpleNamespace(**params))
+
+
+def run_command(coro):
+    """Run a handler that never waits to completion without an event loop"""
+    if asyncio.iscoroutine(coro):
+        try:
+            coro.send(None)
+        except StopIteration:
+            pass
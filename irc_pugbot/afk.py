@@ -0,0 +1,125 @@
+import math
+
+
+class TimerWheel:
+    """Hashed timer wheel of keyed timeouts driven by a single loop tick
+
+    Each key sits in the slot of the tick it is due on. Pushing a deadline
+    back only records the new deadline; the key is moved when its old slot
+    comes round, so scheduling, rescheduling and cancelling are all O(1).
+    The tick only runs while timers are pending.
+    """
+
+    def __init__(self, loop, callback, tick=1.0, size=64):
+        self.loop = loop
+        self.callback = callback
+        self.tick = tick
+        self.size = size
+        self.slots = [set() for _ in range(size)]
+        self.deadlines = {}
+        self.placed = {}
+        self.now = 0
+        self.handle = None
+
+    def __contains__(self, key):
+        return key in self.deadlines
+
+    def __len__(self):
+        return len(self.deadlines)
+
+    def _place(self, key, deadline):
+        self.placed[key] = deadline
+        self.slots[deadline % self.size].add(key)
+
+    def schedule(self, key, delay):
+        deadline = self.now + max(1, math.ceil(delay / self.tick))
+        self.deadlines[key] = deadline
+        placed = self.placed.get(key)
+        if placed is None:
+            self._place(key, deadline)
+        elif deadline < placed:
+            self.slots[placed % self.size].discard(key)
+            self._place(key, deadline)
+        if self.handle is None:
+            self.handle = self.loop.call_later(self.tick, self._tick)
+
+    def cancel(self, key):
+        if self.deadlines.pop(key, None) is not None:
+            self.slots[self.placed.pop(key) % self.size].discard(key)
+
+    def rename(self, old_key, new_key):
+        if old_key in self.deadlines:
+            deadline = self.deadlines.pop(old_key)
+            self.slots[self.placed.pop(old_key) % self.size].discard(old_key)
+            self.deadlines[new_key] = deadline
+            self._place(new_key, deadline)
+
+    def _tick(self):
+        self.handle = None
+        self.now += 1
+        slot = self.slots[self.now % self.size]
+        due = []
+        for key in [k for k in slot if self.placed[k] <= self.now]:
+            slot.discard(key)
+            deadline = self.deadlines[key]
+            if deadline <= self.now:
+                del self.deadlines[key]
+                del self.placed[key]
+                due.append(key)
+            else:
+                self._place(key, deadline)
+        for key in due:
+            self.callback(key)
+        if self.deadlines and self.handle is None:
+            self.handle = self.loop.call_later(self.tick, self._tick)
+
+
+class AfkTracker:
+    """Idle timeouts for added players on one shared TimerWheel
+
+    A player idle for `timeout` seconds is pinged, and one still idle
+    `grace` seconds after the ping is dropped. Activity from a tracked player
+    only pushes its deadline back.
+    """
+
+    def __init__(self, loop, timeout, grace, ping, drop, tick=1.0):
+        self.timeout = timeout
+        self.grace = grace
+        self.ping = ping
+        self.drop = drop
+        self.wheel = TimerWheel(loop, self._expired, tick)
+        self.pinged = set()
+
+    def __contains__(self, nick):
+        return nick in self.wheel
+
+    def track(self, nick):
+        self.pinged.discard(nick)
+        self.wheel.schedule(nick, self.timeout)
+
+    def untrack(self, nick):
+        self.pinged.discard(nick)
+        self.wheel.cancel(nick)
+
+    def active(self, nick):
+        if nick in self.wheel:
+            self.track(nick)
+
+    def rename(self, old_nick, new_nick):
+        self.wheel.rename(old_nick, new_nick)
+        if old_nick in self.pinged:
+            self.pinged.remove(old_nick)
+            self.pinged.add(new_nick)
+
+    def pinged_among(self, nicks):
+        """Those of nicks pinged and not heard from since"""
+        return [nick for nick in nicks if nick in self.pinged]
+
+    def _expired(self, nick):
+        if nick in self.pinged:
+            self.pinged.remove(nick)
+            self.drop(nick)
+        else:
+            self.pinged.add(nick)
+            self.wheel.schedule(nick, self.grace)
+            self.ping(nick)
@@ -0,0 +1,128 @@
+import asyncio
+import collections
+import irc_pugbot.metrics
+
+LobbyOpened = collections.namedtuple('LobbyOpened', ['key'])
+LobbyClosed = collections.namedtuple('LobbyClosed', ['key'])
+PlayerAdded = collections.namedtuple('PlayerAdded', ['key', 'nick', 'classes', 'captain'])
+PlayerRemoved = collections.namedtuple('PlayerRemoved', ['key', 'nick'])
+PlayerRenamed = collections.namedtuple('PlayerRenamed', ['key', 'old_nick', 'new_nick'])
+Staged = collections.namedtuple('Staged', ['key', 'captains'])
+Picked = collections.namedtuple('Picked', ['key', 'nick', 'class_', 'team'])
+PickUndone = collections.namedtuple('PickUndone', ['key', 'nick', 'team'])
+Matchmade = collections.namedtuple('Matchmade', ['key', 'teams'])
+GameMade = collections.namedtuple('GameMade', ['key', 'captains', 'teams'])
+
+DROP_NEWEST = 'newest'
+DROP_OLDEST = 'oldest'
+
+
+class Subscriber:
+    """One sink of the bus, fed through its own bounded queue by its own task
+
+    Delivery lag, the time an event waited in the queue before the handler
+    got it, is kept as a latency histogram.
+    """
+
+    def __init__(self, loop, name, handler, types=None, maxsize=100, drop=DROP_NEWEST):
+        self.loop = loop
+        self.name = name
+        self.handler = handler
+        self.types = tuple(types) if types is not None else None
+        self.maxsize = maxsize
+        self.drop = drop
+        self.queue = collections.deque()
+        self.waiter = None
+        self.task = None
+        self.delivered = 0
+        self.dropped = 0
+        self.errors = 0
+        self.lag = irc_pugbot.metrics.HandlerStats()
+
+    @property
+    def depth(self):
+        return len(self.queue)
+
+    def offer(self, event, published_at):
+        if self.types is not None and not isinstance(event, self.types):
+            return
+        if len(self.queue) >= self.maxsize:
+            self.dropped += 1
+            if self.drop == DROP_NEWEST:
+                return
+            self.queue.popleft()
+        self.queue.append((published_at, event))
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_result(None)
+
+    @asyncio.coroutine
+    def run(self):
+        while True:
+            if not self.queue:
+                self.waiter = asyncio.Future(loop=self.loop)
+                yield from self.waiter
+                self.waiter = None
+                continue
+            published_at, event = self.queue.popleft()
+            self.lag.observe(self.loop.time() - published_at)
+            try:
+                yield from self.handler(event)
+            except Exception as e:
+                self.errors += 1
+                self.loop.call_exception_handler({
+                    'message': 'event subscriber {0} failed on {1!r}'.format(self.name, event),
+                    'exception': e,
+                })
+            self.delivered += 1
+
+
+class EventBus:
+    """Typed pug state events fanned out to asynchronous subscribers
+
+    Publishing only appends the event to each subscriber's queue, so the
+    command that changed the pug never waits on a sink. Every subscriber
+    drains its queue in its own task at its own pace; a sink that falls
+    maxsize events behind loses events, the newest or the oldest as it
+    chose, and the losses are counted.
+    """
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.subscribers = []
+        self.metrics = None
+
+    def subscribe(self, name, handler, types=None, maxsize=100, drop=DROP_NEWEST):
+        """Run coroutine handler(event) for every event, or only events of the given types"""
+        subscriber = Subscriber(self.loop, name, handler, types, maxsize, drop)
+        subscriber.task = self.loop.create_task(subscriber.run())
+        self.subscribers.append(subscriber)
+        if self.metrics is not None:
+            self._add_gauges(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.remove(subscriber)
+        subscriber.task.cancel()
+
+    def publish(self, event):
+        if self.subscribers:
+            published_at = self.loop.time()
+            for subscriber in self.subscribers:
+                subscriber.offer(event, published_at)
+
+    def close(self):
+        for subscriber in list(self.subscribers):
+            self.unsubscribe(subscriber)
+
+    def add_metrics(self, metrics):
+        """Report queue depth, drops and p99 delivery lag of every subscriber, present and future"""
+        self.metrics = metrics
+        for subscriber in self.subscribers:
+            self._add_gauges(subscriber)
+
+    def _add_gauges(self, subscriber):
+        name = subscriber.name
+        self.metrics.gauge('events_{0}_depth'.format(name), lambda: subscriber.depth)
+        self.metrics.gauge('events_{0}_dropped'.format(name), lambda: subscriber.dropped)
+        self.metrics.gauge('events_{0}_lag_p99_seconds'.format(name),
+                           lambda: subscriber.lag.percentile(0.99) if subscriber.lag.calls else 0)
@@ -0,0 +1,148 @@
+import asyncio
+import collections
+import time
+
+MAX_KEYS = 4096
+
+
+def prefix_host(prefix):
+    """Host part of a nick!user@host message prefix, or None"""
+    if not prefix or '@' not in prefix:
+        return None
+    return prefix.rpartition('@')[2]
+
+
+class TokenBuckets:
+    """A token bucket per key, holding at most max_keys buckets
+
+    Buckets live in an LRU; the least recently used one is forgotten when
+    a new key would go over max_keys, which is the same as that key having
+    waited long enough to be full again.
+    """
+
+    def __init__(self, rate, burst, max_keys=MAX_KEYS, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.clock = clock
+        self.buckets = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self.buckets)
+
+    def take(self, key):
+        """Take a token from a key's bucket, False if it is empty"""
+        now = self.clock()
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = [self.burst, now]
+            if len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(key)
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        if bucket[0] < 1:
+            return False
+        bucket[0] -= 1
+        return True
+
+
+class FloodGuard:
+    """Command rate limits per nick and per host, and folding of repeated queries
+
+    A command is dropped before its handler runs when the sender's nick
+    bucket, or host bucket if the sender's host is known, is empty. Hosts
+    come from the prefix of the command when it has one, or else from the
+    last message prefix seen for the nick, kept in an LRU of max_keys nicks.
+    A query command asked again in the same channel with the same
+    parameters within fold_window seconds, while version() is unchanged,
+    is folded: its handler does not run and no token is taken, and the
+    lines said while the first one ran are passed to reply again, keyed so
+    that an outbound queue coalesces repeats still waiting to be sent.
+    Queries whose answer depends on who asks are folded per sender. Drops
+    and folds are counted per command.
+    """
+
+    def __init__(self, rate=0.5, burst=5, host_rate=None, host_burst=10, fold_window=10, version=lambda: 0,
+                 reply=None, max_keys=MAX_KEYS, clock=time.monotonic):
+        self.nicks = TokenBuckets(rate, burst, max_keys, clock)
+        self.hosts = TokenBuckets(host_rate, host_burst, max_keys, clock) if host_rate else None
+        self.fold_window = fold_window
+        self.version = version
+        self.reply = reply
+        self.max_keys = max_keys
+        self.clock = clock
+        self.answered = collections.OrderedDict()
+        self.nick_hosts = collections.OrderedDict()
+        self.dropped = collections.Counter()
+        self.folded = collections.Counter()
+        self.replies = None
+
+    def seen(self, nick, prefix):
+        """Remember the host of a nick from the prefix of a message it sent"""
+        host = prefix_host(prefix)
+        if host is None:
+            return
+        self.nick_hosts[nick] = host
+        self.nick_hosts.move_to_end(nick)
+        if len(self.nick_hosts) > self.max_keys:
+            self.nick_hosts.popitem(last=False)
+
+    def rename(self, old_nick, new_nick):
+        host = self.nick_hosts.pop(old_nick, None)
+        if host is not None:
+            self.nick_hosts[new_nick] = host
+
+    def host(self, command):
+        return prefix_host(getattr(command, 'prefix', None)) or self.nick_hosts.get(command.sender)
+
+    def said(self, target, text):
+        """Note a line said while a query handler runs, to answer its folds with"""
+        if self.replies is not None:
+            self.replies.append((target, text))
+
+    def wrap(self, name, handler, query=False, per_sender=False):
+        @asyncio.coroutine
+        def guarded(bot, command):
+            if not self.admit(name, command, query, per_sender):
+                return
+            if not query:
+                return (yield from handler(bot, command))
+            self.replies = self.answered[self.fold_key(name, command, per_sender)][2]
+            try:
+                return (yield from handler(bot, command))
+            finally:
+                self.replies = None
+        return guarded
+
+    @staticmethod
+    def fold_key(name, command, per_sender=False):
+        sender = command.sender if per_sender else None
+        return (name, getattr(command, 'target', None), repr(command.params), sender)
+
+    def admit(self, name, command, query=False, per_sender=False):
+        if query:
+            key = self.fold_key(name, command, per_sender)
+            answered = self.answered.get(key)
+            version = self.version()
+            now = self.clock()
+            if answered is not None and answered[0] == version and now - answered[1] < self.fold_window:
+                self.folded[name] += 1
+                if self.reply is not None:
+                    for i, (target, text) in enumerate(answered[2]):
+                        self.reply(target, text, key + (i,))
+                return False
+        if not self.nicks.take(command.sender):
+            self.dropped[name] += 1
+            return False
+        host = self.host(command) if self.hosts is not None else None
+        if host is not None and not self.hosts.take(host):
+            self.dropped[name] += 1
+            return False
+        if query:
+            self.answered[key] = (version, now, [])
+            self.answered.move_to_end(key)
+            if len(self.answered) > self.max_keys:
+                self.answered.popitem(last=False)
+        return True
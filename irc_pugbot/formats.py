@@ -0,0 +1,111 @@
+import irc_pugbot.order
+
+CLASSES = ['scout', 'soldier', 'pyro', 'demoman', 'heavy', 'engineer', 'medic', 'sniper', 'spy']
+
+
+def slot_names(class_, count):
+    """Team slot names for up to count players of a class: scout, scout2, ..."""
+    return [class_] + ['{0}{1}'.format(class_, i) for i in range(2, count + 1)]
+
+
+def slot_class(slot):
+    return slot.rstrip('0123456789')
+
+
+class Format:
+    """A game format compiled into the slot vectors every pug of it shares
+
+    A format is declared as a team size, a number of captains, per team
+    (min, max) slots for each class and a pick order pattern. The
+    requirements the need, stage and start checks evaluate and the pick
+    order table are derived once here, so every format runs the same code
+    and costs the same.
+    """
+
+    def __init__(self, name, team_size, classes, captains=2, pick_order='abba'):
+        unknown = set(classes) - set(CLASSES)
+        if unknown:
+            raise ValueError('unknown classes {0}'.format(', '.join(sorted(unknown))))
+        if any(low > high for low, high in classes.values()):
+            raise ValueError('class minimum above maximum')
+        if sum(low for low, _ in classes.values()) > team_size:
+            raise ValueError('class minimums exceed the team size')
+        if sum(high for _, high in classes.values()) < team_size:
+            raise ValueError('class maximums cannot fill a team')
+        if captains < 2:
+            raise ValueError('a format needs at least two captains')
+        self.name = name
+        self.team_size = team_size
+        self.captains = captains
+        self.player_count = team_size * 2
+        self.picks = team_size - 1
+        self.allowed_classes = [c for c in CLASSES if classes.get(c, (0, 0))[1] > 0]
+        self.class_min = {c: classes[c][0] for c in self.allowed_classes if classes[c][0] > 0}
+        self.class_max = {c: classes[c][1] for c in self.allowed_classes}
+        self.class_slots = {c: slot_names(c, self.class_max[c]) for c in self.allowed_classes}
+        self.required_slots = [slot for c in self.allowed_classes for slot in self.class_slots[c][:self.class_min.get(c, 0)]]
+        self.open_slots = [slot for c in self.allowed_classes for slot in self.class_slots[c]]
+        self.slot_capacities = {c: n * 2 for c, n in self.class_min.items()} or None
+        self.pick_order = irc_pugbot.order.compile_order(pick_order, self.picks * 2)
+        if any(self.pick_order.count(team) != self.picks for team in range(2)):
+            raise ValueError('pick order {0!r} does not give each team {1} picks'.format(pick_order, self.picks))
+
+    def __repr__(self):
+        return 'Format({0!r})'.format(self.name)
+
+    def free_slot(self, team, class_):
+        for slot in self.class_slots[class_]:
+            if slot not in team:
+                return slot
+        return None
+
+    def need_counts(self, captain_count, player_count, class_counts):
+        """Need from captain, player and per class counts, without matching players to slots"""
+        class_need = {c: need - class_counts[c] for c, need in (self.slot_capacities or {}).items()
+                      if class_counts[c] < need}
+        return max(self.captains - captain_count, 0), self.player_count - player_count, class_need
+
+    def need_matched(self, matcher, captain_matcher, player_count):
+        """Exact need from the slot matchers over all added players and captain volunteers"""
+        captain_count = min(captain_matcher.size, self.captains)
+        player_need = max(self.player_count - player_count, matcher.slot_count - matcher.size)
+        return self.captains - captain_count, player_need, matcher.shortfall()
+
+    def can_start(self, teams):
+        return all(len(team) == self.picks for team in teams)
+
+    def fill_captains(self, captains, teams):
+        """Put each captain on the required slots their team left open, or on a free slot"""
+        for captain, team in zip(captains, teams):
+            for slot in self.required_slots:
+                if slot not in team:
+                    team[slot] = captain
+            if captain not in team.values():
+                for slot in self.open_slots:
+                    if slot not in team:
+                        team[slot] = captain
+                        break
+
+
+FORMATS = {}
+
+
+def register(format_):
+    FORMATS[format_.name] = format_
+    return format_
+
+
+def load_formats(specs):
+    """The built in formats plus those declared in config as {name: {'team_size', 'classes', 'captains', 'pick_order'}}"""
+    formats = dict(FORMATS)
+    for name, spec in specs.items():
+        classes = {c: tuple(limits) for c, limits in spec['classes'].items()}
+        formats[name] = Format(name, spec['team_size'], classes, spec.get('captains', 2), spec.get('pick_order', 'abba'))
+    return formats
+
+
+HIGHLANDER = register(Format('highlander', 9, {c: (1, 1) for c in CLASSES}))
+FOURS = register(Format('fours', 4, {c: (0, 1) for c in CLASSES}))
+SIXES = register(Format('sixes', 6, {'scout': (2, 2), 'soldier': (2, 2), 'demoman': (1, 1), 'medic': (1, 1)}))
+ULTIDUO = register(Format('ultiduo', 2, {'soldier': (1, 1), 'medic': (1, 1)}))
+BBALL = register(Format('bball', 2, {'soldier': (2, 2)}))
@@ -0,0 +1,96 @@
+COMBO_GAMES = 5
+COMBO_SHARE = 0.75
+
+
+class PickHistory:
+    """Who was left unpicked and who keeps ending up on the same team
+
+    Nicks are mapped to dense ids once, and per player counters are lists
+    indexed by id. Co-team counts form a sparse symmetric matrix stored as
+    one dict from a packed (low id, high id) key to a count, so only pairs
+    that have actually shared a team take memory and every lookup is a
+    single dict access however many players there are. Renames only
+    rebind the id.
+
+    A player's streak counts consecutive games they were picked last or not
+    picked at all, and any other pick resets it, as does a place in a
+    matchmade game. Two players are a combo once they have shared a team at
+    least combo_games times, and in at least combo_share of the games
+    played by whichever of them has played less.
+    """
+
+    def __init__(self, combo_games=COMBO_GAMES, combo_share=COMBO_SHARE):
+        self.combo_games = combo_games
+        self.combo_share = combo_share
+        self.ids = {}
+        self.games = []
+        self.streaks = []
+        self.pairs = {}
+
+    def __contains__(self, nick):
+        return nick in self.ids
+
+    def _id(self, nick):
+        id_ = self.ids.get(nick)
+        if id_ is None:
+            id_ = self.ids[nick] = len(self.games)
+            self.games.append(0)
+            self.streaks.append(0)
+        return id_
+
+    @staticmethod
+    def _key(a, b):
+        return (a << 32) | b if a < b else (b << 32) | a
+
+    def rename(self, old_nick, new_nick):
+        if old_nick in self.ids and new_nick not in self.ids:
+            self.ids[new_nick] = self.ids.pop(old_nick)
+
+    def record(self, teams, picks, unpicked=()):
+        """Count one game's teams, its (team, slot, nick) picks and the staged players left over
+
+        A game without picks was matchmade, and everyone on its teams was
+        placed rather than picked last.
+        """
+        pairs = self.pairs
+        for team in teams:
+            ids = sorted(set(self._id(nick) for nick in team.values()))
+            for i, a in enumerate(ids):
+                self.games[a] += 1
+                if not picks:
+                    self.streaks[a] = 0
+                for b in ids[i + 1:]:
+                    key = (a << 32) | b
+                    pairs[key] = pairs.get(key, 0) + 1
+        for _, _, nick in picks[:-1]:
+            self.streaks[self._id(nick)] = 0
+        for nick in list(unpicked) + [nick for _, _, nick in picks[-1:]]:
+            self.streaks[self._id(nick)] += 1
+
+    def together(self, a, b):
+        """Number of games two players were on the same team"""
+        a, b = self.ids.get(a), self.ids.get(b)
+        if a is None or b is None or a == b:
+            return 0
+        return self.pairs.get(self._key(a, b), 0)
+
+    def streak(self, nick):
+        id_ = self.ids.get(nick)
+        return self.streaks[id_] if id_ is not None else 0
+
+    def is_combo(self, a, b):
+        count = self.together(a, b)
+        if count < self.combo_games:
+            return False
+        return count >= self.combo_share * min(self.games[self.ids[a]], self.games[self.ids[b]])
+
+    def combo_partner(self, nick, team):
+        """The first of a team's nicks forming a combo with nick, or None"""
+        for other in team:
+            if self.is_combo(nick, other):
+                return other
+        return None
+
+    def priority(self, nicks):
+        """Nicks with a streak, longest streak first"""
+        return sorted((nick for nick in nicks if self.streak(nick)), key=self.streak, reverse=True)
@@ -1,13 +1,41 @@
 import enum
 import asyncio
+import collections
 import functools
+import itertools
+import os
+import time
+import irc_pugbot.events
+import irc_pugbot.formats
+import irc_pugbot.history
 import irc_pugbot.pug
+import irc_pugbot.manager
+import irc_pugbot.journal
+import irc_pugbot.afk
+import irc_pugbot.staging
+import irc_pugbot.outbound
+import irc_pugbot.status
+import irc_pugbot.metrics
+import irc_pugbot.ratings
+import irc_pugbot.stats
+import irc_pugbot.servers
+import irc_pugbot.logs
+import irc_pugbot.mumble
+import irc_pugbot.web
+import irc_pugbot.flood
 import irc.command
 
 COLORS = ['red', 'blue']
-PLAYER_MSG = 'You have been picked as {class_} for {color} team.'
+PLAYER_MSG = 'You have been picked for {color} team: {players}'
+CONNECT_MSG = '{0}. Join with: {1}'
+DEMO_NAME = 'pug_{0}'
 TEAM_MSG = '{color} team: {players}'
 CLASS_MSG = '{player} on {class_}'
+UPCOMING_PICKS = 4
+# Commands the flood guard folds, and whether their reply depends on the sender
+QUERY_COMMANDS = {'need': False, 'turn': False, 'list': True}
+
+Game = collections.namedtuple('Game', ['channel', 'captains', 'teams', 'game_id', 'server', 'started_at'])
 
 
 class PugType(enum.Enum):
@@ -15,13 +43,46 @@ class PugType(enum.Enum):
     fours = 2
 
 
+def can_report(game, nick):
+    """Captains report the result, or any player of a matchmade game"""
+    if None in game.captains:
+        return any(nick in team.values() for team in game.teams)
+    return nick in game.captains
+
+
+def format_team(team):
+    return ', '.join([CLASS_MSG.format(player=p, class_=irc_pugbot.formats.slot_class(c).title()) for c, p in team.items()])
+
+
 def send_teams_message(privmsg, teams):
     for i, team in enumerate(teams):
-        players = ', '.join([CLASS_MSG.format(p, c.title()) for c, p in team.items()])
-        team_msg = TEAM_MSG.format(color=COLORS[i].title(), players=players)
+        team_msg = TEAM_MSG.format(color=COLORS[i].title(), players=format_team(team))
         privmsg(team_msg)
 
 
+def send_player_messages(privmsg, teams, connect=None):
+    for i, team in enumerate(teams):
+        player_msg = PLAYER_MSG.format(color=COLORS[i].title(), players=format_team(team))
+        if connect:
+            player_msg = CONNECT_MSG.format(player_msg, connect)
+        for player in sorted(set(team.values())):
+            privmsg(player, player_msg)
+
+
+def parse_max_targets(params):
+    """PRIVMSG target limit from ISUPPORT TARGMAX or MAXTARGETS tokens"""
+    for param in params:
+        name, _, value = param.partition('=')
+        if name == 'TARGMAX':
+            for limit in value.split(','):
+                command, _, count = limit.partition(':')
+                if command == 'PRIVMSG':
+                    return int(count) if count else None
+        elif name == 'MAXTARGETS' and value:
+            return int(value)
+    return None
+
+
 def send_unstaged(privmsg, unstaged):
     privmsg('Players added: {0}'.format(', '.join(unstaged.keys())))
 
@@ -32,100 +93,475 @@ class IrcPug:
             self.init_bot(bot)
         else:
             self.bot = None
-            self.pug = None
+            self.events = None
+            self.manager = None
+            self.journal = None
             self.channel = None
-            self.stage_delay = None
-        self.staging_task = None
+            self.staging = None
+            self.ratings = None
+            self.history = None
+            self.combo_protection = None
+            self.auto_pick = False
+            self.stats = None
+            self.afk = None
+            self.turns = None
+            self.mumble = None
+            self.web = None
+            self.flood = None
+        self.games = collections.OrderedDict()
+        self.game_numbers = itertools.count(1)
 
     def init_bot(self, bot):
         self.bot = bot
         pug_type = self.bot.config.get('TF2_PUG_TYPE', PugType.highlander)
-        if pug_type == PugType.highlander:
-            self.pug = irc_pugbot.pug.Tf2HighlanderPug()
-        elif pug_type == PugType.fours:
-            self.pug = irc_pugbot.pug.Tf2FoursPug()
-        else:
-            raise NotImplementedError
+        check_counters = self.bot.config.get('TF2_PUG_CHECK_COUNTERS', False)
+        formats = irc_pugbot.formats.load_formats(self.bot.config.get('TF2_PUG_FORMATS', {}))
+        format_ = formats[self.bot.config.get('TF2_PUG_FORMAT', pug_type.name)]
+        matchmaking = self.bot.config.get('TF2_PUG_MATCHMAKING', False)
+        self.events = irc_pugbot.events.EventBus(bot.loop)
+        self.manager = irc_pugbot.manager.PugManager(functools.partial(
+            irc_pugbot.pug.Tf2Pug, check_counters, format_=format_, matchmaking=matchmaking), bus=self.events)
         self.channel = self.bot.config['TF2_PUG_CHANNEL']
-        self.stage_delay = self.bot.config.get('TF2_PUG_STAGE_DELAY', None)
-        self.privmsg = functools.partial(bot.send_privmsg, self.channel)
-        self.bot.add_handler('NICK', self.handle_nick)
-        self.bot.add_command_handler('add', self.add_command, ['classes'], irc.command.LastParamType.list_)
-        self.bot.add_command_handler('remove', self.remove_command)
-        self.bot.add_command_handler('need', self.need_command)
-        self.bot.add_command_handler('pick', self.pick_command, ['name', 'class_'])
-        self.bot.add_command_handler('list', self.list_command, ['class_'])
+        state_path = self.bot.config.get('TF2_PUG_STATE_PATH', None)
+        if state_path:
+            self.journal = irc_pugbot.journal.Journal(state_path, loop=self.bot.loop)
+            self.journal.replay(self.manager)
+        else:
+            self.journal = None
+        for channel in [self.channel] + list(self.bot.config.get('TF2_PUG_CHANNELS', [])):
+            self.manager.add_channel(channel)
+        stats_path = self.bot.config.get('TF2_PUG_STATS_PATH', None)
+        if stats_path:
+            self.stats = irc_pugbot.stats.StatsStore(stats_path, loop=self.bot.loop)
+        else:
+            self.stats = None
+        self.staging = irc_pugbot.staging.StagingScheduler(
+            bot.loop, self.do_stage, self.say, self.drop_unready,
+            delay=self.bot.config.get('TF2_PUG_STAGE_DELAY', None),
+            remind_every=self.bot.config.get('TF2_PUG_STAGE_REMINDER', 10),
+            ready_timeout=self.bot.config.get('TF2_PUG_READY_TIMEOUT', None))
+        server_specs = self.bot.config.get('TF2_PUG_SERVERS', None)
+        if server_specs:
+            self.servers = irc_pugbot.servers.ServerPool.from_config(
+                bot.loop, server_specs,
+                interval=self.bot.config.get('TF2_PUG_SERVER_PROBE_INTERVAL', 30),
+                timeout=self.bot.config.get('TF2_PUG_SERVER_PROBE_TIMEOUT', 2.0),
+                release_after=self.bot.config.get('TF2_PUG_SERVER_RELEASE_AFTER', 900))
+            self.servers.start()
+        else:
+            self.servers = None
+        self.server_config = self.bot.config.get('TF2_PUG_SERVER_CONFIG', None)
+        if self.servers and self.stats and any(server.log_dir for server in self.servers):
+            self.ingest = irc_pugbot.logs.IngestPipeline(bot.loop, self.bot.config.get('TF2_PUG_INGEST_WORKERS', 2))
+        else:
+            self.ingest = None
+        self.ratings = irc_pugbot.ratings.Ratings()
+        self.history = irc_pugbot.history.PickHistory(
+            combo_games=self.bot.config.get('TF2_PUG_COMBO_GAMES', irc_pugbot.history.COMBO_GAMES),
+            combo_share=self.bot.config.get('TF2_PUG_COMBO_SHARE', irc_pugbot.history.COMBO_SHARE))
+        self.combo_protection = self.bot.config.get('TF2_PUG_COMBO_PROTECTION', None)
+        self.auto_pick = self.bot.config.get('TF2_PUG_AUTO_PICK', False)
+        self.auto_pick_time = self.bot.config.get('TF2_PUG_AUTO_PICK_TIME', irc_pugbot.ratings.AUTO_PICK_TIME)
+        self.outbound = irc_pugbot.outbound.OutboundQueue(
+            bot.send_privmsg, bot.loop,
+            rate=self.bot.config.get('TF2_PUG_SEND_RATE', 1.0),
+            burst=self.bot.config.get('TF2_PUG_SEND_BURST', 5))
+        self.privmsg = functools.partial(self.say, self.channel)
+        status_delay = self.bot.config.get('TF2_PUG_STATUS_DELAY', None)
+        if status_delay:
+            self.status = irc_pugbot.status.StatusBoard(bot.loop, status_delay, self.say)
+        else:
+            self.status = None
+        afk_timeout = self.bot.config.get('TF2_PUG_AFK_TIMEOUT', None)
+        if afk_timeout:
+            self.afk = irc_pugbot.afk.AfkTracker(
+                bot.loop, afk_timeout, self.bot.config.get('TF2_PUG_AFK_GRACE', 60), self.ping_idle, self.drop_idle)
+        else:
+            self.afk = None
+        self.pick_timeout = self.bot.config.get('TF2_PUG_PICK_TIMEOUT', None)
+        self.turns = irc_pugbot.afk.TimerWheel(bot.loop, self.turn_expired) if self.pick_timeout else None
+        mumble_host = self.bot.config.get('TF2_PUG_MUMBLE_HOST', None)
+        if mumble_host:
+            self.mumble = irc_pugbot.mumble.MumbleClient(
+                bot.loop, mumble_host, self.bot.config.get('TF2_PUG_MUMBLE_PORT', 64738),
+                username=self.bot.config.get('TF2_PUG_MUMBLE_USERNAME', 'pugbot'),
+                password=self.bot.config.get('TF2_PUG_MUMBLE_PASSWORD', None),
+                ssl_context=irc_pugbot.mumble.insecure_context(),
+                aliases=self.bot.config.get('TF2_PUG_MUMBLE_ALIASES', None))
+            self.mumble_channels = self.bot.config.get('TF2_PUG_MUMBLE_CHANNELS', ['RED', 'BLU'])
+            self.mumble.start()
+            self.events.subscribe('mumble', self.move_teams,
+                                  types=[irc_pugbot.events.GameMade, irc_pugbot.events.Matchmade])
+        else:
+            self.mumble = None
+        web_port = self.bot.config.get('TF2_PUG_WEB_PORT', None)
+        if web_port:
+            self.web = irc_pugbot.web.LobbyView(self.manager, bot.loop)
+            self.events.subscribe('web', self.web.update, maxsize=1000, drop=irc_pugbot.events.DROP_OLDEST)
+            self.bot.loop.create_task(self.web.serve(
+                web_port, self.bot.config.get('TF2_PUG_WEB_HOST', '127.0.0.1'), loop=self.bot.loop))
+        else:
+            self.web = None
+        flood_rate = self.bot.config.get('TF2_PUG_FLOOD_RATE', None)
+        if flood_rate:
+            self.state_version = 0
+            self.manager.listeners.append(self.state_changed)
+            self.flood = irc_pugbot.flood.FloodGuard(
+                flood_rate, self.bot.config.get('TF2_PUG_FLOOD_BURST', 5),
+                host_rate=self.bot.config.get('TF2_PUG_FLOOD_HOST_RATE', None),
+                host_burst=self.bot.config.get('TF2_PUG_FLOOD_HOST_BURST', 10),
+                fold_window=self.bot.config.get('TF2_PUG_FLOOD_FOLD_WINDOW', 10),
+                version=lambda: self.state_version, reply=self.say)
+        else:
+            self.flood = None
+        if self.bot.config.get('TF2_PUG_METRICS', True):
+            self.init_metrics()
+        else:
+            self.metrics = None
+        self.add_handler('005', self.handle_isupport)
+        self.add_handler('NICK', self.handle_nick)
+        self.add_handler('QUIT', self.handle_quit)
+        if self.afk or self.flood:
+            self.add_handler('PRIVMSG', self.handle_privmsg)
+        self.add_command_handler('add', self.add_command, ['classes'], irc.command.LastParamType.list_)
+        self.add_command_handler('remove', self.remove_command)
+        self.add_command_handler('ready', self.ready_command)
+        self.add_command_handler('need', self.need_command)
+        self.add_command_handler('pick', self.pick_command, ['name', 'class_'])
+        self.add_command_handler('undo', self.undo_command)
+        self.add_command_handler('turn', self.turn_command)
+        self.add_command_handler('list', self.list_command, ['class_'])
+        self.add_command_handler('stats', self.stats_command, ['nicks'], irc.command.LastParamType.list_)
+        self.add_command_handler('top', self.top_command, ['kinds'], irc.command.LastParamType.list_)
+        self.add_command_handler('picks', self.picks_command)
+        self.add_command_handler('winner', self.winner_command, ['color'])
+        self.add_command_handler('rating', self.rating_command, ['nicks'], irc.command.LastParamType.list_)
+        if self.mumble:
+            self.add_command_handler('mumble', self.mumble_command, ['name'])
+
+    def init_metrics(self):
+        self.metrics = irc_pugbot.metrics.Metrics()
+        self.metrics.gauge('lobbies', lambda: sum(1 for _ in self.manager))
+        self.metrics.gauge('unstaged_players', lambda: sum(len(pug.unstaged_players) for _, _, pug in self.manager))
+        self.metrics.gauge('staged_players', lambda: sum(len(pug.staged_players or ()) for _, _, pug in self.manager))
+        self.outbound.add_metrics(self.metrics)
+        self.events.add_metrics(self.metrics)
+        if self.flood:
+            self.metrics.gauge('commands_dropped', lambda: sum(self.flood.dropped.values()))
+            self.metrics.gauge('commands_folded', lambda: sum(self.flood.folded.values()))
+        if hasattr(self.bot, 'tasks'):
+            self.metrics.gauge('bot_task_queue_depth', self.bot.tasks.qsize)
+        port = self.bot.config.get('TF2_PUG_METRICS_PORT', None)
+        if port:
+            self.bot.loop.create_task(self.metrics.serve(port, loop=self.bot.loop))
+
+    def add_handler(self, name, handler):
+        if self.metrics:
+            handler = self.metrics.wrap(name, handler)
+        self.bot.add_handler(name, handler)
+
+    def add_command_handler(self, name, handler, *args):
+        if self.metrics:
+            handler = self.metrics.wrap(name, handler)
+        if self.flood:
+            handler = self.flood.wrap(name, handler, query=name in QUERY_COMMANDS,
+                                      per_sender=QUERY_COMMANDS.get(name, False))
+        self.bot.add_command_handler(name, handler, *args)
+
+    def state_changed(self, key, event, args):
+        self.state_version += 1
+
+    @property
+    def pug(self):
+        """The oldest lobby of the main channel"""
+        return next(iter(self.manager.lobbies[self.channel].values()))
+
+    def say(self, target, text, key=None):
+        if self.flood:
+            self.flood.said(target, text)
+        self.outbound.privmsg(target, text, key)
+
+    def command_channel(self, command):
+        target = getattr(command, 'target', None)
+        return target if target in self.manager else self.channel
 
     @asyncio.coroutine
     def add_command(self, bot, command):
         """Add yourself to the pug"""
+        channel = self.command_channel(command)
+        pug = self.manager.open_pug(channel)
         classes = [c.lower() for c in command.params.classes]
         captain = 'captain' in classes
         classes = [p for p in classes if p != 'captain']
-        self.pug.add(command.sender, classes, captain)
-        if self.pug.can_stage:
-            self.do_staging_task()
-        else:
-            send_unstaged(self.privmsg, self.pug.unstaged_players)
-
-    def do_staging_task(self):
-        if not self.pug.staged_players:
-            if not self.staging_task:
-                if self.stage_delay:
-                    self.privmsg('Staging pug in {0} seconds'.format(self.stage_delay))
-                    self.staging_task = self.bot.loop.call_later(30, self.do_stage)
-                else:
-                    self.do_stage()
-
-    def do_stage(self):
-        self.pug.stage()
+        if self.manager.picking_pug(channel, command.sender):
+            self.say(channel, '{0}, you are already in a pug being picked'.format(command.sender))
+            return
+        joined = command.sender not in pug.unstaged_players
+        pug.add(command.sender, classes, captain)
+        if self.afk:
+            self.afk.track(command.sender)
+        if not pug.can_stage:
+            if self.status:
+                if joined:
+                    self.status.joined(channel, command.sender, pug)
+            else:
+                send_unstaged(functools.partial(self.say, channel, key='unstaged'), pug.unstaged_players)
+        self.staging.update(channel, pug)
+
+    def do_stage(self, channel, pug):
+        if self.afk:
+            for nick in self.afk.pinged_among(pug.unstaged_players):
+                pug.remove(nick)
+                self.say(channel, '{0} was removed for being idle'.format(nick))
+                if not self.is_unstaged(nick):
+                    self.afk.untrack(nick)
+            if not pug.can_stage:
+                self.say(channel, 'Staging cancelled, waiting for more players')
+                return
+        if self.status:
+            self.status.discard(channel)
+        if pug.matchmaking:
+            self.form_game(channel, pug)
+            return
+        priority = self.history.priority(pug.unstaged_players)
+        pug.stage(irc_pugbot.ratings.balanced_captains(pug.unstaged_players, self.ratings), priority)
+        self.manager.staged(channel, pug)
+        if self.afk:
+            for nick in itertools.chain(pug.staged_players, pug.captains):
+                if not self.is_unstaged(nick):
+                    self.afk.untrack(nick)
         team_msg = '{0} - {1}'
-        self.privmsg('Captains: {0}'.format(', '.join(team_msg.format(COLORS[i].upper(), self.pug.captains[i]) for i in range(2))))
-        self.privmsg('It is {0}\'s turn to pick'.format(self.pug.captains[self.pug.picking_team]))
+        self.say(channel, 'Captains: {0}'.format(', '.join(team_msg.format(COLORS[i].upper(), pug.captains[i]) for i in range(2))))
+        unpicked = [nick for nick in priority if nick in pug.staged_players]
+        if unpicked:
+            self.say(channel, 'Picked last or not at all lately: {0}'.format(
+                ', '.join('{0} ({1})'.format(nick, self.history.streak(nick)) for nick in unpicked)))
+        if self.auto_pick and irc_pugbot.ratings.auto_pick(pug, self.ratings, self.auto_pick_time):
+            self.finish_game(channel, pug)
+        else:
+            self.say(channel, 'It is {0}\'s turn to pick'.format(pug.captains[pug.picking_team]))
+            if self.turns is not None:
+                self.turns.schedule(pug, self.pick_timeout)
+
+    def form_game(self, channel, pug):
+        teams = pug.matchmake(ratings=self.ratings, priority=self.history.priority(pug.unstaged_players))
+        if teams is None:
+            self.say(channel, 'No game can be formed from the queue yet, waiting for more players')
+            return
+        self.history.record(teams, [])
+        if self.afk:
+            for team in teams:
+                for nick in team.values():
+                    if not self.is_unstaged(nick):
+                        self.afk.untrack(nick)
+        self.announce_game(channel, [None, None], teams, [])
+        self.staging.update(channel, pug)
+
+    def announce_game(self, channel, captains, teams, picks):
+        game_id = self.stats.record_game(channel, captains, teams, picks) if self.stats else None
+        number = next(self.game_numbers)
+        server = self.servers.reserve(number) if self.servers else None
+        self.games[number] = Game(channel, captains, teams, game_id, server, time.time())
+        send_teams_message(functools.partial(self.say, channel), teams)
+        if server is not None:
+            password = irc_pugbot.servers.random_password()
+            demo = DEMO_NAME.format(game_id) if game_id is not None else None
+            self.bot.loop.create_task(self.setup_server(channel, server, password, demo))
+            send_player_messages(self.say, teams, server.connect_string(password))
+        else:
+            if self.servers:
+                self.say(channel, 'No free server for this game')
+            send_player_messages(self.say, teams)
+
+    @asyncio.coroutine
+    def ingest_game(self, game, ended_at):
+        channel, _, teams, game_id, server, started_at = game
+        demo_path = None
+        if server.demo_dir:
+            demo_path = os.path.join(server.demo_dir, DEMO_NAME.format(game_id) + '.dem')
+        try:
+            result = yield from self.ingest.ingest_server(server.log_dir, demo_path, started_at, ended_at)
+        except (OSError, ValueError):
+            result = None
+        if result is None:
+            self.say(channel, 'Could not read the log of game {0}'.format(game_id))
+            return
+        totals, demo = result
+        nicks = set(nick for team in teams for nick in team.values())
+        self.stats.record_combat(game_id, irc_pugbot.logs.match_players(totals, nicks))
+        if demo is not None:
+            self.stats.record_demo(game_id, demo)
+
+    @asyncio.coroutine
+    def move_teams(self, event):
+        moves = [(nick, self.mumble_channels[i]) for i, team in enumerate(event.teams) for nick in sorted(set(team.values()))]
+        missing = yield from self.mumble.move(moves)
+        if missing:
+            self.say(event.key[0], 'Could not move to mumble: {0}'.format(', '.join(missing)))
+
+    @asyncio.coroutine
+    def setup_server(self, channel, server, password, demo):
+        try:
+            yield from self.servers.setup(server, password, self.server_config, demo)
+        except (asyncio.TimeoutError, OSError, EOFError, irc_pugbot.servers.RconError):
+            self.say(channel, 'Could not set up server {0}, ask an admin to check it'.format(server.address))
+
+    def finish_game(self, channel, pug):
+        if self.turns is not None:
+            self.turns.cancel(pug)
+        captains = list(pug.captains)
+        picks = list(pug.picks)
+        unpicked = list(pug.staged_players)
+        teams = pug.make_game()
+        self.history.record(teams, picks, unpicked)
+        self.announce_game(channel, captains, teams, picks)
+        self.manager.finished(channel, pug)
+        pug = self.manager.open_pug(channel)
+        if self.afk:
+            for nick in pug.unstaged_players:
+                if nick not in self.afk:
+                    self.afk.track(nick)
+        self.staging.update(channel, pug)
+
+    def is_unstaged(self, nick):
+        return any(pug.location(nick)[0] == irc_pugbot.pug.UNSTAGED for pug in self.manager.pugs_for(nick))
+
+    def ping_idle(self, nick):
+        for pug in self.manager.pugs_for(nick):
+            self.say(pug.key[0], '{0}, are you still there? Say something in the next {1} seconds to stay added'.format(
+                nick, self.afk.grace))
+
+    def drop_idle(self, nick):
+        for pug in list(self.manager.pugs_for(nick)):
+            if pug.location(nick)[0] == irc_pugbot.pug.UNSTAGED:
+                channel = pug.key[0]
+                pug.remove(nick)
+                self.say(channel, '{0} was removed for being idle'.format(nick))
+                self.staging.update(channel, pug)
+
+    def drop_unready(self, channel, pug, nick):
+        if nick in pug.unstaged_players:
+            pug.remove(nick)
+            if self.afk and not self.is_unstaged(nick):
+                self.afk.untrack(nick)
+            self.say(channel, '{0} was removed for not being ready'.format(nick))
+
+    def turn_expired(self, pug):
+        if pug.staged_players is None:
+            return
+        channel = pug.key[0]
+        captain = pug.captains[pug.picking_team]
+        pick = irc_pugbot.ratings.best_pick(pug, self.ratings)
+        if pick is None:
+            return
+        pug.pick(*pick)
+        self.say(channel, '{0} took too long to pick, picked {1} on {2}'.format(captain, pick[0], pick[1]))
+        if pug.can_start:
+            self.finish_game(channel, pug)
+        else:
+            self.turns.schedule(pug, self.pick_timeout)
 
     @asyncio.coroutine
     def remove_command(self, bot, command):
         """Remove yourself from the pug (prior to picking start)"""
+        channel = self.command_channel(command)
+        pug = self.manager.open_pug(channel)
         try:
-            self.pug.remove(command.sender)
+            pug.remove(command.sender)
         except KeyError:
             pass
         else:
-            send_unstaged(self.privmsg, self.pug.unstaged_players)
-            if self.staging_task and not self.pug.can_stage():
-                self.staging_task.cancel()
+            if self.afk and not self.is_unstaged(command.sender):
+                self.afk.untrack(command.sender)
+            if self.status:
+                self.status.left(channel, command.sender, pug)
+            else:
+                send_unstaged(functools.partial(self.say, channel, key='unstaged'), pug.unstaged_players)
+            self.staging.update(channel, pug)
+
+    @asyncio.coroutine
+    def ready_command(self, bot, command):
+        """Confirm you are ready during a ready check"""
+        channel = self.command_channel(command)
+        if not self.staging.ready(self.manager.open_pug(channel), command.sender):
+            self.say(channel, '{0}, there is no ready check for you'.format(command.sender))
 
     @asyncio.coroutine
     def turn_command(self, bot, command):
-        if self.pug.captains:
-            self.privmsg('It is {0}\'s turn to pick.'.format(self.pug.captains[self.pug.picking_team]))
+        """Show whose turn it is to pick and the picks after it"""
+        channel = self.command_channel(command)
+        pugs = self.manager.picking_pugs(channel)
+        if pugs:
+            for pug in pugs:
+                upcoming = [pug.captains[team] for team in pug.order.upcoming(UPCOMING_PICKS + 1)]
+                turn_msg = 'It is {0}\'s turn to pick.'.format(upcoming[0])
+                if len(upcoming) > 1:
+                    turn_msg = '{0} Then: {1}'.format(turn_msg, ', '.join(upcoming[1:]))
+                self.say(channel, turn_msg)
         else:
-            self.privmsg('No pugs are currently picking')
+            self.say(channel, 'No pugs are currently picking')
+
+    @asyncio.coroutine
+    def undo_command(self, bot, command):
+        """Take back your team's last pick"""
+        channel = self.command_channel(command)
+        privmsg = functools.partial(self.say, channel)
+        pug = self.manager.captain_pug(channel, command.sender)
+        if pug is None:
+            privmsg('{0}, only captains can undo picks'.format(command.sender))
+        elif not pug.picks or pug.captains[pug.picks[-1][0]] != command.sender:
+            privmsg('{0}, the last pick was not yours'.format(command.sender))
+        else:
+            nick = pug.undo()
+            privmsg('{0} took back {1}. It is {0}\'s turn to pick'.format(command.sender, nick))
+            if self.turns is not None:
+                self.turns.schedule(pug, self.pick_timeout)
 
     @asyncio.coroutine
     def pick_command(self, bot, command):
         """Pick player on a class"""
-        if self.pug.staged_players is None:
-            self.privmsg(bot, '{0}, pug is not ready for picking'.format(command.sender))
-        elif command.sender not in self.pug.captains:
-            self.privmsg(bot, '{0}, only captains can pick'.format(command.sender))
-        elif command.sender != self.pug.captains[self.pug.picking_team]:
-            self.privmsg('{0}, it is not your pick'.format(command.sender))
-        else:
-            self.pug.pick(command.params.name, command.params.class_.lower())
-            if self.pug.can_start:
-                teams = self.pug.make_game()
-                send_teams_message(self.privmsg, teams)
-                for i, team in enumerate(teams):
-                    for class_, player in team:
-                        self.bot.send_privmsg(player, PLAYER_MSG.format(class_=class_, team=COLORS[i].title()))
-                if self.pug.can_stage:
-                    self.do_staging_task()
+        channel = self.command_channel(command)
+        privmsg = functools.partial(self.say, channel)
+        pug = self.manager.captain_pug(channel, command.sender)
+        if not self.manager.picking_pugs(channel):
+            privmsg('{0}, pug is not ready for picking'.format(command.sender))
+        elif pug is None:
+            privmsg('{0}, only captains can pick'.format(command.sender))
+        elif command.sender != pug.captains[pug.picking_team]:
+            privmsg('{0}, it is not your pick'.format(command.sender))
+        else:
+            nick = command.params.name
+            class_ = command.params.class_.lower()
+            if nick not in pug.staged_players:
+                class_filter = class_ if class_ in pug.allowed_classes else None
+                suggestions = pug.complete(nick, class_filter) or pug.complete(nick[:2], class_filter)
+                not_staged_msg = '{0}, {1} is not available to pick'.format(command.sender, nick)
+                if suggestions:
+                    not_staged_msg = '{0}. Did you mean: {1}'.format(not_staged_msg, ', '.join(suggestions[:5]))
+                privmsg(not_staged_msg)
+                return
+            partner = None
+            if self.combo_protection:
+                team = pug.teams[pug.picking_team].values()
+                partner = self.history.combo_partner(nick, itertools.chain([command.sender], team))
+            if partner is not None and self.combo_protection == 'block':
+                pair = 'you and {0}'.format(nick) if partner == command.sender else '{0} and {1}'.format(nick, partner)
+                privmsg('{0}, {1} are on the same team too often, pick someone else'.format(command.sender, pair))
+                return
+            pug.pick(nick, class_)
+            if partner is not None:
+                privmsg('{0} and {1} have been on the same team in {2} games'.format(
+                    nick, partner, self.history.together(nick, partner)))
+            if pug.can_start:
+                self.finish_game(channel, pug)
+            elif self.turns is not None:
+                self.turns.schedule(pug, self.pick_timeout)
 
     @asyncio.coroutine
     def need_command(self, bot, command):
         """Check what's needed to start the pug"""
-        captain_need_count, player_need_count, class_need_count = self.pug.need
+        channel = self.command_channel(command)
+        captain_need_count, player_need_count, class_need_count = self.manager.open_pug(channel).need
         base_need_msg = 'Need:'
         need_parts = []
         if class_need_count:
@@ -135,33 +571,144 @@ class IrcPug:
         if player_need_count:
             need_parts.append('players: {0}'.format(player_need_count))
         need_msg = '{0} {1}'.format(base_need_msg, ', '.join(need_parts))
-        self.privmsg(need_msg)
+        self.say(channel, need_msg)
 
     @asyncio.coroutine
     def list_command(self, bot, command):
         """List players for a class"""
+        channel = self.command_channel(command)
         class_ = command.params.class_.lower()
-        assert class_ in self.pug.allowed_classes
-        if self.pug.staged_players and command.sender in self.pug.staged_players:
-            players = [p for p, (cs, _) in self.pug.staged_players.items() if class_ in cs]
+        pug = self.manager.picking_pug(channel, command.sender) or self.manager.open_pug(channel)
+        assert class_ in pug.allowed_classes
+        self.say(channel, '{0}s: {1}'.format(class_, ', '.join(pug.class_players(class_))))
+
+    @asyncio.coroutine
+    def stats_command(self, bot, command):
+        """Show player or bot statistics"""
+        channel = self.command_channel(command)
+        if command.params.nicks:
+            yield from self.player_stats(channel, command.params.nicks[0])
+        elif self.metrics:
+            self.say(channel, 'Stats: {0}'.format(self.metrics.summary()))
+        else:
+            self.say(channel, 'Stats are disabled')
+
+    @asyncio.coroutine
+    def player_stats(self, channel, nick):
+        stats = (yield from self.stats.player_stats(nick)) if self.stats else None
+        if stats is None:
+            self.say(channel, 'No games recorded for {0}'.format(nick))
+            return
+        classes = ', '.join('{0} {1}'.format(class_, count) for class_, count in stats['classes'])
+        stats_msg = '{0}: {1} games, {2} wins, {3} as captain, classes: {4}'.format(
+            nick, stats['games'], stats['wins'], stats['captained'], classes)
+        combat = stats['combat']
+        if combat is not None:
+            stats_msg = '{0}. Per logged game: {1:.1f} kills, {2:.1f} deaths, {3:.0f} damage, {4:.0f} heals'.format(
+                stats_msg, *(combat[field] / combat['games'] for field in ('kills', 'deaths', 'damage', 'heals')))
+        self.say(channel, stats_msg)
+
+    @asyncio.coroutine
+    def top_command(self, bot, command):
+        """Show the players with the most games, wins or captaincies"""
+        channel = self.command_channel(command)
+        kind = command.params.kinds[0].lower() if command.params.kinds else 'games'
+        if not self.stats:
+            self.say(channel, 'Player stats are disabled')
+        elif kind not in irc_pugbot.stats.LEADERBOARDS:
+            self.say(channel, '{0}, top is one of {1}'.format(command.sender, ', '.join(irc_pugbot.stats.LEADERBOARDS)))
+        else:
+            leaders = yield from self.stats.leaderboard(kind)
+            self.say(channel, 'Top {0}: {1}'.format(kind, ', '.join('{0} {1}'.format(nick, count) for nick, count in leaders)))
+
+    @asyncio.coroutine
+    def picks_command(self, bot, command):
+        """Show how early each class gets picked"""
+        channel = self.command_channel(command)
+        if not self.stats:
+            self.say(channel, 'Player stats are disabled')
+            return
+        rates = yield from self.stats.class_pick_rates()
+        self.say(channel, 'Average pick: {0}'.format(', '.join(
+            '{0} {1:.1f}'.format(class_, mean) for class_, (picks, mean) in sorted(rates.items(), key=lambda r: r[1][1]))))
+
+    @asyncio.coroutine
+    def winner_command(self, bot, command):
+        """Report the winner of your last game (red, blue or draw)"""
+        channel = self.command_channel(command)
+        color = command.params.color.lower()
+        games = [(number, game) for number, game in self.games.items() if game.channel == channel]
+        reportable = [(number, game) for number, game in games if can_report(game, command.sender)]
+        if not games:
+            self.say(channel, 'No game is waiting for a result')
+        elif not reportable and None in games[-1][1].captains:
+            self.say(channel, '{0}, only players of the game can report the result'.format(command.sender))
+        elif not reportable:
+            self.say(channel, '{0}, only captains can report the result'.format(command.sender))
+        elif color != 'draw' and color not in COLORS:
+            self.say(channel, '{0}, the winner is one of {1} or draw'.format(command.sender, ', '.join(COLORS)))
         else:
-            players = [p for p, (cs, _) in self.pug.unstaged_players.items() if class_ in cs]
-        self.privmsg('{0}s: {1}'.format(class_, ', '.join(players)))
+            number, game = reportable[-1]
+            del self.games[number]
+            if game.server is not None and self.servers.release(game.server, number):
+                if self.ingest and game.server.log_dir:
+                    self.bot.loop.create_task(self.ingest_game(game, time.time()))
+            winner = None if color == 'draw' else COLORS.index(color)
+            self.ratings.record(game.teams, winner)
+            if self.stats:
+                self.stats.record_result(game.game_id, winner)
+            self.say(channel, 'Result recorded: {0}'.format(color))
+
+    @asyncio.coroutine
+    def rating_command(self, bot, command):
+        """Show ratings of players"""
+        channel = self.command_channel(command)
+        nicks = command.params.nicks or [command.sender]
+        self.say(channel, 'Ratings: {0}'.format(', '.join(
+            '{0} {1:.0f}'.format(nick, self.ratings.get(nick)) for nick in nicks)))
+
+    @asyncio.coroutine
+    def mumble_command(self, bot, command):
+        """Set the mumble name you are moved under when a game starts"""
+        channel = self.command_channel(command)
+        self.mumble.aliases.set(command.sender, command.params.name)
+        self.say(channel, '{0}, you will be moved as {1} on mumble'.format(command.sender, command.params.name))
+
+    @asyncio.coroutine
+    def handle_isupport(self, bot, message):
+        max_targets = parse_max_targets(message.params)
+        if max_targets:
+            self.outbound.max_targets = max_targets
 
     @asyncio.coroutine
     def handle_nick(self, bot, message):
-        old_nick = message.nick
-        new_nick = message.params[0]
-        if old_nick in self.pug.unstaged_players:
-            player_info = self.pug.unstaged_players.pop(old_nick)
-            self.pug.unstaged_players[new_nick] = player_info
-        if old_nick in self.pug.staged_players:
-            player_info = self.pug.staged_players.pop(old_nick)
-            self.pug.staged_players[new_nick] = player_info
-        if old_nick in self.pug.captains:
-            i = self.pug.captains.index(old_nick)
-            self.pug.captains[i] = new_nick
-        for team in self.pug.teams:
-            for class_, nick in team.items():
-                if old_nick == nick:
-                    team[class_] = new_nick
\ No newline at end of file
+        try:
+            self.manager.rename(message.nick, message.params[0])
+        except irc_pugbot.pug.NickInUseError:
+            self.say(self.channel, '{0} is already in a pug, {1} stays listed under the old nick'.format(
+                message.params[0], message.nick))
+            return
+        self.ratings.rename(message.nick, message.params[0])
+        self.history.rename(message.nick, message.params[0])
+        if self.mumble:
+            self.mumble.aliases.rename(message.nick, message.params[0])
+        if self.afk:
+            self.afk.rename(message.nick, message.params[0])
+        if self.flood:
+            self.flood.rename(message.nick, message.params[0])
+
+    @asyncio.coroutine
+    def handle_quit(self, bot, message):
+        for pug in list(self.manager.pugs_for(message.nick)):
+            if pug.location(message.nick)[0] == irc_pugbot.pug.UNSTAGED:
+                pug.remove(message.nick)
+                self.staging.update(pug.key[0], pug)
+        if self.afk:
+            self.afk.untrack(message.nick)
+
+    @asyncio.coroutine
+    def handle_privmsg(self, bot, message):
+        if self.afk:
+            self.afk.active(message.nick)
+        if self.flood:
+            self.flood.seen(message.nick, getattr(message, 'prefix', None))
@@ -0,0 +1,107 @@
+import asyncio
+import concurrent.futures
+import json
+import os
+
+
+def _fsync_write(path, mode, data):
+    with open(path, mode) as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+class Journal:
+    """Append-only event journal with periodic snapshots of a PugManager
+
+    Events are buffered and written in batches on a single worker thread, so
+    writes keep their order and the event loop never waits on the disk. Every
+    snapshot_interval events a snapshot of the whole manager is written and
+    the journal is truncated; replay loads the snapshot and then the journal
+    entries recorded after it.
+    """
+
+    def __init__(self, path, loop=None, flush_delay=0.05, snapshot_interval=10000):
+        self.journal_path = path + '.journal'
+        self.snapshot_path = path + '.snapshot'
+        self.loop = loop or asyncio.get_event_loop()
+        self.flush_delay = flush_delay
+        self.snapshot_interval = snapshot_interval
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self.manager = None
+        self.seq = 0
+        self.snapshot_seq = 0
+        self.pending = []
+        self.flush_handle = None
+        self.last_write = None
+
+    def attach(self, manager):
+        self.manager = manager
+        manager.listeners.append(self.record)
+
+    def record(self, key, event, args):
+        self.seq += 1
+        self.pending.append(json.dumps([self.seq, key[0], key[1], event, list(args)]) + '\n')
+        if self.seq - self.snapshot_seq >= self.snapshot_interval:
+            self.snapshot()
+        elif self.flush_handle is None:
+            self.flush_handle = self.loop.call_later(self.flush_delay, self.flush)
+
+    def flush(self):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        if self.pending:
+            data, self.pending = ''.join(self.pending), []
+            self.last_write = self.loop.run_in_executor(self.executor, _fsync_write, self.journal_path, 'a', data)
+        return self.last_write
+
+    def snapshot(self):
+        """Write a snapshot of the manager and truncate the journal behind it"""
+        self.flush()
+        self.snapshot_seq = self.seq
+        state = {'seq': self.seq, 'manager': self.manager.snapshot()}
+        self.last_write = self.loop.run_in_executor(self.executor, self._write_snapshot, state)
+        return self.last_write
+
+    def _write_snapshot(self, state):
+        tmp_path = self.snapshot_path + '.tmp'
+        _fsync_write(tmp_path, 'w', json.dumps(state))
+        os.replace(tmp_path, self.snapshot_path)
+        _fsync_write(self.journal_path, 'w', '')
+
+    @asyncio.coroutine
+    def close(self):
+        last_write = self.flush()
+        if last_write is not None:
+            yield from last_write
+        self.executor.shutdown()
+
+    def load(self):
+        """Read the last snapshot and the journal entries recorded after it"""
+        state = None
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path) as f:
+                state = json.load(f)
+            self.seq = self.snapshot_seq = state['seq']
+        events = []
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path) as f:
+                for line in f:
+                    try:
+                        seq, channel, lobby_id, event, args = json.loads(line)
+                    except ValueError:
+                        break
+                    if seq > self.seq:
+                        events.append(((channel, lobby_id), event, args))
+                        self.seq = seq
+        return state, events
+
+    def replay(self, manager):
+        """Restore a manager from disk, then keep journaling its changes"""
+        state, events = self.load()
+        if state is not None:
+            manager.restore(state['manager'])
+        for key, event, args in events:
+            manager.apply(key, event, args)
+        self.attach(manager)
@@ -0,0 +1,165 @@
+import asyncio
+import concurrent.futures
+import os
+import re
+import struct
+
+MAX_LINE = 4096
+MAX_PLAYERS = 64
+LOG_CLOSE_SLACK = 120
+FIELDS = ('damage', 'kills', 'deaths', 'assists', 'heals')
+DEMO_MAGIC = b'HL2DEMO\x00'
+DEMO_HEADER = struct.Struct('<8sii260s260s260s260sfiii')
+
+_PLAYER = r'"(.+?)<\d+><[^>]*><[^>]*>"'
+KILL_RE = re.compile(_PLAYER + r' killed ' + _PLAYER)
+DAMAGE_RE = re.compile(_PLAYER + r' triggered "damage" against ' + _PLAYER + r' \(damage "(\d+)"\)')
+HEAL_RE = re.compile(_PLAYER + r' triggered "healed" against ' + _PLAYER + r' \(healing "(\d+)"\)')
+ASSIST_RE = re.compile(_PLAYER + r' triggered "kill assist" against ' + _PLAYER)
+
+
+def read_lines(path, max_line=MAX_LINE):
+    """Lines of a log file read as they are needed, skipping overlong ones"""
+    with open(path, 'rb') as f:
+        for line in f:
+            if len(line) <= max_line:
+                yield line.decode('utf-8', errors='replace')
+
+
+def parse_events(lines):
+    """(kind, player, target, amount) for every kill, assist, damage and heal line"""
+    for line in lines:
+        if ' killed ' in line:
+            match = KILL_RE.search(line)
+            if match:
+                yield 'kill', match.group(1), match.group(2), 1
+        elif '"damage"' in line:
+            match = DAMAGE_RE.search(line)
+            if match:
+                yield 'damage', match.group(1), match.group(2), int(match.group(3))
+        elif '"healed"' in line:
+            match = HEAL_RE.search(line)
+            if match:
+                yield 'heal', match.group(1), match.group(2), int(match.group(3))
+        elif '"kill assist"' in line:
+            match = ASSIST_RE.search(line)
+            if match:
+                yield 'assist', match.group(1), match.group(2), 1
+
+
+def summarize(events, max_players=MAX_PLAYERS):
+    """Per player totals in FIELDS order, holding at most max_players players"""
+    totals = {}
+
+    def row(name):
+        player = totals.get(name)
+        if player is None and len(totals) < max_players:
+            player = totals[name] = [0] * len(FIELDS)
+        return player
+
+    for kind, name, target, amount in events:
+        player = row(name)
+        if kind == 'kill':
+            if player is not None:
+                player[1] += 1
+            victim = row(target)
+            if victim is not None:
+                victim[2] += 1
+        elif player is None:
+            continue
+        elif kind == 'damage':
+            player[0] += amount
+        elif kind == 'heal':
+            player[4] += amount
+        else:
+            player[3] += 1
+    return totals
+
+
+def parse_log(path, max_players=MAX_PLAYERS):
+    return summarize(parse_events(read_lines(path)), max_players)
+
+
+def parse_demo(path):
+    """Map, server and length of an STV demo from its header"""
+    with open(path, 'rb') as f:
+        header = f.read(DEMO_HEADER.size)
+    if len(header) < DEMO_HEADER.size or not header.startswith(DEMO_MAGIC):
+        raise ValueError('{0} is not a demo'.format(path))
+    _, _, _, server, _, map_, _, duration, ticks, frames, _ = DEMO_HEADER.unpack(header)
+    return {
+        'server': server.split(b'\x00', 1)[0].decode(errors='replace'),
+        'map': map_.split(b'\x00', 1)[0].decode(errors='replace'),
+        'duration': duration,
+        'ticks': ticks,
+        'frames': frames,
+    }
+
+
+def latest_log(directory, since=None, until=None, slack=LOG_CLOSE_SLACK):
+    """The most recently written log in a server's log directory, or None
+
+    With since and until, only logs last written within that window of
+    wall clock times count, so a log of the game the server moved on to
+    is never picked. The window stays open slack seconds past until, as a
+    server keeps writing disconnects and the closing line to a game's log
+    after the result is reported.
+    """
+    logs = []
+    for name in os.listdir(directory):
+        if name.endswith('.log'):
+            path = os.path.join(directory, name)
+            mtime = os.path.getmtime(path)
+            if (since is None or mtime >= since) and (until is None or mtime <= until + slack):
+                logs.append((mtime, path))
+    return max(logs)[1] if logs else None
+
+
+def match_players(totals, nicks):
+    """Totals keyed by the nicks whose in-game names match, ignoring case"""
+    by_name = {nick.lower(): nick for nick in nicks}
+    matched = {}
+    for name, row in totals.items():
+        nick = by_name.get(name.lower())
+        if nick is not None:
+            matched[nick] = row
+    return matched
+
+
+class IngestPipeline:
+    """Post-game log and demo parsing in worker processes
+
+    A log is streamed through parse_events line by line and folded into
+    per player totals as it goes, so a worker holds one line and at most
+    max_players rows whatever the log size. Logs and demos of different
+    games parse in parallel across the pool and the event loop only waits
+    on the futures.
+    """
+
+    def __init__(self, loop, workers=2, max_players=MAX_PLAYERS):
+        self.loop = loop
+        self.max_players = max_players
+        self.executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+
+    @asyncio.coroutine
+    def ingest(self, log_path, demo_path=None):
+        """Per player totals from a log, and the demo header when a readable demo is given"""
+        jobs = [self.loop.run_in_executor(self.executor, parse_log, log_path, self.max_players)]
+        if demo_path is not None:
+            jobs.append(self.loop.run_in_executor(self.executor, parse_demo, demo_path))
+        results = yield from asyncio.gather(*jobs, loop=self.loop, return_exceptions=True)
+        if isinstance(results[0], Exception):
+            raise results[0]
+        demo = results[1] if len(results) > 1 and not isinstance(results[1], Exception) else None
+        return results[0], demo
+
+    @asyncio.coroutine
+    def ingest_server(self, log_dir, demo_path=None, since=None, until=None):
+        """Ingest the newest log in a server's log directory written between since and shortly after until, None if there is none"""
+        log_path = yield from self.loop.run_in_executor(self.executor, latest_log, log_dir, since, until)
+        if log_path is None:
+            return None
+        return (yield from self.ingest(log_path, demo_path))
+
+    def close(self):
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,141 @@
+import collections
+import irc_pugbot.events
+import irc_pugbot.pug
+
+
+class PugManager:
+    """Hosts pugs for many channels, several lobbies per channel
+
+    Each channel has one open lobby taking adds. When the open lobby stages,
+    a fresh lobby is opened so overflow players can form the next pug while
+    the first one is picking. All pugs share one nick directory mapping each
+    participant to the pugs they are in.
+    """
+
+    def __init__(self, pug_factory, bus=None):
+        self.pug_factory = pug_factory
+        self.directory = {}
+        self.listeners = []
+        self.bus = bus
+        self.lobbies = {}
+        self.open_lobbies = {}
+        self.lobby_ids = collections.Counter()
+
+    def __contains__(self, channel):
+        return channel in self.lobbies
+
+    def __iter__(self):
+        for channel, lobbies in self.lobbies.items():
+            for lobby_id, pug in lobbies.items():
+                yield channel, lobby_id, pug
+
+    def add_channel(self, channel):
+        if channel not in self.lobbies:
+            self.open_lobby(channel)
+
+    def _new_pug(self, channel, lobby_id):
+        pug = self.pug_factory(directory=self.directory, listeners=self.listeners, bus=self.bus)
+        pug.key = (channel, lobby_id)
+        self.lobbies[channel][lobby_id] = pug
+        return pug
+
+    def _record(self, key, event):
+        for listener in self.listeners:
+            listener(key, event, ())
+
+    def open_lobby(self, channel):
+        if channel not in self.lobbies:
+            self.lobbies[channel] = collections.OrderedDict()
+        self.lobby_ids[channel] += 1
+        lobby_id = self.lobby_ids[channel]
+        self._new_pug(channel, lobby_id)
+        self.open_lobbies[channel] = lobby_id
+        self._record((channel, lobby_id), 'open')
+        if self.bus is not None:
+            self.bus.publish(irc_pugbot.events.LobbyOpened((channel, lobby_id)))
+        return lobby_id
+
+    def close_lobby(self, channel, lobby_id):
+        del self.lobbies[channel][lobby_id]
+        self._record((channel, lobby_id), 'close')
+        if self.bus is not None:
+            self.bus.publish(irc_pugbot.events.LobbyClosed((channel, lobby_id)))
+
+    def open_pug(self, channel):
+        """The lobby of a channel currently taking adds"""
+        return self.lobbies[channel][self.open_lobbies[channel]]
+
+    def picking_pugs(self, channel):
+        return [pug for pug in self.lobbies[channel].values() if pug.staged_players is not None]
+
+    def pugs_for(self, nick):
+        return self.directory.get(nick, ())
+
+    def captain_pug(self, channel, nick):
+        for pug in self.pugs_for(nick):
+            if pug.key[0] == channel and pug.is_captain(nick):
+                return pug
+        return None
+
+    def staged_pug(self, channel, nick):
+        for pug in self.pugs_for(nick):
+            if pug.key[0] == channel and pug.location(nick)[0] == irc_pugbot.pug.STAGED:
+                return pug
+        return None
+
+    def picking_pug(self, channel, nick):
+        """The lobby where a nick is staged, captaining or already picked"""
+        for pug in self.pugs_for(nick):
+            if pug.key[0] == channel and pug.location(nick)[0] != irc_pugbot.pug.UNSTAGED:
+                return pug
+        return None
+
+    def rename(self, old_nick, new_nick):
+        """Rename a nick in every pug, or in none if one of them already has the new nick"""
+        if any(pug in self.pugs_for(new_nick) for pug in self.pugs_for(old_nick)):
+            raise irc_pugbot.pug.NickInUseError(new_nick)
+        for pug in list(self.pugs_for(old_nick)):
+            pug.rename(old_nick, new_nick)
+
+    def staged(self, channel, pug):
+        """Open an overflow lobby once the open lobby starts picking"""
+        if pug is self.open_pug(channel):
+            self.open_lobby(channel)
+
+    def finished(self, channel, pug):
+        """Fold a finished lobby's leftover players back into the open lobby"""
+        open_pug = self.open_pug(channel)
+        if pug is open_pug:
+            return
+        for nick, player in pug.unstaged_players.items():
+            if nick not in open_pug.unstaged_players:
+                open_pug.add(nick, player.classes, player.captain)
+        for nick in list(pug.unstaged_players):
+            pug.remove(nick)
+        self.close_lobby(channel, pug.key[1])
+
+    def apply(self, key, event, args):
+        """Replay one recorded event"""
+        channel, lobby_id = key
+        if event == 'open':
+            assert self.open_lobby(channel) == lobby_id
+        elif event == 'close':
+            self.close_lobby(channel, lobby_id)
+        else:
+            getattr(self.lobbies[channel][lobby_id], event)(*args)
+
+    def snapshot(self):
+        return {
+            'lobby_ids': dict(self.lobby_ids),
+            'open_lobbies': dict(self.open_lobbies),
+            'lobbies': {channel: [[lobby_id, pug.snapshot()] for lobby_id, pug in lobbies.items()]
+                        for channel, lobbies in self.lobbies.items()},
+        }
+
+    def restore(self, state):
+        self.lobby_ids.update(state['lobby_ids'])
+        self.open_lobbies.update(state['open_lobbies'])
+        for channel, lobbies in state['lobbies'].items():
+            self.lobbies[channel] = collections.OrderedDict()
+            for lobby_id, pug_state in lobbies:
+                self._new_pug(channel, lobby_id).restore(pug_state)
@@ -0,0 +1,156 @@
+import collections
+
+
+def max_matching_size(players, capacities):
+    """Solve the player to class slot matching from scratch"""
+    slots = {c: [] for c in capacities}
+
+    def augment(nick, seen):
+        for class_ in players[nick]:
+            if class_ not in slots or class_ in seen:
+                continue
+            seen.add(class_)
+            if len(slots[class_]) < capacities[class_]:
+                slots[class_].append(nick)
+                return True
+            for i, other in enumerate(slots[class_]):
+                if augment(other, seen):
+                    slots[class_][i] = nick
+                    return True
+        return False
+
+    return sum(1 for nick in players if augment(nick, set()))
+
+
+class SlotMatcher:
+    """Maximum matching of players onto class slots with per-class capacities
+
+    The matching is kept maximum as players come and go: an add runs one
+    augmenting search from the new player and a remove runs one from the slot
+    it frees, so neither rebuilds the matching.
+    """
+
+    def __init__(self, capacities):
+        self.capacities = dict(capacities)
+        self.players = {}
+        self.assignments = {}
+        self.slots = {c: set() for c in self.capacities}
+        self.waiting = {c: {} for c in self.capacities}
+
+    def __contains__(self, nick):
+        return nick in self.players
+
+    def __len__(self):
+        return len(self.players)
+
+    @property
+    def size(self):
+        return len(self.assignments)
+
+    @property
+    def slot_count(self):
+        return sum(self.capacities.values())
+
+    @property
+    def full(self):
+        return self.size == self.slot_count
+
+    def shortfall(self):
+        return {c: cap - len(self.slots[c]) for c, cap in self.capacities.items() if len(self.slots[c]) < cap}
+
+    def add(self, nick, classes):
+        if nick in self.players:
+            self.remove(nick)
+        self.players[nick] = tuple(c for c in classes if c in self.capacities)
+        if not self._augment(nick):
+            for class_ in self.players[nick]:
+                self.waiting[class_][nick] = None
+
+    def remove(self, nick):
+        classes = self.players.pop(nick)
+        class_ = self.assignments.pop(nick, None)
+        if class_ is None:
+            for c in classes:
+                self.waiting[c].pop(nick, None)
+        else:
+            self.slots[class_].remove(nick)
+            self._fill(class_)
+
+    def rename(self, old_nick, new_nick):
+        classes = self.players.pop(old_nick)
+        self.players[new_nick] = classes
+        class_ = self.assignments.pop(old_nick, None)
+        if class_ is None:
+            for c in classes:
+                self.waiting[c].pop(old_nick, None)
+                self.waiting[c][new_nick] = None
+        else:
+            self.slots[class_].remove(old_nick)
+            self.slots[class_].add(new_nick)
+            self.assignments[new_nick] = class_
+
+    def clear(self):
+        self.players.clear()
+        self.assignments.clear()
+        for class_ in self.capacities:
+            self.slots[class_].clear()
+            self.waiting[class_].clear()
+
+    def verify(self):
+        """Check the matching is consistent and as large as a fresh solve"""
+        for nick, class_ in self.assignments.items():
+            assert class_ in self.players[nick]
+            assert nick in self.slots[class_]
+        for class_, nicks in self.slots.items():
+            assert len(nicks) <= self.capacities[class_]
+        return self.size == max_matching_size(self.players, self.capacities)
+
+    def _assign(self, nick, class_):
+        old_class = self.assignments.get(nick)
+        if old_class is not None:
+            self.slots[old_class].remove(nick)
+        self.slots[class_].add(nick)
+        self.assignments[nick] = class_
+
+    def _augment(self, nick):
+        parents = {}
+        queue = collections.deque()
+        for class_ in self.players[nick]:
+            if class_ not in parents:
+                parents[class_] = nick
+                queue.append(class_)
+        while queue:
+            class_ = queue.popleft()
+            if len(self.slots[class_]) < self.capacities[class_]:
+                while class_ is not None:
+                    mover = parents[class_]
+                    previous = self.assignments.get(mover)
+                    self._assign(mover, class_)
+                    class_ = previous
+                return True
+            for other in self.slots[class_]:
+                for next_class in self.players[other]:
+                    if next_class not in parents:
+                        parents[next_class] = other
+                        queue.append(next_class)
+        return False
+
+    def _fill(self, class_):
+        parents = {class_: None}
+        queue = collections.deque([class_])
+        while queue:
+            class_ = queue.popleft()
+            if self.waiting[class_]:
+                nick = next(iter(self.waiting[class_]))
+                for c in self.players[nick]:
+                    self.waiting[c].pop(nick, None)
+                self._assign(nick, class_)
+                while parents[class_] is not None:
+                    mover, class_ = parents[class_]
+                    self._assign(mover, class_)
+                return True
+            for other, other_class in self.assignments.items():
+                if other_class not in parents and class_ in self.players[other]:
+                    parents[other_class] = (other, class_)
+                    queue.append(other_class)
+        return False
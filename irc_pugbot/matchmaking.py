@@ -0,0 +1,131 @@
+import irc_pugbot.formats
+
+REQUIRED_BONUS = 1 << 40
+
+
+def assign_classes(players, format_):
+    """Choose a game's players from a queue and put each on one of their classes
+
+    players maps nick to Player in queue order. The result is a min cost
+    flow from the queue through classes: filling a class up to twice its
+    per team minimum outweighs everything, then earlier queue positions
+    outweigh class preferences, then players are kept as close to the front
+    of their class list as possible. The flow grows one player at a time
+    along shortest augmenting paths. A path brings in the earliest queued
+    player still out for some class and may move chosen players across
+    classes on the way, so it runs over the classes alone, however long the
+    queue is.
+
+    Returns {nick: class} for format_.player_count players, or None if the
+    queue cannot fill a game.
+    """
+    classes = format_.allowed_classes
+    required = {c: 2 * format_.class_min.get(c, 0) for c in classes}
+    capacity = {c: 2 * format_.class_max[c] for c in classes}
+    queue_weight = len(irc_pugbot.formats.CLASSES) * format_.player_count
+    queues = {c: [] for c in classes}
+    ranks = {}
+    for position, (nick, player) in enumerate(players.items()):
+        rank = ranks[nick] = {}
+        for i, class_ in enumerate(player.classes):
+            if class_ in queues:
+                rank[class_] = i
+                queues[class_].append((position * queue_weight + i, nick))
+    heads = {c: 0 for c in classes}
+    counts = {c: 0 for c in classes}
+    members = {c: set() for c in classes}
+    assignment = {}
+    for _ in range(format_.player_count):
+        dist = {}
+        prev = {}
+        for class_ in classes:
+            queue = queues[class_]
+            head = heads[class_]
+            while head < len(queue) and queue[head][1] in assignment:
+                head += 1
+            heads[class_] = head
+            if head < len(queue):
+                dist[class_], nick = queue[head]
+                prev[class_] = (nick, None)
+        for _ in range(len(classes)):
+            changed = False
+            for class_, nicks in members.items():
+                if class_ not in dist:
+                    continue
+                for nick in nicks:
+                    base = dist[class_] - ranks[nick][class_]
+                    for other, rank in ranks[nick].items():
+                        cost = base + rank
+                        if other != class_ and cost < dist.get(other, cost + 1):
+                            dist[other] = cost
+                            prev[other] = (nick, class_)
+                            changed = True
+            if not changed:
+                break
+        best = None
+        for class_, cost in dist.items():
+            if counts[class_] < required[class_]:
+                cost -= REQUIRED_BONUS
+            elif counts[class_] >= capacity[class_]:
+                continue
+            if best is None or cost < best[0]:
+                best = (cost, class_)
+        if best is None:
+            return None
+        class_ = best[1]
+        counts[class_] += 1
+        while True:
+            nick, source = prev[class_]
+            members[class_].add(nick)
+            assignment[nick] = class_
+            if source is None:
+                break
+            members[source].discard(nick)
+            class_ = source
+    if any(counts[c] < required[c] for c in classes):
+        return None
+    return assignment
+
+
+def split_teams(assignment, format_, ratings=None):
+    """Split assigned players into two teams within the format's class limits
+
+    Each class goes half to each team, with odd classes handing their extra
+    player to the smaller team. Within a class the stronger players go
+    first, each to the weaker team that still has room for the class.
+    """
+    by_class = {}
+    for nick, class_ in assignment.items():
+        by_class.setdefault(class_, []).append(nick)
+    quotas = [{}, {}]
+    sizes = [0, 0]
+    for class_ in sorted(by_class, key=lambda c: len(by_class[c]) % 2):
+        count = len(by_class[class_])
+        extra = 0 if sizes[0] <= sizes[1] else 1
+        for team in range(2):
+            quotas[team][class_] = count // 2 + (count % 2 if team == extra else 0)
+            sizes[team] += quotas[team][class_]
+    teams = [{}, {}]
+    totals = [0, 0]
+    for class_ in format_.allowed_classes:
+        nicks = by_class.get(class_, [])
+        if ratings is not None:
+            nicks = sorted(nicks, key=ratings.get, reverse=True)
+        for nick in nicks:
+            open_teams = [team for team in range(2) if quotas[team][class_] > 0]
+            team = min(open_teams, key=lambda t: (totals[t], t))
+            quotas[team][class_] -= 1
+            teams[team][format_.free_slot(teams[team], class_)] = nick
+            if ratings is not None:
+                totals[team] += ratings.get(nick)
+            else:
+                totals[team] += 1
+    return teams
+
+
+def form_game(players, format_, ratings=None):
+    """Two teams formed from a queue of players, or None if it cannot fill a game"""
+    assignment = assign_classes(players, format_)
+    if assignment is None:
+        return None
+    return split_teams(assignment, format_, ratings)
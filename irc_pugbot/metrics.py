@@ -0,0 +1,123 @@
+import asyncio
+import bisect
+import time
+
+LATENCY_BUCKETS = [1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+
+class HandlerStats:
+    __slots__ = ['errors', 'total', 'buckets']
+
+    def __init__(self):
+        self.errors = 0
+        self.total = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    @property
+    def calls(self):
+        return sum(self.buckets)
+
+    def observe(self, seconds, bisect_left=bisect.bisect_left):
+        self.total += seconds
+        self.buckets[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the given fraction of calls"""
+        rank = self.calls * fraction
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.buckets):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+
+class Metrics:
+    """Latency histograms and counters for bot handlers plus state gauges
+
+    Handlers registered through wrap() are timed on every call; gauges are
+    callables sampled only when the metrics are rendered. The timing wrapper
+    does its bookkeeping inline on a preallocated bucket list: two clock
+    reads, one bisect, one float add and one list increment per call, with
+    the call count derived from the buckets when rendered.
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.handlers = {}
+        self.gauges = {}
+        self.server = None
+
+    def wrap(self, name, handler):
+        stats = self.handlers.setdefault(name, HandlerStats())
+        clock = self.clock
+        buckets = stats.buckets
+        bisect_left = bisect.bisect_left
+
+        @asyncio.coroutine
+        def timed(bot, message):
+            start = clock()
+            try:
+                return (yield from handler(bot, message))
+            except Exception:
+                stats.errors += 1
+                raise
+            finally:
+                elapsed = clock() - start
+                stats.total += elapsed
+                buckets[bisect_left(LATENCY_BUCKETS, elapsed)] += 1
+        return timed
+
+    def gauge(self, name, sample):
+        self.gauges[name] = sample
+
+    def summary(self):
+        parts = []
+        for name, stats in sorted(self.handlers.items()):
+            calls = stats.calls
+            if calls:
+                parts.append('{0}: {1} calls, {2} errors, p50 {3:g}ms, p99 {4:g}ms'.format(
+                    name, calls, stats.errors, stats.percentile(0.5) * 1000, stats.percentile(0.99) * 1000))
+        parts.extend('{0}: {1}'.format(name, sample()) for name, sample in sorted(self.gauges.items()))
+        return '; '.join(parts)
+
+    def render(self):
+        """Prometheus text exposition of all metrics"""
+        lines = ['# TYPE pugbot_handler_seconds histogram']
+        for name, stats in sorted(self.handlers.items()):
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, stats.buckets):
+                cumulative += count
+                lines.append('pugbot_handler_seconds_bucket{{handler="{0}",le="{1:g}"}} {2}'.format(name, bound, cumulative))
+            lines.append('pugbot_handler_seconds_bucket{{handler="{0}",le="+Inf"}} {1}'.format(name, stats.calls))
+            lines.append('pugbot_handler_seconds_sum{{handler="{0}"}} {1!r}'.format(name, stats.total))
+            lines.append('pugbot_handler_seconds_count{{handler="{0}"}} {1}'.format(name, stats.calls))
+        lines.append('# TYPE pugbot_handler_errors_total counter')
+        for name, stats in sorted(self.handlers.items()):
+            lines.append('pugbot_handler_errors_total{{handler="{0}"}} {1}'.format(name, stats.errors))
+        for name, sample in sorted(self.gauges.items()):
+            lines.append('# TYPE pugbot_{0} gauge'.format(name))
+            lines.append('pugbot_{0} {1}'.format(name, sample()))
+        return '\n'.join(lines) + '\n'
+
+    @asyncio.coroutine
+    def handle_request(self, reader, writer):
+        request = yield from reader.readline()
+        while (yield from reader.readline()) not in (b'\r\n', b'\n', b''):
+            pass
+        if request.split(b' ')[1:2] in ([b'/metrics'], [b'/']):
+            body = self.render().encode()
+            status = b'200 OK'
+        else:
+            body = b'not found\n'
+            status = b'404 Not Found'
+        writer.write(b'HTTP/1.0 ' + status + b'\r\nContent-Type: text/plain; version=0.0.4\r\n' +
+                     'Content-Length: {0}\r\n\r\n'.format(len(body)).encode() + body)
+        yield from writer.drain()
+        writer.close()
+
+    @asyncio.coroutine
+    def serve(self, port, host='127.0.0.1', loop=None):
+        self.server = yield from asyncio.start_server(self.handle_request, host, port, loop=loop)
+        return self.server
@@ -0,0 +1,286 @@
+import asyncio
+import ssl
+import struct
+
+VERSION = 0
+AUTHENTICATE = 2
+PING = 3
+REJECT = 4
+SERVER_SYNC = 5
+CHANNEL_REMOVE = 6
+CHANNEL_STATE = 7
+USER_REMOVE = 8
+USER_STATE = 9
+
+CLIENT_VERSION = (1 << 16) | (3 << 8)
+HEADER = struct.Struct('>HI')
+MAX_MESSAGE = 8 * 1024 * 1024
+
+
+class MumbleError(Exception):
+    pass
+
+
+def encode_varint(value):
+    data = bytearray()
+    while value > 0x7f:
+        data.append(value & 0x7f | 0x80)
+        value >>= 7
+    data.append(value)
+    return bytes(data)
+
+
+def decode_varint(data, offset):
+    value = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return value, offset
+        shift += 7
+
+
+def encode_fields(fields):
+    """Protobuf encoding of (field number, value) pairs, ints as varints and strings as bytes"""
+    data = bytearray()
+    for number, value in fields:
+        if value is None:
+            continue
+        if isinstance(value, str):
+            value = value.encode()
+        if isinstance(value, bytes):
+            data += encode_varint(number << 3 | 2) + encode_varint(len(value)) + value
+        else:
+            data += encode_varint(number << 3) + encode_varint(int(value))
+    return bytes(data)
+
+
+def decode_fields(data):
+    """{field number: value} of a protobuf message, the last value winning for repeated fields
+
+    Length delimited values are left as bytes and fixed width ones skipped.
+    """
+    fields = {}
+    offset = 0
+    while offset < len(data):
+        key, offset = decode_varint(data, offset)
+        number, wire_type = key >> 3, key & 7
+        if wire_type == 0:
+            fields[number], offset = decode_varint(data, offset)
+        elif wire_type == 2:
+            length, offset = decode_varint(data, offset)
+            fields[number] = data[offset:offset + length]
+            offset += length
+        elif wire_type == 1:
+            offset += 8
+        elif wire_type == 5:
+            offset += 4
+        else:
+            raise ValueError('unsupported wire type {0}'.format(wire_type))
+    return fields
+
+
+def frame(type_, fields):
+    payload = encode_fields(fields)
+    return HEADER.pack(type_, len(payload)) + payload
+
+
+@asyncio.coroutine
+def read_frame(reader):
+    type_, length = HEADER.unpack((yield from reader.readexactly(HEADER.size)))
+    if length > MAX_MESSAGE:
+        raise MumbleError('message of {0} bytes is too long'.format(length))
+    return type_, (yield from reader.readexactly(length))
+
+
+def insecure_context():
+    """TLS without certificate checks, for the self-signed certificates most Mumble servers use"""
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+class AliasTable:
+    """IRC nick to Mumble user name mapping with a cache of resolved sessions
+
+    A nick without an alias is looked for under its own name. Names are
+    compared ignoring case. Resolved sessions are cached until the server
+    reports a user joining, leaving or changing name.
+    """
+
+    def __init__(self, aliases=None):
+        self.aliases = {nick.lower(): name for nick, name in (aliases or {}).items()}
+        self.sessions = {}
+        self.cache = {}
+
+    def set(self, nick, name):
+        self.aliases[nick.lower()] = name
+        self.cache.pop(nick.lower(), None)
+
+    def rename(self, old_nick, new_nick):
+        if old_nick.lower() in self.aliases:
+            self.set(new_nick, self.aliases.pop(old_nick.lower()))
+        self.cache.pop(old_nick.lower(), None)
+
+    def user_changed(self, session, name):
+        for known, known_session in list(self.sessions.items()):
+            if known_session == session:
+                del self.sessions[known]
+        if name is not None:
+            self.sessions[name.lower()] = session
+        self.cache = {}
+
+    def clear(self):
+        self.sessions = {}
+        self.cache = {}
+
+    def session(self, nick):
+        key = nick.lower()
+        try:
+            return self.cache[key]
+        except KeyError:
+            session = self.cache[key] = self.sessions.get(self.aliases.get(key, nick).lower())
+            return session
+
+
+class MumbleClient:
+    """One persistent control connection to a Mumble server
+
+    The connection authenticates as a bot user, keeps the server's user and
+    channel lists from the state messages it is sent and pings to stay
+    connected. When the connection drops it reconnects after a delay that
+    doubles on every failed attempt up to backoff_max, and starts again
+    from backoff_initial once a connection is synced. Moving players writes
+    one UserState message per player in a single write.
+    """
+
+    def __init__(self, loop, host, port=64738, username='pugbot', password=None, ssl_context=None, aliases=None,
+                 ping_interval=15, backoff_initial=1, backoff_max=60):
+        self.loop = loop
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.ssl_context = ssl_context
+        self.aliases = AliasTable(aliases)
+        self.ping_interval = ping_interval
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.channels = {}
+        self.session = None
+        self.reader = None
+        self.writer = None
+        self.synced = asyncio.Future(loop=loop)
+        self.task = None
+        self.ping_handle = None
+        self.connects = 0
+
+    @property
+    def connected(self):
+        return self.session is not None
+
+    def start(self):
+        self.task = self.loop.create_task(self.run())
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        self._disconnected()
+
+    @asyncio.coroutine
+    def run(self):
+        delay = self.backoff_initial
+        while True:
+            try:
+                yield from self.connect()
+                delay = self.backoff_initial
+                yield from self.read_loop()
+            except (OSError, EOFError, ValueError, IndexError, MumbleError, asyncio.IncompleteReadError):
+                pass
+            finally:
+                self._disconnected()
+            yield from asyncio.sleep(delay, loop=self.loop)
+            delay = min(delay * 2, self.backoff_max)
+
+    @asyncio.coroutine
+    def connect(self):
+        self.reader, self.writer = yield from asyncio.open_connection(
+            self.host, self.port, ssl=self.ssl_context, loop=self.loop)
+        self.writer.write(frame(VERSION, [(1, CLIENT_VERSION), (2, 'irc-pugbot')]) +
+                          frame(AUTHENTICATE, [(1, self.username), (2, self.password), (5, 1)]))
+        while self.session is None:
+            type_, payload = yield from read_frame(self.reader)
+            self.handle(type_, decode_fields(payload))
+        self.connects += 1
+        self.ping_handle = self.loop.call_later(self.ping_interval, self._ping)
+        if not self.synced.done():
+            self.synced.set_result(None)
+
+    @asyncio.coroutine
+    def read_loop(self):
+        while True:
+            type_, payload = yield from read_frame(self.reader)
+            self.handle(type_, decode_fields(payload))
+
+    def handle(self, type_, fields):
+        if type_ == CHANNEL_STATE:
+            if 3 in fields:
+                channel_id = fields.get(1, 0)
+                self.channels = {name: id_ for name, id_ in self.channels.items() if id_ != channel_id}
+                self.channels[fields[3].decode(errors='replace').lower()] = channel_id
+        elif type_ == CHANNEL_REMOVE:
+            self.channels = {name: id_ for name, id_ in self.channels.items() if id_ != fields.get(1)}
+        elif type_ == USER_STATE:
+            if 3 in fields:
+                self.aliases.user_changed(fields.get(1), fields[3].decode(errors='replace'))
+        elif type_ == USER_REMOVE:
+            self.aliases.user_changed(fields.get(1), None)
+        elif type_ == SERVER_SYNC:
+            self.session = fields.get(1)
+        elif type_ == REJECT:
+            raise MumbleError('rejected: {0}'.format(fields.get(2, b'').decode(errors='replace')))
+
+    def _ping(self):
+        if self.writer is not None:
+            self.writer.write(frame(PING, [(1, int(self.loop.time() * 1000))]))
+            self.ping_handle = self.loop.call_later(self.ping_interval, self._ping)
+
+    def _disconnected(self):
+        if self.ping_handle is not None:
+            self.ping_handle.cancel()
+            self.ping_handle = None
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        self.reader = None
+        self.session = None
+        self.channels = {}
+        self.aliases.clear()
+        if self.synced.done():
+            self.synced = asyncio.Future(loop=self.loop)
+
+    @asyncio.coroutine
+    def move(self, moves):
+        """Move (nick, channel name) pairs in one write, returning the nicks that could not be moved"""
+        if self.writer is None:
+            return [nick for nick, _ in moves]
+        data = []
+        missing = []
+        for nick, channel in moves:
+            session = self.aliases.session(nick)
+            channel_id = self.channels.get(channel.lower())
+            if session is None or channel_id is None:
+                missing.append(nick)
+            else:
+                data.append(frame(USER_STATE, [(1, session), (5, channel_id)]))
+        if data:
+            try:
+                self.writer.write(b''.join(data))
+                yield from self.writer.drain()
+            except OSError:
+                return [nick for nick, _ in moves]
+        return missing
@@ -0,0 +1,61 @@
+TEAMS = 'AB'
+PATTERNS = {
+    'abba': 'ABBA',
+    'abab': 'AB',
+    'snake': 'ABBA',
+}
+
+
+def compile_order(pattern, picks):
+    """Picking team of each of picks steps, repeating a named or custom A/B pattern"""
+    letters = PATTERNS.get(pattern.lower(), pattern.upper())
+    if not letters or set(letters) - set(TEAMS):
+        raise ValueError('invalid pick order {0!r}'.format(pattern))
+    return tuple(TEAMS.index(letters[i % len(letters)]) for i in range(picks))
+
+
+class PickOrder:
+    """A precomputed pick order table and the step picking has reached
+
+    The table holds the picking team of every step, so who picks at any
+    step is an index lookup, undoing a pick is stepping back and the whole
+    order is plain data that snapshots and restores exactly.
+    """
+
+    __slots__ = ['table', 'step']
+
+    def __init__(self, table, step=0):
+        self.table = tuple(table)
+        self.step = step
+
+    def __len__(self):
+        return len(self.table)
+
+    def team(self, step):
+        return self.table[step] if 0 <= step < len(self.table) else None
+
+    @property
+    def current(self):
+        return self.team(self.step)
+
+    def advance(self):
+        self.step += 1
+        return self.current
+
+    def undo(self):
+        if self.step == 0:
+            raise IndexError('no pick to undo')
+        self.step -= 1
+        return self.current
+
+    def upcoming(self, count=None):
+        """Picking teams from the current step on, at most count of them"""
+        end = len(self.table) if count is None else self.step + count
+        return self.table[self.step:end]
+
+    def snapshot(self):
+        return {'table': ''.join(TEAMS[team] for team in self.table), 'step': self.step}
+
+    @classmethod
+    def restore(cls, state):
+        return cls((TEAMS.index(letter) for letter in state['table']), state['step'])
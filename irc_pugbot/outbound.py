@@ -0,0 +1,140 @@
+import collections
+import time
+
+LINE_LIMIT = 512
+PREFIX_RESERVE = 100
+
+
+def split_message(target, text, line_limit=LINE_LIMIT, prefix_reserve=PREFIX_RESERVE):
+    """Split text so each PRIVMSG line, relayed with our prefix, fits the line limit"""
+    overhead = len('PRIVMSG {0} :\r\n'.format(target).encode()) + prefix_reserve
+    limit = max(line_limit - overhead, 1)
+    parts = []
+    data = text.encode()
+    while len(data) > limit:
+        cut = data.rfind(b' ', 0, limit + 1)
+        if cut <= 0:
+            cut = limit
+            while cut > 0 and (data[cut] & 0xc0) == 0x80:
+                cut -= 1
+        parts.append(data[:cut].decode())
+        data = data[cut:].lstrip(b' ')
+    parts.append(data.decode())
+    return parts
+
+
+class Message:
+    __slots__ = ['targets', 'text', 'key', 'queued_at']
+
+    def __init__(self, targets, text, key, queued_at):
+        self.targets = targets
+        self.text = text
+        self.key = key
+        self.queued_at = queued_at
+
+
+class OutboundQueue:
+    """Rate limited PRIVMSG queue in front of bot.send_privmsg
+
+    Lines leave through a token bucket of `burst` lines refilled at `rate`
+    per second. A message sent with a key replaces a still queued
+    message with the same target and key, consecutive messages with the same
+    text are merged into one multi-target PRIVMSG up to max_targets, and long
+    lines are split to fit the IRC line limit.
+    """
+
+    def __init__(self, send, loop, rate=1.0, burst=5, max_targets=1, clock=time.monotonic):
+        self.send = send
+        self.loop = loop
+        self.rate = rate
+        self.burst = burst
+        self.max_targets = max_targets
+        self.clock = clock
+        self.tokens = burst
+        self.refilled_at = clock()
+        self.queue = collections.deque()
+        self.keyed = {}
+        self.drain_handle = None
+        self.sent = 0
+        self.lines = 0
+        self.coalesced = 0
+        self.max_depth = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    @property
+    def depth(self):
+        return len(self.queue)
+
+    def metrics(self):
+        return {
+            'depth': self.depth,
+            'max_depth': self.max_depth,
+            'sent': self.sent,
+            'lines': self.lines,
+            'coalesced': self.coalesced,
+            'latency_avg': self.latency_total / self.sent if self.sent else 0.0,
+            'latency_max': self.latency_max,
+        }
+
+    def add_metrics(self, metrics):
+        """Report queue depth, sent and coalesced counts and send latency"""
+        metrics.gauge('outbound_queue_depth', lambda: self.depth)
+        for name in ['max_depth', 'sent', 'lines', 'coalesced']:
+            metrics.gauge('outbound_{0}'.format(name), lambda name=name: getattr(self, name))
+        metrics.gauge('outbound_latency_avg_seconds', lambda: self.metrics()['latency_avg'])
+        metrics.gauge('outbound_latency_max_seconds', lambda: self.latency_max)
+
+    def privmsg(self, target, text, key=None):
+        if key is not None:
+            queued = self.keyed.get((target, key))
+            if queued is not None:
+                queued.text = text
+                self.coalesced += 1
+                return
+        message = Message([target], text, key, self.clock())
+        self.queue.append(message)
+        if key is not None:
+            self.keyed[(target, key)] = message
+        self.max_depth = max(self.max_depth, len(self.queue))
+        if self.drain_handle is None:
+            self.drain()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.refilled_at) * self.rate)
+        self.refilled_at = now
+        return now
+
+    def _popleft(self):
+        message = self.queue.popleft()
+        if message.key is not None:
+            del self.keyed[(message.targets[0], message.key)]
+        return message
+
+    def _pop(self):
+        message = self._popleft()
+        while (self.queue and len(message.targets) < self.max_targets and
+               self.queue[0].text == message.text and self.queue[0].targets[0] not in message.targets):
+            message.targets.extend(self._popleft().targets)
+            self.sent += 1
+            self.coalesced += 1
+        return message
+
+    def drain(self):
+        self.drain_handle = None
+        now = self._refill()
+        while self.queue and self.tokens >= 1:
+            message = self._pop()
+            target = ','.join(message.targets)
+            lines = split_message(target, message.text)
+            for line in lines:
+                self.send(target, line)
+            self.tokens -= len(lines)
+            self.lines += len(lines)
+            self.sent += 1
+            latency = now - message.queued_at
+            self.latency_total += latency
+            self.latency_max = max(self.latency_max, latency)
+        if self.queue and self.drain_handle is None:
+            self.drain_handle = self.loop.call_later((1 - self.tokens) / self.rate, self.drain)
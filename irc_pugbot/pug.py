@@ -1,6 +1,14 @@
+import collections
 import random
+import irc_pugbot.events
+import irc_pugbot.formats
+import irc_pugbot.matching
+import irc_pugbot.matchmaking
+import irc_pugbot.order
 
-CLASSES = ['scout', 'soldier', 'pyro', 'demoman', 'heavy', 'engineer', 'medic', 'sniper', 'spy']
+CLASSES = irc_pugbot.formats.CLASSES
+CLASS_BITS = {c: 1 << i for i, c in enumerate(CLASSES)}
+ALL_CLASSES_MASK = (1 << len(CLASSES)) - 1
 
 
 class MissingClassError(ValueError):
@@ -11,156 +19,510 @@ class ClassAlreadyPickedError(ValueError):
     pass
 
 
+class CounterMismatchError(AssertionError):
+    pass
+
+
+class MatchingMismatchError(AssertionError):
+    pass
+
+
+class AlreadyStagedError(ValueError):
+    pass
+
+
+class NothingToUndoError(ValueError):
+    pass
+
+
+class NickInUseError(ValueError):
+    pass
+
+
+def class_mask(classes):
+    mask = 0
+    for class_ in classes:
+        mask |= CLASS_BITS[class_]
+    return mask
+
+
+def mask_classes(mask):
+    return [c for c in CLASSES if mask & CLASS_BITS[c]]
+
+
+class Player:
+    """A player's classes, in order of preference, and captain flag
+
+    The classes are also kept as a bit mask over CLASSES so class tests and
+    counts over many players are bitwise operations.
+    """
+    __slots__ = ['classes', 'captain', 'mask']
+
+    def __init__(self, classes, captain=False):
+        self.classes = tuple(collections.OrderedDict.fromkeys(classes))
+        self.captain = captain
+        self.mask = class_mask(self.classes)
+
+    def __eq__(self, other):
+        return isinstance(other, Player) and self.classes == other.classes and self.captain == other.captain
+
+    def __repr__(self):
+        return 'Player({0!r}, {1!r})'.format(list(self.classes), self.captain)
+
+    def plays(self, class_):
+        return bool(self.mask & CLASS_BITS[class_])
+
+
+def count_classes(players):
+    """Number of players listing each class, counted over distinct class masks"""
+    mask_counts = collections.Counter(player.mask for player in players)
+    return {c: sum(n for mask, n in mask_counts.items() if mask & bit) for c, bit in CLASS_BITS.items()}
+
+
+class ClassIndex:
+    """Nicks listing each class, in the order they were added
+
+    Kept up to date on every change, so the players of a class are read
+    off directly instead of filtering every player.
+    """
+    __slots__ = ['nicks']
+
+    def __init__(self):
+        self.nicks = {c: collections.OrderedDict() for c in CLASSES}
+
+    def add(self, nick, classes):
+        for class_ in classes:
+            self.nicks[class_][nick] = None
+
+    def remove(self, nick, classes):
+        for class_ in classes:
+            del self.nicks[class_][nick]
+
+    def rename(self, old_nick, new_nick, classes):
+        self.remove(old_nick, classes)
+        self.add(new_nick, classes)
+
+    def clear(self):
+        for nicks in self.nicks.values():
+            nicks.clear()
+
+    def players(self, class_):
+        return list(self.nicks[class_])
+
+    def count(self, class_):
+        return len(self.nicks[class_])
+
+    def complete(self, class_, prefix):
+        """Nicks of a class starting with prefix, ignoring case"""
+        prefix = prefix.lower()
+        return [nick for nick in self.nicks[class_] if nick.lower().startswith(prefix)]
+
+
+UNSTAGED = 'unstaged'
+STAGED = 'staged'
+CAPTAIN = 'captain'
+PICKED = 'picked'
+
+
 def random_captains(players):
-    all_captains = [nick for (nick, (_, captain)) in players.items() if captain]
+    all_captains = [nick for nick, player in players.items() if player.captain]
     return random.sample(all_captains, 2)
 
 
+def need_players(format_, players):
+    """Need of a format for a dict of added players"""
+    captain_count = sum(1 for player in players.values() if player.captain)
+    return format_.need_counts(captain_count, len(players), count_classes(players.values()))
+
+
+def can_stage_players(format_, players):
+    captain_need_count, player_need_count, class_need_count = need_players(format_, players)
+    return captain_need_count <= 0 and player_need_count <= 0 and not class_need_count
+
+
 def need_highlander(players):
-        class_count = {c: 2 for c in CLASSES}
-        captain_count = 2
-        player_count = 18
-        for nick, (classes, captain) in players.items():
-            player_count -= 1
-            if captain and captain_count > 0:
-                captain_count -= 1
-            for class_ in classes:
-                if class_count[class_] > 0:
-                    class_count[class_] -= 1
-        class_count = {class_: count for class_, count in class_count.items() if count > 0}
-        return captain_count, player_count, class_count
+    return need_players(irc_pugbot.formats.HIGHLANDER, players)
 
 
 def can_stage_highlander(players):
-        captain_need_count, player_need_count, class_need_count = need_highlander(players)
-        return captain_need_count <= 0 and player_need_count <= 0 and not class_need_count
+    return can_stage_players(irc_pugbot.formats.HIGHLANDER, players)
 
 
 def can_start_highlander(teams):
-    return all([len(teams[i]) == 8 for i in range(2)])
+    return irc_pugbot.formats.HIGHLANDER.can_start(teams)
 
 
 def need_fours(players):
-    player_count = 8
-    captain_count = 2
-    for nick, (classes, captain) in players.items():
-        player_count -= 1
-        if captain and captain_count > 0:
-            captain_count -= 1
-    return captain_count, player_count, {}
+    return need_players(irc_pugbot.formats.FOURS, players)
 
 
 def can_stage_fours(players):
-    captain_need_count, player_need_count, class_need_count = need_fours(players)
-    return captain_need_count <= 0 and player_need_count <= 0 and not class_need_count
+    return can_stage_players(irc_pugbot.formats.FOURS, players)
 
 
 def can_start_fours(teams):
-    return all([len(teams[i]) == 3 for i in range(2)])
-
-
-def river():
-    team = 0
-    yield team % 2
-    while True:
-        team += 1
-        yield team % 2
-        yield team % 2
+    return irc_pugbot.formats.FOURS.can_start(teams)
 
 
 class Tf2Pug:
-    allowed_classes = CLASSES
-
-    def __init__(self):
+    format = None
+
+    def __init__(self, check_counters=False, directory=None, listeners=None, format_=None, matchmaking=False,
+                 bus=None):
+        if format_ is not None:
+            self.format = format_
+        self.matchmaking = matchmaking
+        self.key = None
+        self.listeners = listeners if listeners is not None else []
+        self.bus = bus
+        self.locations = {}
+        self.directory = directory
         self.unstaged_players = {}
         self.staged_players = None
         self.captains = None
         self.teams = None
+        self.picked_players = None
         self.order = None
-        self.picking_team = None
+        self.picks = None
+        self.check_counters = check_counters
+        self.captain_count = 0
+        self.class_counts = {c: 0 for c in CLASSES}
+        self.unstaged_index = ClassIndex()
+        self.staged_index = ClassIndex()
+        if self.format.slot_capacities:
+            self.matcher = irc_pugbot.matching.SlotMatcher(self.format.slot_capacities)
+            self.captain_matcher = irc_pugbot.matching.SlotMatcher(self.format.slot_capacities)
+        else:
+            self.matcher = None
+            self.captain_matcher = None
+
+    @property
+    def allowed_classes(self):
+        return self.format.allowed_classes
+
+    @property
+    def picking_team(self):
+        return self.order.current if self.order is not None else None
 
     @property
     def can_stage(self):
-        raise NotImplementedError
+        captain_need_count, player_need_count, class_need_count = self.need
+        return captain_need_count <= 0 and player_need_count <= 0 and not class_need_count
 
     @property
     def can_start(self):
-        raise NotImplementedError
+        return self.format.can_start(self.teams)
 
     @property
     def need(self):
-        raise NotImplementedError
+        if self.matcher is None:
+            need = self.counted_need()
+        else:
+            if self.check_counters:
+                self.counted_need()
+            need = self.matched_need()
+        if self.matchmaking:
+            need = (0,) + need[1:]
+        return need
+
+    def counted_need(self):
+        """Evaluate need from the running counters, checking a full recount in check mode"""
+        need = self.format.need_counts(self.captain_count, len(self.unstaged_players), self.class_counts)
+        if self.check_counters:
+            players = self.unstaged_players.values()
+            expected = self.format.need_counts(sum(1 for p in players if p.captain), len(players), count_classes(players))
+            if need != expected:
+                raise CounterMismatchError('counted need {0} != recomputed need {1}'.format(need, expected))
+            for class_, count in self.class_counts.items():
+                if self.unstaged_index.count(class_) != count:
+                    raise CounterMismatchError('{0} indexed {1} != counted {2}'.format(
+                        class_, self.unstaged_index.count(class_), count))
+        return need
+
+    def matched_need(self):
+        """Evaluate exact need from the slot matchers, checking a fresh solve in check mode"""
+        if self.check_counters:
+            for matcher in (self.matcher, self.captain_matcher):
+                if not matcher.verify():
+                    raise MatchingMismatchError('incremental matching of {0} is not maximum'.format(matcher.size))
+        return self.format.need_matched(self.matcher, self.captain_matcher, len(self.unstaged_players))
+
+    def open_classes(self, team):
+        """Classes a team still has a free slot for"""
+        return [c for c in self.allowed_classes if self.format.free_slot(self.teams[team], c) is not None]
+
+    def class_players(self, class_):
+        """Nicks listing a class among the staged players while picking, otherwise among the added ones"""
+        index = self.staged_index if self.staged_players is not None else self.unstaged_index
+        return index.players(class_)
+
+    def complete(self, prefix, class_=None):
+        """Staged nicks starting with prefix, of one class or of any, for suggesting picks"""
+        if class_ is not None:
+            return self.staged_index.complete(class_, prefix)
+        prefix = prefix.lower()
+        return [nick for nick in self.staged_players if nick.lower().startswith(prefix)]
+
+    def _track(self, nick, player):
+        if player.captain:
+            self.captain_count += 1
+        for class_ in player.classes:
+            self.class_counts[class_] += 1
+        self.unstaged_index.add(nick, player.classes)
+        if self.matcher is not None:
+            self.matcher.add(nick, player.classes)
+            if player.captain:
+                self.captain_matcher.add(nick, player.classes)
+
+    def _untrack(self, nick, player):
+        if player.captain:
+            self.captain_count -= 1
+        for class_ in player.classes:
+            self.class_counts[class_] -= 1
+        self.unstaged_index.remove(nick, player.classes)
+        if self.matcher is not None:
+            self.matcher.remove(nick)
+            if player.captain:
+                self.captain_matcher.remove(nick)
+
+    def _record(self, event, *args):
+        for listener in self.listeners:
+            listener(self.key, event, args)
+
+    def _publish(self, event_type, *args):
+        if self.bus is not None:
+            self.bus.publish(event_type(self.key, *args))
+
+    def location(self, nick):
+        """Where a nick is in this pug as (state, team, class), or None"""
+        return self.locations.get(nick)
+
+    def is_captain(self, nick):
+        location = self.locations.get(nick)
+        return location is not None and location[0] == CAPTAIN
+
+    def _locate(self, nick, state, team=None, class_=None):
+        self.locations[nick] = (state, team, class_)
+        if self.directory is not None:
+            self.directory.setdefault(nick, set()).add(self)
+
+    def _unlocate(self, nick):
+        del self.locations[nick]
+        if self.directory is not None:
+            pugs = self.directory[nick]
+            pugs.discard(self)
+            if not pugs:
+                del self.directory[nick]
+
+    def rename(self, old_nick, new_nick):
+        location = self.locations.get(old_nick)
+        if location is None:
+            return False
+        if new_nick in self.locations:
+            raise NickInUseError(new_nick)
+        state, team, class_ = location
+        if state == UNSTAGED:
+            player = self.unstaged_players[new_nick] = self.unstaged_players.pop(old_nick)
+            self.unstaged_index.rename(old_nick, new_nick, player.classes)
+            if self.matcher is not None:
+                self.matcher.rename(old_nick, new_nick)
+                if old_nick in self.captain_matcher:
+                    self.captain_matcher.rename(old_nick, new_nick)
+        elif state == STAGED:
+            player = self.staged_players[new_nick] = self.staged_players.pop(old_nick)
+            self.staged_index.rename(old_nick, new_nick, player.classes)
+        elif state == CAPTAIN:
+            self.captains[team] = new_nick
+        elif state == PICKED:
+            self.teams[team][class_] = new_nick
+            self.picked_players[new_nick] = self.picked_players.pop(old_nick)
+            self.picks = [(t, s, new_nick if n == old_nick else n) for t, s, n in self.picks]
+        self._unlocate(old_nick)
+        self._locate(new_nick, state, team, class_)
+        self._record('rename', old_nick, new_nick)
+        self._publish(irc_pugbot.events.PlayerRenamed, old_nick, new_nick)
+        return True
+
+    def _reset_tracking(self):
+        self.captain_count = 0
+        self.class_counts = {c: 0 for c in CLASSES}
+        self.unstaged_index.clear()
+        if self.matcher is not None:
+            self.matcher.clear()
+            self.captain_matcher.clear()
 
     def add(self, nick, classes, captain=False):
         assert all(c in self.allowed_classes for c in classes)
         if not classes:
             raise MissingClassError
-        self.unstaged_players[nick] = (classes, captain)
+        location = self.locations.get(nick)
+        if location is not None and location[0] != UNSTAGED:
+            raise AlreadyStagedError(nick)
+        if location is not None:
+            self._untrack(nick, self.unstaged_players[nick])
+        player = self.unstaged_players[nick] = Player(classes, captain)
+        self._track(nick, player)
+        self._locate(nick, UNSTAGED)
+        self._record('add', nick, list(player.classes), captain)
+        self._publish(irc_pugbot.events.PlayerAdded, nick, player.classes, captain)
 
     def remove(self, nick):
-        del self.unstaged_players[nick]
+        self._untrack(nick, self.unstaged_players.pop(nick))
+        self._unlocate(nick)
+        self._record('remove', nick)
+        self._publish(irc_pugbot.events.PlayerRemoved, nick)
+
+    def _prioritized(self, players, priority):
+        """players reordered with the priority nicks among them first"""
+        if not priority:
+            return players
+        ordered = collections.OrderedDict((nick, players[nick]) for nick in priority if nick in players)
+        ordered.update(players)
+        return ordered
+
+    def matchmake(self, teams=None, ratings=None, priority=()):
+        """Form a game straight from the queue without captains, returning its teams or None
+
+        Priority nicks are moved to the front of the queue.
+        """
+        if teams is None:
+            players = self._prioritized(self.unstaged_players, priority)
+            teams = irc_pugbot.matchmaking.form_game(players, self.format, ratings)
+            if teams is None:
+                return None
+        for team in teams:
+            for nick in team.values():
+                self._untrack(nick, self.unstaged_players.pop(nick))
+                self._unlocate(nick)
+        self._record('matchmake', teams)
+        self._publish(irc_pugbot.events.Matchmade, teams)
+        return teams
 
-    def stage(self):
+    def stage(self, captains=None, priority=()):
+        """Start picking, listing the priority nicks first among the staged players"""
         assert self.can_stage
-        self.staged_players = self.unstaged_players
-        self.captains = random_captains(self.staged_players)
+        priority = list(priority)
+        self.staged_players = self._prioritized(self.unstaged_players, priority)
+        self.captains = list(captains) if captains else random_captains(self.staged_players)
         [self.staged_players.pop(c) for c in self.captains]
         self.unstaged_players = {}
+        self._reset_tracking()
+        for nick, player in self.staged_players.items():
+            self._locate(nick, STAGED)
+            self.staged_index.add(nick, player.classes)
+        for i, nick in enumerate(self.captains):
+            self._locate(nick, CAPTAIN, i)
         self.teams = [{}, {}]
-        self.order = river()
-        self.picking_team = next(self.order)
+        self.picked_players = {}
+        self.picks = []
+        self.order = irc_pugbot.order.PickOrder(self.format.pick_order)
+        self._record('stage', self.captains, priority)
+        self._publish(irc_pugbot.events.Staged, tuple(self.captains))
 
     def pick(self, nick, class_):
         assert class_ in self.allowed_classes
-        if class_ in self.teams[self.picking_team]:
+        slot = self.format.free_slot(self.teams[self.picking_team], class_)
+        if slot is None:
             raise ClassAlreadyPickedError
-        self.teams[self.picking_team][class_] = nick
-        del self.staged_players[nick]
-        self.picking_team = next(self.order)
+        if self.locations.get(nick, (None,))[0] != STAGED:
+            raise KeyError(nick)
+        self.teams[self.picking_team][slot] = nick
+        player = self.picked_players[nick] = self.staged_players.pop(nick)
+        self.staged_index.remove(nick, player.classes)
+        self._locate(nick, PICKED, self.picking_team, slot)
+        team = self.picking_team
+        self.picks.append((team, slot, nick))
+        self.order.advance()
+        self._record('pick', nick, class_)
+        self._publish(irc_pugbot.events.Picked, nick, class_, team)
+
+    def undo(self):
+        """Take back the last pick and hand the turn back, returning the picked nick"""
+        if not self.picks:
+            raise NothingToUndoError
+        team, slot, nick = self.picks.pop()
+        del self.teams[team][slot]
+        player = self.staged_players[nick] = self.picked_players.pop(nick)
+        self.staged_index.add(nick, player.classes)
+        self._locate(nick, STAGED)
+        self.order.undo()
+        self._record('undo')
+        self._publish(irc_pugbot.events.PickUndone, nick, team)
+        return nick
 
     def make_game(self):
         assert self.can_start
-        for captain, team in zip(self.captains, self.teams):
-            for c in self.allowed_classes:
-                if c not in team:
-                    team[c] = captain
+        self.format.fill_captains(self.captains, self.teams)
+        captains = tuple(self.captains)
         teams = self.teams
         self.teams = None
-        self.unstaged_players.update(self.staged_players)
+        for team in teams:
+            for nick in set(team.values()):
+                self._unlocate(nick)
+        for nick, player in self.staged_players.items():
+            self.unstaged_players[nick] = player
+            self._track(nick, player)
+            self._locate(nick, UNSTAGED)
         self.staged_players = None
+        self.staged_index.clear()
+        self.picked_players = None
         self.captains = None
         self.order = None
-        self.picking_team = None
+        self.picks = None
+        self._record('make_game')
+        self._publish(irc_pugbot.events.GameMade, captains, teams)
         return teams
 
+    def snapshot(self):
+        """Plain data copy of the pug's state for persistence"""
+        return {
+            'unstaged': [[nick, list(p.classes), p.captain] for nick, p in self.unstaged_players.items()],
+            'staged': None if self.staged_players is None else [
+                [nick, list(p.classes), p.captain] for nick, p in self.staged_players.items()],
+            'captains': None if self.captains is None else list(self.captains),
+            'picked': None if self.picked_players is None else [
+                [nick, list(p.classes), p.captain] for nick, p in self.picked_players.items()],
+            'picks': None if self.picks is None else list(self.picks),
+            'order': None if self.order is None else self.order.snapshot(),
+        }
+
+    def restore(self, state):
+        """Rebuild the pug from a snapshot without notifying listeners or the bus"""
+        listeners, self.listeners = self.listeners, []
+        bus, self.bus = self.bus, None
+        try:
+            for nick, classes, captain in state['unstaged']:
+                self.add(nick, classes, captain)
+            if state['staged'] is not None:
+                self.staged_players = {nick: Player(classes, captain) for nick, classes, captain in state['staged']}
+                self.captains = list(state['captains'])
+                self.teams = [{}, {}]
+                self.picks = []
+                self.picked_players = {nick: Player(classes, captain)
+                                       for nick, classes, captain in state.get('picked') or []}
+                for nick, player in self.staged_players.items():
+                    self._locate(nick, STAGED)
+                    self.staged_index.add(nick, player.classes)
+                for i, nick in enumerate(self.captains):
+                    self._locate(nick, CAPTAIN, i)
+                for team, class_, nick in state['picks']:
+                    self.teams[team][class_] = nick
+                    self._locate(nick, PICKED, team, class_)
+                    self.picks.append((team, class_, nick))
+                    self.picked_players.setdefault(nick, Player([irc_pugbot.formats.slot_class(class_)]))
+                order = state.get('order')
+                if order is not None:
+                    self.order = irc_pugbot.order.PickOrder.restore(order)
+                else:
+                    self.order = irc_pugbot.order.PickOrder(self.format.pick_order, len(self.picks))
+        finally:
+            self.listeners = listeners
+            self.bus = bus
 
-class Tf2HighlanderPug(Tf2Pug):
-    allowed_classes = CLASSES
-
-    @property
-    def can_stage(self):
-        return can_stage_highlander(self.unstaged_players)
-
-    @property
-    def can_start(self):
-        return can_start_highlander(self.teams)
 
-    @property
-    def need(self):
-        return need_highlander(self.unstaged_players)
+class Tf2HighlanderPug(Tf2Pug):
+    format = irc_pugbot.formats.HIGHLANDER
 
 
 class Tf2FoursPug(Tf2Pug):
-    allowed_classes = CLASSES
-
-    @property
-    def can_stage(self):
-        return can_stage_fours(self.unstaged_players)
-
-    @property
-    def can_start(self):
-        return can_start_fours(self.teams)
-
-    @property
-    def need(self):
-        return need_fours(self.unstaged_players)
+    format = irc_pugbot.formats.FOURS
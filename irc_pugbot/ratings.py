@@ -0,0 +1,161 @@
+import collections
+import itertools
+import random
+import time
+
+DEFAULT_RATING = 1500.0
+K_FACTOR = 32.0
+AUTO_PICK_TIME = 0.05
+
+
+def expected_score(rating, other_rating):
+    return 1 / (1 + 10 ** ((other_rating - rating) / 400))
+
+
+class Ratings:
+    """In memory Elo ratings, updated a batch of games at a time
+
+    A team's strength is the mean rating of its distinct players and every
+    player on a team moves by the same amount. All games in a batch are
+    scored against the ratings from before the batch and the deltas summed,
+    so the order of games inside a batch does not matter.
+    """
+
+    def __init__(self, default=DEFAULT_RATING, k=K_FACTOR):
+        self.default = default
+        self.k = k
+        self.ratings = {}
+        self.games = collections.Counter()
+
+    def __contains__(self, nick):
+        return nick in self.ratings
+
+    def get(self, nick):
+        return self.ratings.get(nick, self.default)
+
+    def team_rating(self, nicks):
+        nicks = set(nicks)
+        return sum(self.get(nick) for nick in nicks) / len(nicks)
+
+    def rename(self, old_nick, new_nick):
+        if old_nick in self.ratings:
+            self.ratings[new_nick] = self.ratings.pop(old_nick)
+            self.games[new_nick] = self.games.pop(old_nick)
+
+    def record(self, teams, winner):
+        """Update ratings for one game, winner is a team index or None for a draw"""
+        self.record_many([(teams, winner)])
+
+    def record_many(self, results):
+        deltas = collections.defaultdict(float)
+        played = []
+        for teams, winner in results:
+            members = [set(team.values()) for team in teams]
+            expected = expected_score(self.team_rating(members[0]), self.team_rating(members[1]))
+            score = 0.5 if winner is None else 1.0 - winner
+            change = self.k * (score - expected)
+            for nick in members[0]:
+                deltas[nick] += change
+            for nick in members[1]:
+                deltas[nick] -= change
+            played.extend(members[0] | members[1])
+        get = self.get
+        self.ratings.update({nick: get(nick) + delta for nick, delta in deltas.items()})
+        self.games.update(played)
+
+
+def balanced_captains(players, ratings, rng=random):
+    """The two captain volunteers closest in rating, lower rated first
+
+    Ties are broken at random, so with no ratings yet this is a random draw.
+    The lower rated captain picks first.
+    """
+    volunteers = [nick for nick, player in players.items() if player.captain]
+    rng.shuffle(volunteers)
+    volunteers.sort(key=ratings.get)
+    best = min(range(len(volunteers) - 1), key=lambda i: ratings.get(volunteers[i + 1]) - ratings.get(volunteers[i]))
+    return volunteers[best:best + 2]
+
+
+def balanced_teams(captains, players, team_size, capacities, ratings, time_limit=AUTO_PICK_TIME, tolerance=1.0,
+                   clock=time.perf_counter):
+    """Picks of team_size players per team within class capacities with the smallest rating gap
+
+    Branch and bound over players in descending rating order, each going to
+    one of the teams or the bench. Team members are kept matched onto
+    class slots by augmenting paths, and a branch is cut once even its
+    best case cannot beat the best split found so far. The search stops at a
+    gap within tolerance or after time_limit seconds and returns the best
+    split found as two nick -> class dicts, or None if it found none.
+    """
+    nicks = sorted(players, key=ratings.get, reverse=True)
+    values = [ratings.get(nick) for nick in nicks]
+    prefix = list(itertools.accumulate([0.0] + values))
+    count = len(nicks)
+    slots = [{}, {}]
+    best = [None, None]
+    deadline = clock() + time_limit
+
+    def place(team, nick, seen):
+        assigned = slots[team]
+        for class_ in players[nick].classes:
+            if class_ in capacities and class_ not in seen:
+                seen.add(class_)
+                holders = [other for other, c in assigned.items() if c == class_]
+                if len(holders) < capacities[class_] or any(place(team, other, seen) for other in holders):
+                    assigned[nick] = class_
+                    return True
+        return False
+
+    def search(i, gap, need):
+        if not need[0] and not need[1]:
+            if best[0] is None or abs(gap) < best[0]:
+                best[0] = abs(gap)
+                best[1] = [dict(team) for team in slots]
+            return
+        if count - i < need[0] + need[1] or clock() > deadline:
+            return
+        if best[0] is not None:
+            if best[0] <= tolerance:
+                return
+            top = [prefix[i + n] - prefix[i] for n in need]
+            bottom = [prefix[count] - prefix[count - n] for n in need]
+            low = gap + bottom[0] - top[1]
+            high = gap + top[0] - bottom[1]
+            if max(low, -high, 0) >= best[0]:
+                return
+        nick = nicks[i]
+        for team in ((0, 1) if gap <= 0 else (1, 0)):
+            if need[team]:
+                saved = dict(slots[team])
+                if place(team, nick, set()):
+                    sign = 1 if team == 0 else -1
+                    search(i + 1, gap + sign * values[i], (need[0] - (team == 0), need[1] - (team == 1)))
+                    slots[team] = saved
+        if count - i > need[0] + need[1]:
+            search(i + 1, gap, need)
+
+    search(0, ratings.get(captains[0]) - ratings.get(captains[1]), (team_size, team_size))
+    return best[1]
+
+
+def auto_pick(pug, ratings, time_limit=AUTO_PICK_TIME):
+    """Make all picks of a staged pug from balanced_teams, False if no split was found"""
+    teams = balanced_teams(pug.captains, pug.staged_players, pug.format.picks, pug.format.class_max, ratings, time_limit)
+    if teams is None:
+        return False
+    picks = [sorted(team.items()) for team in teams]
+    while not pug.can_start:
+        nick, class_ = picks[pug.picking_team].pop()
+        pug.pick(nick, class_)
+    return True
+
+
+def best_pick(pug, ratings):
+    """The highest rated staged player able to fill an open class of the picking team"""
+    open_classes = pug.open_classes(pug.picking_team)
+    for nick in sorted(pug.staged_players, key=ratings.get, reverse=True):
+        for class_ in pug.staged_players[nick].classes:
+            if class_ in open_classes:
+                return nick, class_
+    return None
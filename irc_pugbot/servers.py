@@ -0,0 +1,239 @@
+import asyncio
+import collections
+import random
+import string
+import struct
+
+A2S_INFO = b'\xff\xff\xff\xffTSource Engine Query\x00'
+A2S_INFO_REPLY = 0x49
+A2S_CHALLENGE = 0x41
+SERVERDATA_AUTH = 3
+SERVERDATA_AUTH_RESPONSE = 2
+SERVERDATA_EXECCOMMAND = 2
+SERVERDATA_RESPONSE_VALUE = 0
+PASSWORD_CHARS = string.ascii_letters + string.digits
+
+ServerInfo = collections.namedtuple('ServerInfo', ['name', 'map', 'players', 'max_players', 'bots'])
+
+
+class RconError(Exception):
+    pass
+
+
+def _read_string(data, offset):
+    end = data.index(b'\x00', offset)
+    return data[offset:end].decode(errors='replace'), end + 1
+
+
+def parse_info(data):
+    """ServerInfo from an A2S_INFO reply"""
+    if data[:4] != b'\xff\xff\xff\xff' or data[4] != A2S_INFO_REPLY:
+        raise ValueError('not an A2S_INFO reply')
+    name, offset = _read_string(data, 6)
+    map_, offset = _read_string(data, offset)
+    _, offset = _read_string(data, offset)
+    _, offset = _read_string(data, offset)
+    players, max_players, bots = struct.unpack_from('<BBB', data, offset + 2)
+    return ServerInfo(name, map_, players, max_players, bots)
+
+
+class A2SProtocol(asyncio.DatagramProtocol):
+    """One A2S_INFO query, answering a challenge if the server sends one"""
+
+    def __init__(self, future):
+        self.future = future
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        transport.sendto(A2S_INFO)
+
+    def datagram_received(self, data, addr):
+        if self.future.done():
+            return
+        if data[4:5] == bytes([A2S_CHALLENGE]):
+            self.transport.sendto(A2S_INFO + data[5:9])
+            return
+        try:
+            self.future.set_result(parse_info(data))
+        except (ValueError, IndexError, struct.error) as e:
+            self.future.set_exception(ValueError('malformed A2S_INFO reply: {0}'.format(e)))
+
+    def error_received(self, exc):
+        if not self.future.done():
+            self.future.set_exception(exc)
+
+
+@asyncio.coroutine
+def query_info(host, port, timeout=2.0, loop=None):
+    loop = loop or asyncio.get_event_loop()
+    future = asyncio.Future(loop=loop)
+    transport, _ = yield from loop.create_datagram_endpoint(lambda: A2SProtocol(future), remote_addr=(host, port))
+    try:
+        return (yield from asyncio.wait_for(future, timeout, loop=loop))
+    finally:
+        transport.close()
+
+
+def rcon_packet(request_id, type_, body):
+    payload = struct.pack('<ii', request_id, type_) + body.encode() + b'\x00\x00'
+    return struct.pack('<i', len(payload)) + payload
+
+
+@asyncio.coroutine
+def read_rcon_packet(reader):
+    size, = struct.unpack('<i', (yield from reader.readexactly(4)))
+    data = yield from reader.readexactly(size)
+    request_id, type_ = struct.unpack_from('<ii', data)
+    return request_id, type_, data[8:-2].decode(errors='replace')
+
+
+@asyncio.coroutine
+def rcon(host, port, password, commands, timeout=5.0, loop=None):
+    """Run commands over Source RCON and return the first response packet of each"""
+    reader, writer = yield from asyncio.wait_for(asyncio.open_connection(host, port, loop=loop), timeout, loop=loop)
+    try:
+        writer.write(rcon_packet(1, SERVERDATA_AUTH, password))
+        type_ = None
+        while type_ != SERVERDATA_AUTH_RESPONSE:
+            request_id, type_, _ = yield from asyncio.wait_for(read_rcon_packet(reader), timeout, loop=loop)
+        if request_id == -1:
+            raise RconError('rcon authentication failed on {0}:{1}'.format(host, port))
+        responses = []
+        for request_id, command in enumerate(commands, 2):
+            writer.write(rcon_packet(request_id, SERVERDATA_EXECCOMMAND, command))
+            response_id = None
+            while response_id != request_id:
+                response_id, _, body = yield from asyncio.wait_for(read_rcon_packet(reader), timeout, loop=loop)
+            responses.append(body)
+        return responses
+    finally:
+        writer.close()
+
+
+def random_password(length=8, rng=random.SystemRandom()):
+    return ''.join(rng.choice(PASSWORD_CHARS) for _ in range(length))
+
+
+class GameServer:
+    __slots__ = ['host', 'port', 'rcon_password', 'log_dir', 'demo_dir', 'info', 'checked_at', 'game', 'reserved_at']
+
+    def __init__(self, host, port=27015, rcon_password=None, log_dir=None, demo_dir=None):
+        self.host = host
+        self.port = port
+        self.rcon_password = rcon_password
+        self.log_dir = log_dir
+        self.demo_dir = demo_dir
+        self.info = None
+        self.checked_at = None
+        self.game = None
+        self.reserved_at = None
+
+    def __repr__(self):
+        return 'GameServer({0!r}, {1!r})'.format(self.host, self.port)
+
+    @property
+    def address(self):
+        return '{0}:{1}'.format(self.host, self.port)
+
+    @property
+    def humans(self):
+        return self.info.players - self.info.bots if self.info is not None else None
+
+    def connect_string(self, password):
+        return 'connect {0}; password "{1}"'.format(self.address, password)
+
+
+class ServerPool:
+    """Configured game servers, probed in the background and reserved per game
+
+    Every server is sent an A2S_INFO query each interval, all of them at
+    once and each with its own timeout, and the answers are cached. Starting
+    a game only reads the cache, so reserving a server never waits on the
+    network. A server is free when its last probe answered, no humans are
+    on it and no game holds it. A reserved server still probing empty
+    release_after seconds after it was reserved is handed back, which
+    catches abandoned games.
+    """
+
+    def __init__(self, loop, servers, interval=30, timeout=2.0, rcon_timeout=5.0, release_after=900):
+        self.loop = loop
+        self.servers = list(servers)
+        self.interval = interval
+        self.timeout = timeout
+        self.rcon_timeout = rcon_timeout
+        self.release_after = release_after
+        self.handle = None
+        self.task = None
+
+    @classmethod
+    def from_config(cls, loop, specs, **kwargs):
+        return cls(loop, [GameServer(spec['host'], spec.get('port', 27015), spec['rcon_password'],
+                                     spec.get('log_dir'), spec.get('demo_dir')) for spec in specs], **kwargs)
+
+    def __iter__(self):
+        return iter(self.servers)
+
+    def start(self):
+        self.handle = self.loop.call_soon(self._tick)
+
+    def stop(self):
+        if self.handle is not None:
+            self.handle.cancel()
+            self.handle = None
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    def _tick(self):
+        self.task = self.loop.create_task(self.probe_all())
+        self.handle = self.loop.call_later(self.interval, self._tick)
+
+    @asyncio.coroutine
+    def probe_all(self):
+        yield from asyncio.gather(*[self.probe(server) for server in self.servers], loop=self.loop)
+
+    @asyncio.coroutine
+    def probe(self, server):
+        try:
+            server.info = yield from query_info(server.host, server.port, self.timeout, loop=self.loop)
+        except (asyncio.TimeoutError, OSError, ValueError):
+            server.info = None
+        server.checked_at = self.loop.time()
+        if (server.game is not None and server.humans == 0 and
+                server.checked_at - server.reserved_at >= self.release_after):
+            self.release(server)
+
+    def free_servers(self):
+        return [server for server in self.servers if server.game is None and server.humans == 0]
+
+    def reserve(self, game):
+        """Hold the first free server in configured order for a game, or None if none is free"""
+        free = self.free_servers()
+        if not free:
+            return None
+        server = free[0]
+        server.game = game
+        server.reserved_at = self.loop.time()
+        return server
+
+    def release(self, server, game=None):
+        """Hand a server back, only if it is still held for game when one is given"""
+        if game is not None and server.game != game:
+            return False
+        server.game = None
+        server.reserved_at = None
+        return True
+
+    @asyncio.coroutine
+    def setup(self, server, password, config=None, demo=None):
+        """Lock a reserved server with a password, exec a config and start recording STV"""
+        if server.rcon_password is None:
+            raise RconError('no rcon password for {0}'.format(server.address))
+        commands = ['sv_password "{0}"'.format(password)]
+        if config:
+            commands.append('exec {0}'.format(config))
+        if demo:
+            commands.extend(['tv_stoprecord', 'tv_record {0}'.format(demo)])
+        return (yield from rcon(server.host, server.port, server.rcon_password, commands,
+                                self.rcon_timeout, loop=self.loop))
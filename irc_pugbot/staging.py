@@ -0,0 +1,129 @@
+import math
+
+COUNTDOWN = 'countdown'
+READY_CHECK = 'ready_check'
+EPSILON = 1e-3
+
+
+class Countdown:
+    __slots__ = ['channel', 'phase', 'deadline', 'handle', 'waiting']
+
+    def __init__(self, channel, phase, deadline):
+        self.channel = channel
+        self.phase = phase
+        self.deadline = deadline
+        self.handle = None
+        self.waiting = None
+
+
+class StagingScheduler:
+    """Countdown and ready check in front of staging each lobby
+
+    When a lobby becomes stageable a countdown of `delay` seconds starts,
+    announced again every `remind_every` seconds. When it runs out the
+    players get `ready_timeout` seconds to confirm; whoever has not is
+    dropped and the lobby stages if it is still full. A lobby that stops
+    being stageable is cancelled and re-armed from scratch once it fills
+    again. Each lobby has at most one pending timer.
+    """
+
+    def __init__(self, loop, stage, announce, drop, delay=None, remind_every=None, ready_timeout=None):
+        self.loop = loop
+        self.stage = stage
+        self.announce = announce
+        self.drop = drop
+        self.delay = delay
+        self.remind_every = remind_every
+        self.ready_timeout = ready_timeout
+        self.lobbies = {}
+
+    def __contains__(self, pug):
+        return pug in self.lobbies
+
+    def phase(self, pug):
+        state = self.lobbies.get(pug)
+        return state.phase if state is not None else None
+
+    def update(self, channel, pug):
+        """Arm, advance or cancel a lobby's countdown after its players changed"""
+        state = self.lobbies.get(pug)
+        if not pug.can_stage:
+            if state is not None:
+                self.cancel(pug)
+                self.announce(channel, 'Staging cancelled, waiting for more players')
+        elif state is None:
+            if self.delay:
+                self._countdown(channel, pug)
+            elif self.ready_timeout:
+                self._ready_check(channel, pug)
+            else:
+                self.stage(channel, pug)
+        elif state.phase == READY_CHECK:
+            state.waiting.intersection_update(pug.unstaged_players)
+            if not state.waiting:
+                self._stage(pug)
+
+    def ready(self, pug, nick):
+        """Confirm a player during a ready check, False if none is running for them"""
+        state = self.lobbies.get(pug)
+        if state is None or state.phase != READY_CHECK or nick not in state.waiting:
+            return False
+        state.waiting.remove(nick)
+        if not state.waiting:
+            self._stage(pug)
+        return True
+
+    def cancel(self, pug):
+        state = self.lobbies.pop(pug, None)
+        if state is not None:
+            state.handle.cancel()
+
+    def _arm(self, pug, state):
+        if state.handle is not None:
+            state.handle.cancel()
+        delay = state.deadline - self.loop.time()
+        if state.phase == COUNTDOWN and self.remind_every:
+            delay = min(delay, self.remind_every)
+        state.handle = self.loop.call_later(max(delay, 0), self._fire, pug)
+
+    def _countdown(self, channel, pug):
+        state = self.lobbies[pug] = Countdown(channel, COUNTDOWN, self.loop.time() + self.delay)
+        self.announce(channel, 'Staging pug in {0:g} seconds'.format(self.delay))
+        self._arm(pug, state)
+
+    def _ready_check(self, channel, pug):
+        state = self.lobbies.get(pug)
+        if state is None:
+            state = self.lobbies[pug] = Countdown(channel, READY_CHECK, None)
+        state.phase = READY_CHECK
+        state.deadline = self.loop.time() + self.ready_timeout
+        state.waiting = set(pug.unstaged_players)
+        self.announce(channel, 'Ready check: {0}, say ;ready in the next {1:g} seconds'.format(
+            ', '.join(sorted(state.waiting)), self.ready_timeout))
+        self._arm(pug, state)
+
+    def _stage(self, pug):
+        state = self.lobbies.pop(pug)
+        state.handle.cancel()
+        self.stage(state.channel, pug)
+
+    def _fire(self, pug):
+        state = self.lobbies[pug]
+        state.handle = None
+        remaining = state.deadline - self.loop.time()
+        if remaining > EPSILON:
+            self.announce(state.channel, 'Staging pug in {0} seconds'.format(math.ceil(remaining)))
+            self._arm(pug, state)
+        elif state.phase == COUNTDOWN and self.ready_timeout:
+            self._ready_check(state.channel, pug)
+        elif state.phase == COUNTDOWN:
+            del self.lobbies[pug]
+            self.stage(state.channel, pug)
+        else:
+            del self.lobbies[pug]
+            for nick in sorted(state.waiting):
+                self.drop(state.channel, pug, nick)
+            if pug.can_stage:
+                self.stage(state.channel, pug)
+            else:
+                self.announce(state.channel, 'Staging cancelled, waiting for more players')
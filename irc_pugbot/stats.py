@@ -0,0 +1,241 @@
+import asyncio
+import collections
+import concurrent.futures
+import sqlite3
+import time
+import irc_pugbot.formats
+
+LEADERBOARDS = ('games', 'wins', 'captained')
+COMBAT_FIELDS = ('damage', 'kills', 'deaths', 'assists', 'heals')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    channel TEXT NOT NULL,
+    finished_at REAL NOT NULL,
+    winner INTEGER
+);
+CREATE TABLE IF NOT EXISTS appearances (
+    game_id INTEGER NOT NULL REFERENCES games (id),
+    nick TEXT NOT NULL,
+    team INTEGER NOT NULL,
+    class TEXT NOT NULL,
+    captain INTEGER NOT NULL,
+    pick INTEGER
+);
+CREATE INDEX IF NOT EXISTS appearances_nick ON appearances (nick, class);
+CREATE INDEX IF NOT EXISTS appearances_game ON appearances (game_id, team);
+CREATE TABLE IF NOT EXISTS players (
+    nick TEXT PRIMARY KEY,
+    games INTEGER NOT NULL DEFAULT 0,
+    wins INTEGER NOT NULL DEFAULT 0,
+    captained INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS players_games ON players (games DESC, nick);
+CREATE INDEX IF NOT EXISTS players_wins ON players (wins DESC, nick);
+CREATE INDEX IF NOT EXISTS players_captained ON players (captained DESC, nick);
+CREATE TABLE IF NOT EXISTS class_picks (
+    class TEXT PRIMARY KEY,
+    picks INTEGER NOT NULL DEFAULT 0,
+    pick_total INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS combat (
+    game_id INTEGER NOT NULL REFERENCES games (id),
+    nick TEXT NOT NULL,
+    damage INTEGER NOT NULL,
+    kills INTEGER NOT NULL,
+    deaths INTEGER NOT NULL,
+    assists INTEGER NOT NULL,
+    heals INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS combat_game ON combat (game_id);
+CREATE TABLE IF NOT EXISTS demos (
+    game_id INTEGER PRIMARY KEY REFERENCES games (id),
+    map TEXT NOT NULL,
+    duration REAL NOT NULL,
+    ticks INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS combat_totals (
+    nick TEXT PRIMARY KEY,
+    games INTEGER NOT NULL DEFAULT 0,
+    damage INTEGER NOT NULL DEFAULT 0,
+    kills INTEGER NOT NULL DEFAULT 0,
+    deaths INTEGER NOT NULL DEFAULT 0,
+    assists INTEGER NOT NULL DEFAULT 0,
+    heals INTEGER NOT NULL DEFAULT 0
+);
+'''
+
+
+def game_rows(game_id, captains, teams, picks):
+    """Appearance rows of a finished game, one per team and slot"""
+    pick_numbers = {(team, slot): i + 1 for i, (team, slot, nick) in enumerate(picks)}
+    rows = []
+    for i, (captain, team) in enumerate(zip(captains, teams)):
+        for slot, nick in team.items():
+            class_ = irc_pugbot.formats.slot_class(slot)
+            rows.append((game_id, nick, i, class_, int(nick == captain), pick_numbers.get((i, slot))))
+    return rows
+
+
+class StatsStore:
+    """SQLite store of finished games, pick order and results
+
+    Games, results and combat totals from ingested logs are buffered and
+    written in one transaction per flush on a single worker thread, so the
+    event loop never waits on SQLite. Each write also bumps per player and
+    per class summary rows, which keeps leaderboards and pick rates index
+    lookups however many games are stored. Leaderboards are dropped from
+    the cache by every new game or result and recomputed right after the
+    write.
+    """
+
+    def __init__(self, path, loop=None, flush_delay=0.05, leaderboard_size=10):
+        self.loop = loop or asyncio.get_event_loop()
+        self.flush_delay = flush_delay
+        self.leaderboard_size = leaderboard_size
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(SCHEMA)
+        self.next_game_id = (self.connection.execute('SELECT max(id) FROM games').fetchone()[0] or 0) + 1
+        self.leaderboards = {}
+        self.pending_games = []
+        self.pending_results = []
+        self.pending_combat = []
+        self.pending_demos = []
+        self.flush_handle = None
+        self.last_write = None
+
+    def _submit(self, function, *args):
+        return self.loop.run_in_executor(self.executor, function, *args)
+
+    def _changed(self):
+        self.leaderboards = {}
+        if self.flush_handle is None:
+            self.flush_handle = self.loop.call_later(self.flush_delay, self.flush)
+
+    def record_game(self, channel, captains, teams, picks, finished_at=None):
+        """Queue a finished game for writing and return its id"""
+        game_id = self.next_game_id
+        self.next_game_id += 1
+        self.pending_games.append((game_id, channel, finished_at or time.time(),
+                                   game_rows(game_id, captains, teams, picks)))
+        self._changed()
+        return game_id
+
+    def record_result(self, game_id, winner):
+        """Queue the result of a game, winner is a team index or None for a draw"""
+        self.pending_results.append((winner, game_id))
+        self._changed()
+
+    def record_combat(self, game_id, totals):
+        """Queue per player (damage, kills, deaths, assists, heals) totals parsed from a game's log"""
+        self.pending_combat.extend((game_id, nick) + tuple(row) for nick, row in totals.items())
+        if totals:
+            self._changed()
+
+    def record_demo(self, game_id, demo):
+        """Queue the map and length read from a game's STV demo header"""
+        self.pending_demos.append((game_id, demo['map'], demo['duration'], demo['ticks']))
+        self._changed()
+
+    def _drain(self):
+        pending = self.pending_games, self.pending_results, self.pending_combat, self.pending_demos
+        self.pending_games, self.pending_results, self.pending_combat, self.pending_demos = [], [], [], []
+        return pending
+
+    def flush(self):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        if self.pending_games or self.pending_results or self.pending_combat or self.pending_demos:
+            self.last_write = self._submit(self._write, *self._drain())
+            self.leaderboards = {kind: self._submit(self._leaderboard, kind) for kind in LEADERBOARDS}
+        return self.last_write
+
+    def _write(self, games, results, combat=(), demos=()):
+        rows = [row for game in games for row in game[3]]
+        played = collections.Counter()
+        captained = collections.Counter()
+        for game in games:
+            nicks = {row[1]: row[4] for row in game[3]}
+            played.update(nicks.keys())
+            captained.update(nick for nick, captain in nicks.items() if captain)
+        picks = collections.Counter()
+        pick_totals = collections.Counter()
+        for row in rows:
+            if row[5] is not None:
+                picks[row[3]] += 1
+                pick_totals[row[3]] += row[5]
+        with self.connection as connection:
+            connection.executemany('INSERT INTO games (id, channel, finished_at) VALUES (?, ?, ?)',
+                                   [game[:3] for game in games])
+            connection.executemany('INSERT INTO appearances VALUES (?, ?, ?, ?, ?, ?)', rows)
+            connection.executemany('INSERT OR IGNORE INTO players (nick) VALUES (?)', [(nick,) for nick in played])
+            connection.executemany('UPDATE players SET games = games + ?, captained = captained + ? WHERE nick = ?',
+                                   [(count, captained[nick], nick) for nick, count in played.items()])
+            connection.executemany('INSERT OR IGNORE INTO class_picks (class) VALUES (?)', [(c,) for c in picks])
+            connection.executemany('UPDATE class_picks SET picks = picks + ?, pick_total = pick_total + ? WHERE class = ?',
+                                   [(count, pick_totals[class_], class_) for class_, count in picks.items()])
+            connection.executemany('UPDATE games SET winner = ? WHERE id = ?', results)
+            connection.executemany('UPDATE players SET wins = wins + 1 WHERE nick IN '
+                                   '(SELECT nick FROM appearances WHERE game_id = ? AND team = ?)',
+                                   [(game_id, winner) for winner, game_id in results if winner is not None])
+            connection.executemany('INSERT INTO combat VALUES (?, ?, ?, ?, ?, ?, ?)', combat)
+            connection.executemany('INSERT OR IGNORE INTO combat_totals (nick) VALUES (?)', [row[1:2] for row in combat])
+            connection.executemany('UPDATE combat_totals SET games = games + 1, damage = damage + ?, kills = kills + ?, '
+                                   'deaths = deaths + ?, assists = assists + ?, heals = heals + ? WHERE nick = ?',
+                                   [row[2:] + row[1:2] for row in combat])
+            connection.executemany('INSERT OR REPLACE INTO demos VALUES (?, ?, ?, ?)', demos)
+
+    def _leaderboard(self, kind):
+        return self.connection.execute(
+            'SELECT nick, {0} FROM players ORDER BY {0} DESC, nick LIMIT ?'.format(kind),
+            (self.leaderboard_size,)).fetchall()
+
+    def _player_stats(self, nick):
+        row = self.connection.execute('SELECT games, wins, captained FROM players WHERE nick = ?', (nick,)).fetchone()
+        if row is None:
+            return None
+        classes = self.connection.execute(
+            'SELECT class, count(*) FROM appearances WHERE nick = ? GROUP BY class ORDER BY count(*) DESC, class',
+            (nick,)).fetchall()
+        combat = self.connection.execute(
+            'SELECT games, damage, kills, deaths, assists, heals FROM combat_totals WHERE nick = ?', (nick,)).fetchone()
+        return {'games': row[0], 'wins': row[1], 'captained': row[2], 'classes': classes,
+                'combat': dict(zip(('games',) + COMBAT_FIELDS, combat)) if combat else None}
+
+    def _class_pick_rates(self):
+        return {class_: (picks, pick_total / picks) for class_, picks, pick_total in
+                self.connection.execute('SELECT class, picks, pick_total FROM class_picks WHERE picks > 0')}
+
+    @asyncio.coroutine
+    def leaderboard(self, kind='games'):
+        """Top players as (nick, count) pairs, from the cache when possible"""
+        if kind not in LEADERBOARDS:
+            raise ValueError(kind)
+        self.flush()
+        if kind not in self.leaderboards:
+            self.leaderboards[kind] = self._submit(self._leaderboard, kind)
+        return (yield from self.leaderboards[kind])
+
+    @asyncio.coroutine
+    def player_stats(self, nick):
+        self.flush()
+        return (yield from self._submit(self._player_stats, nick))
+
+    @asyncio.coroutine
+    def class_pick_rates(self):
+        """Number of picks and mean pick number per class"""
+        self.flush()
+        return (yield from self._submit(self._class_pick_rates))
+
+    @asyncio.coroutine
+    def close(self):
+        self.flush()
+        if self.last_write is not None:
+            yield from self.last_write
+        yield from self._submit(self.connection.close)
+        self.executor.shutdown()
@@ -0,0 +1,70 @@
+import collections
+
+STATUS_MSG = '{changes}{count} added'
+NEED_MSG = ', {0} more needed'
+
+
+class StatusBoard:
+    """Debounced per channel add/remove announcements
+
+    Instead of re-sending the whole player list on every add or remove, the
+    changes seen during a window of `delay` seconds are summarised in one line
+    listing who joined and who left plus the player counts. A player who
+    joins and leaves inside the same window does not show up at all.
+    """
+
+    def __init__(self, loop, delay, send):
+        self.loop = loop
+        self.delay = delay
+        self.send = send
+        self.pending = {}
+
+    def _changes(self, channel, pug):
+        changes = self.pending.get(channel)
+        if changes is None:
+            changes = self.pending[channel] = {
+                'joined': collections.OrderedDict(),
+                'left': collections.OrderedDict(),
+                'pug': pug,
+                'handle': self.loop.call_later(self.delay, self.flush, channel),
+            }
+        changes['pug'] = pug
+        return changes
+
+    def joined(self, channel, nick, pug):
+        changes = self._changes(channel, pug)
+        if nick in changes['left']:
+            del changes['left'][nick]
+        else:
+            changes['joined'][nick] = None
+
+    def left(self, channel, nick, pug):
+        changes = self._changes(channel, pug)
+        if nick in changes['joined']:
+            del changes['joined'][nick]
+        else:
+            changes['left'][nick] = None
+
+    def discard(self, channel):
+        changes = self.pending.pop(channel, None)
+        if changes is not None:
+            changes['handle'].cancel()
+
+    def flush(self, channel):
+        changes = self.pending.pop(channel, None)
+        if changes is None:
+            return
+        changes['handle'].cancel()
+        parts = []
+        if changes['joined']:
+            parts.append('Joined: {0}. '.format(', '.join(changes['joined'])))
+        if changes['left']:
+            parts.append('Left: {0}. '.format(', '.join(changes['left'])))
+        if not parts:
+            return
+        pug = changes['pug']
+        msg = STATUS_MSG.format(changes=''.join(parts), count=len(pug.unstaged_players))
+        player_need_count = pug.need[1]
+        if player_need_count > 0:
+            msg += NEED_MSG.format(player_need_count)
+        self.send(channel, msg)
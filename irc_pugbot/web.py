@@ -0,0 +1,219 @@
+import asyncio
+import base64
+import hashlib
+import json
+import struct
+
+TEAM_NAMES = ('red', 'blue')
+WEBSOCKET_GUID = b'258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+MAX_CLIENT_FRAME = 1 << 16
+MAX_BUFFER = 1 << 20
+
+PAGE = b'''<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Pugs</title></head>
+<body><pre id="lobbies">connecting...</pre><script>
+function merge(target, patch) {
+  if (typeof patch !== 'object' || patch === null || Array.isArray(patch)) return patch;
+  if (typeof target !== 'object' || target === null || Array.isArray(target)) target = {};
+  for (var key in patch) {
+    if (patch[key] === null) delete target[key]; else target[key] = merge(target[key], patch[key]);
+  }
+  return target;
+}
+var state = {};
+var socket = new WebSocket((location.protocol === 'https:' ? 'wss://' : 'ws://') + location.host + '/live');
+socket.onmessage = function (message) {
+  state = merge(state, JSON.parse(message.data));
+  document.getElementById('lobbies').textContent = JSON.stringify(state.lobbies, null, 2);
+};
+</script></body></html>
+'''
+
+
+def players_view(players):
+    return {nick: {'classes': list(player.classes), 'captain': player.captain} for nick, player in players.items()}
+
+
+def lobby_view(pug):
+    """Plain data view of a lobby without null values, so it diffs as a JSON merge patch"""
+    view = {'format': pug.format.name, 'unstaged': players_view(pug.unstaged_players)}
+    if pug.staged_players is None:
+        captains, players, classes = pug.need
+        view['need'] = {'captains': captains, 'players': players, 'classes': classes}
+    else:
+        view['staged'] = players_view(pug.staged_players)
+        view['captains'] = list(pug.captains)
+        view['teams'] = {name: dict(team) for name, team in zip(TEAM_NAMES, pug.teams)}
+        if pug.picking_team is not None:
+            view['picking'] = pug.captains[pug.picking_team]
+    return view
+
+
+def lobby_name(key):
+    return '{0}/{1}'.format(*key)
+
+
+def merge_diff(old, new):
+    """The JSON merge patch (RFC 7386) turning old into new"""
+    patch = {key: None for key in old if key not in new}
+    for key, value in new.items():
+        previous = old.get(key)
+        if isinstance(value, dict) and isinstance(previous, dict):
+            nested = merge_diff(previous, value)
+            if nested:
+                patch[key] = nested
+        elif key not in old or previous != value:
+            patch[key] = value
+    return patch
+
+
+def merge_patch(target, patch):
+    """Apply a JSON merge patch, as a viewer does"""
+    if not isinstance(patch, dict):
+        return patch
+    result = dict(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = merge_patch(result.get(key), value)
+    return result
+
+
+def websocket_frame(opcode, payload):
+    if len(payload) < 126:
+        header = struct.pack('>BB', 0x80 | opcode, len(payload))
+    elif len(payload) < 1 << 16:
+        header = struct.pack('>BBH', 0x80 | opcode, 126, len(payload))
+    else:
+        header = struct.pack('>BBQ', 0x80 | opcode, 127, len(payload))
+    return header + payload
+
+
+def websocket_accept(key):
+    return base64.b64encode(hashlib.sha1(key.strip() + WEBSOCKET_GUID).digest())
+
+
+@asyncio.coroutine
+def read_websocket_frame(reader):
+    """(opcode, payload) of one masked client frame"""
+    first, second = yield from reader.readexactly(2)
+    length = second & 0x7f
+    if length == 126:
+        length, = struct.unpack('>H', (yield from reader.readexactly(2)))
+    elif length == 127:
+        length, = struct.unpack('>Q', (yield from reader.readexactly(8)))
+    if length > MAX_CLIENT_FRAME:
+        raise ValueError('client frame of {0} bytes is too long'.format(length))
+    mask = (yield from reader.readexactly(4)) if second & 0x80 else b'\x00\x00\x00\x00'
+    payload = yield from reader.readexactly(length)
+    return first & 0x0f, bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+
+
+class LobbyView:
+    """Read-only live view of every lobby over HTTP and WebSocket
+
+    The view is fed by the event bus. Each event rebuilds the view of the
+    one lobby it concerns, bumps the version and computes the JSON merge
+    patch from the previous view. The patch is encoded and framed once and
+    the same bytes are written to every connected viewer. GET /lobbies.json
+    returns the whole view, encoded at most once per version. A viewer
+    connecting to /live first gets the whole view, then patches. A viewer
+    whose socket buffer backs up past max_buffer is disconnected and has
+    to reconnect to catch up.
+    """
+
+    def __init__(self, manager, loop=None, max_buffer=MAX_BUFFER):
+        self.manager = manager
+        self.loop = loop or asyncio.get_event_loop()
+        self.max_buffer = max_buffer
+        self.version = 0
+        self.lobbies = {lobby_name((channel, lobby_id)): lobby_view(pug) for channel, lobby_id, pug in manager}
+        self.snapshot_cache = None
+        self.clients = set()
+        self.server = None
+
+    def snapshot(self):
+        """The encoded whole view of the current version"""
+        if self.snapshot_cache is None or self.snapshot_cache[0] != self.version:
+            body = json.dumps({'version': self.version, 'lobbies': self.lobbies}, sort_keys=True).encode()
+            self.snapshot_cache = (self.version, body)
+        return self.snapshot_cache[1]
+
+    @asyncio.coroutine
+    def update(self, event):
+        name = lobby_name(event.key)
+        channel, lobby_id = event.key
+        pug = self.manager.lobbies.get(channel, {}).get(lobby_id)
+        old = self.lobbies.get(name)
+        if pug is None:
+            if old is None:
+                return
+            del self.lobbies[name]
+            patch = None
+        else:
+            new = self.lobbies[name] = lobby_view(pug)
+            patch = new if old is None else merge_diff(old, new)
+            if not patch:
+                return
+        self.version += 1
+        self.broadcast(json.dumps({'version': self.version, 'lobbies': {name: patch}}, sort_keys=True).encode())
+
+    def broadcast(self, message):
+        data = websocket_frame(0x1, message)
+        for writer in list(self.clients):
+            if writer.transport.get_write_buffer_size() > self.max_buffer:
+                self.clients.discard(writer)
+                writer.close()
+            else:
+                writer.write(data)
+
+    @asyncio.coroutine
+    def handle_request(self, reader, writer):
+        request = yield from reader.readline()
+        headers = {}
+        while True:
+            line = yield from reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.partition(b':')
+            headers[name.strip().lower()] = value.strip()
+        path = request.split(b' ')[1:2]
+        if path == [b'/live'] and headers.get(b'upgrade', b'').lower() == b'websocket':
+            yield from self.handle_websocket(reader, writer, headers)
+            return
+        if path == [b'/lobbies.json']:
+            status, content_type, body = b'200 OK', b'application/json', self.snapshot()
+        elif path == [b'/']:
+            status, content_type, body = b'200 OK', b'text/html; charset=utf-8', PAGE
+        else:
+            status, content_type, body = b'404 Not Found', b'text/plain', b'not found\n'
+        writer.write(b'HTTP/1.0 ' + status + b'\r\nContent-Type: ' + content_type + b'\r\n' +
+                     'Content-Length: {0}\r\n\r\n'.format(len(body)).encode() + body)
+        yield from writer.drain()
+        writer.close()
+
+    @asyncio.coroutine
+    def handle_websocket(self, reader, writer, headers):
+        writer.write(b'HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                     b'Sec-WebSocket-Accept: ' + websocket_accept(headers.get(b'sec-websocket-key', b'')) + b'\r\n\r\n')
+        writer.write(websocket_frame(0x1, self.snapshot()))
+        self.clients.add(writer)
+        try:
+            while True:
+                opcode, payload = yield from read_websocket_frame(reader)
+                if opcode == 0x8:
+                    writer.write(websocket_frame(0x8, payload[:2]))
+                    break
+                elif opcode == 0x9:
+                    writer.write(websocket_frame(0xa, payload))
+        except (asyncio.IncompleteReadError, ValueError, ConnectionError):
+            pass
+        finally:
+            self.clients.discard(writer)
+            writer.close()
+
+    @asyncio.coroutine
+    def serve(self, port, host='127.0.0.1', loop=None):
+        self.server = yield from asyncio.start_server(self.handle_request, host, port, loop=loop)
+        return self.server
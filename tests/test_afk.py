@@ -0,0 +1,116 @@
+import unittest
+import unittest.mock
+import irc_pugbot.afk
+
+
+class TimerWheelTest(unittest.TestCase):
+    def setUp(self):
+        self.fired = []
+        self.loop = unittest.mock.Mock()
+        self.wheel = irc_pugbot.afk.TimerWheel(self.loop, self.fired.append, tick=1.0, size=8)
+
+    def advance(self, ticks):
+        for i in range(ticks):
+            self.wheel._tick()
+
+    def test_fires_when_due(self):
+        self.wheel.schedule('a', 3)
+        self.advance(2)
+        self.assertEquals(self.fired, [])
+        self.advance(1)
+        self.assertEquals(self.fired, ['a'])
+        self.assertFalse('a' in self.wheel)
+
+    def test_single_tick_handle(self):
+        for i in range(100):
+            self.wheel.schedule(i, i + 1)
+        self.assertEquals(self.loop.call_later.call_count, 1)
+
+    def test_longer_than_wheel(self):
+        self.wheel.schedule('a', 20)
+        self.advance(19)
+        self.assertEquals(self.fired, [])
+        self.advance(1)
+        self.assertEquals(self.fired, ['a'])
+
+    def test_reschedule_later(self):
+        self.wheel.schedule('a', 3)
+        self.advance(2)
+        self.wheel.schedule('a', 3)
+        self.advance(2)
+        self.assertEquals(self.fired, [])
+        self.advance(1)
+        self.assertEquals(self.fired, ['a'])
+
+    def test_reschedule_earlier(self):
+        self.wheel.schedule('a', 10)
+        self.wheel.schedule('a', 2)
+        self.advance(2)
+        self.assertEquals(self.fired, ['a'])
+
+    def test_cancel(self):
+        self.wheel.schedule('a', 3)
+        self.wheel.cancel('a')
+        self.advance(10)
+        self.assertEquals(self.fired, [])
+        self.assertEquals(len(self.wheel), 0)
+
+    def test_rename(self):
+        self.wheel.schedule('a', 2)
+        self.wheel.rename('a', 'b')
+        self.advance(2)
+        self.assertEquals(self.fired, ['b'])
+
+    def test_stops_ticking_when_empty(self):
+        self.wheel.schedule('a', 1)
+        self.advance(1)
+        self.assertEquals(self.wheel.handle, None)
+
+
+class AfkTrackerTest(unittest.TestCase):
+    def setUp(self):
+        self.pinged = []
+        self.dropped = []
+        self.tracker = irc_pugbot.afk.AfkTracker(unittest.mock.Mock(), 5, 2, self.pinged.append, self.dropped.append)
+
+    def advance(self, ticks):
+        for i in range(ticks):
+            self.tracker.wheel._tick()
+
+    def test_ping_then_drop(self):
+        self.tracker.track('a')
+        self.advance(5)
+        self.assertEquals(self.pinged, ['a'])
+        self.assertEquals(self.dropped, [])
+        self.advance(2)
+        self.assertEquals(self.dropped, ['a'])
+        self.assertFalse('a' in self.tracker)
+
+    def test_activity_resets(self):
+        self.tracker.track('a')
+        self.advance(4)
+        self.tracker.active('a')
+        self.advance(4)
+        self.assertEquals(self.pinged, [])
+
+    def test_activity_after_ping_keeps_player(self):
+        self.tracker.track('a')
+        self.advance(5)
+        self.tracker.active('a')
+        self.advance(2)
+        self.assertEquals(self.dropped, [])
+        self.assertTrue('a' in self.tracker)
+
+    def test_untracked_activity_ignored(self):
+        self.tracker.active('a')
+        self.assertFalse('a' in self.tracker)
+
+    def test_pinged_among(self):
+        self.tracker.track('a')
+        self.tracker.track('b')
+        self.tracker.track('c')
+        self.advance(5)
+        self.tracker.active('b')
+        self.assertEquals(self.tracker.pinged_among(['a', 'b']), ['a'])
+        self.assertEquals(self.dropped, [])
+        self.assertTrue('c' in self.tracker)
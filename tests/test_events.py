@@ -0,0 +1,116 @@
+import unittest
+import asyncio
+import irc_pugbot.events
+import irc_pugbot.formats
+import irc_pugbot.manager
+import irc_pugbot.metrics
+import irc_pugbot.pug
+
+
+class EventBusTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(None)
+        self.bus = irc_pugbot.events.EventBus(self.loop)
+        self.received = []
+
+    def tearDown(self):
+        self.bus.close()
+        self.loop.run_until_complete(asyncio.sleep(0, loop=self.loop))
+        self.loop.close()
+
+    @asyncio.coroutine
+    def collect(self, event):
+        self.received.append(event)
+
+    def settle(self):
+        for _ in range(3):
+            self.loop.run_until_complete(asyncio.sleep(0, loop=self.loop))
+
+    def test_pug_events(self):
+        self.bus.subscribe('test', self.collect)
+        pug = irc_pugbot.pug.Tf2HighlanderPug(bus=self.bus)
+        pug.key = ('#a', 1)
+        pug.add('a', ['scout', 'medic'], True)
+        pug.remove('a')
+        self.settle()
+        self.assertEquals(self.received, [
+            irc_pugbot.events.PlayerAdded(('#a', 1), 'a', ('scout', 'medic'), True),
+            irc_pugbot.events.PlayerRemoved(('#a', 1), 'a'),
+        ])
+
+    def test_game_events(self):
+        self.bus.subscribe('test', self.collect, types=[irc_pugbot.events.Staged, irc_pugbot.events.GameMade])
+        pug = irc_pugbot.pug.Tf2Pug(format_=irc_pugbot.formats.ULTIDUO, bus=self.bus)
+        for nick, class_ in [('a', 'soldier'), ('b', 'medic'), ('c', 'soldier'), ('d', 'medic')]:
+            pug.add(nick, [class_], nick in 'ab')
+        pug.stage(['a', 'b'])
+        pug.pick('d', 'medic')
+        pug.pick('c', 'soldier')
+        teams = pug.make_game()
+        self.settle()
+        self.assertEquals([type(event) for event in self.received],
+                          [irc_pugbot.events.Staged, irc_pugbot.events.GameMade])
+        self.assertEquals(self.received[0].captains, ('a', 'b'))
+        self.assertEquals(self.received[1].teams, teams)
+
+    def test_restore_is_silent(self):
+        self.bus.subscribe('test', self.collect)
+        pug = irc_pugbot.pug.Tf2HighlanderPug()
+        pug.add('a', ['scout'])
+        irc_pugbot.pug.Tf2HighlanderPug(bus=self.bus).restore(pug.snapshot())
+        self.settle()
+        self.assertEquals(self.received, [])
+
+    def test_manager_lobby_events(self):
+        self.bus.subscribe('test', self.collect)
+        manager = irc_pugbot.manager.PugManager(irc_pugbot.pug.Tf2HighlanderPug, bus=self.bus)
+        manager.add_channel('#a')
+        manager.open_pug('#a').add('a', ['scout'])
+        self.settle()
+        self.assertEquals(self.received[0], irc_pugbot.events.LobbyOpened(('#a', 1)))
+        self.assertEquals(self.received[1].key, ('#a', 1))
+
+    def test_drop_newest(self):
+        subscriber = self.bus.subscribe('slow', self.collect, maxsize=2)
+        for i in range(5):
+            self.bus.publish(irc_pugbot.events.PlayerRemoved(None, i))
+        self.assertEquals(subscriber.depth, 2)
+        self.settle()
+        self.assertEquals([event.nick for event in self.received], [0, 1])
+        self.assertEquals((subscriber.delivered, subscriber.dropped), (2, 3))
+        self.assertEquals(subscriber.lag.calls, 2)
+
+    def test_drop_oldest(self):
+        subscriber = self.bus.subscribe('slow', self.collect, maxsize=2, drop=irc_pugbot.events.DROP_OLDEST)
+        for i in range(5):
+            self.bus.publish(irc_pugbot.events.PlayerRemoved(None, i))
+        self.settle()
+        self.assertEquals([event.nick for event in self.received], [3, 4])
+        self.assertEquals(subscriber.dropped, 3)
+
+    def test_failing_subscriber_keeps_running(self):
+        errors = []
+        self.loop.set_exception_handler(lambda loop, context: errors.append(context['exception']))
+
+        @asyncio.coroutine
+        def fail(event):
+            raise RuntimeError(event.nick)
+        subscriber = self.bus.subscribe('failing', fail)
+        self.bus.subscribe('test', self.collect)
+        self.bus.publish(irc_pugbot.events.PlayerRemoved(None, 'a'))
+        self.bus.publish(irc_pugbot.events.PlayerRemoved(None, 'b'))
+        self.settle()
+        self.assertEquals(subscriber.errors, 2)
+        self.assertEquals(len(errors), 2)
+        self.assertEquals(len(self.received), 2)
+
+    def test_metrics(self):
+        metrics = irc_pugbot.metrics.Metrics()
+        self.bus.subscribe('web', self.collect)
+        self.bus.add_metrics(metrics)
+        self.bus.subscribe('voice', self.collect)
+        self.bus.publish(irc_pugbot.events.PlayerRemoved(None, 'a'))
+        self.assertTrue('pugbot_events_voice_depth 1' in metrics.render())
+        self.settle()
+        self.assertTrue('pugbot_events_web_dropped 0' in metrics.render())
@@ -0,0 +1,129 @@
+import asyncio
+import types
+import unittest
+import irc_pugbot.flood
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def command(sender, target='#channel', **params):
+    return types.SimpleNamespace(sender=sender, target=target, params=types.SimpleNamespace(**params))
+
+
+class TokenBucketsTest(unittest.TestCase):
+    def test_refill(self):
+        clock = Clock()
+        buckets = irc_pugbot.flood.TokenBuckets(rate=0.5, burst=2, clock=clock)
+        self.assertEquals([buckets.take('a') for _ in range(3)], [True, True, False])
+        self.assertTrue(buckets.take('b'))
+        clock.now = 2.0
+        self.assertEquals([buckets.take('a') for _ in range(2)], [True, False])
+
+    def test_bounded_lru(self):
+        clock = Clock()
+        buckets = irc_pugbot.flood.TokenBuckets(rate=0.5, burst=1, max_keys=2, clock=clock)
+        buckets.take('a')
+        buckets.take('b')
+        buckets.take('a')
+        buckets.take('c')
+        self.assertEquals(len(buckets), 2)
+        self.assertEquals(list(buckets.buckets), ['a', 'c'])
+        self.assertTrue(buckets.take('b'))
+
+
+class FloodGuardTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.version = 0
+        self.guard = irc_pugbot.flood.FloodGuard(
+            rate=0.5, burst=2, host_rate=1, host_burst=3, fold_window=10, version=lambda: self.version, clock=self.clock)
+
+    def test_nick_limit(self):
+        self.assertEquals([self.guard.admit('add', command('a')) for _ in range(3)], [True, True, False])
+        self.assertTrue(self.guard.admit('add', command('b')))
+        self.assertEquals(self.guard.dropped, {'add': 1})
+
+    def test_host_limit(self):
+        for nick in 'abcd':
+            self.guard.seen(nick, '{0}!{0}@example.com'.format(nick))
+        self.guard.seen('e', 'e!e@example.org')
+        admitted = [self.guard.admit('add', command(nick)) for nick in 'abcd']
+        self.assertEquals(admitted, [True, True, True, False])
+        self.assertTrue(self.guard.admit('add', command('e')))
+        self.assertTrue(self.guard.admit('add', command('f')))
+
+    def test_host_from_command_prefix(self):
+        commands = [command(nick) for nick in 'abcd']
+        for c in commands:
+            c.prefix = '{0}!{0}@example.com'.format(c.sender)
+        self.assertEquals([self.guard.admit('add', c) for c in commands], [True, True, True, False])
+
+    def test_host_follows_rename(self):
+        self.guard.seen('a', 'a!a@example.com')
+        self.guard.rename('a', 'b')
+        self.assertEquals(self.guard.host(command('b')), 'example.com')
+        self.assertEquals(self.guard.host(command('a')), None)
+
+    def test_fold_queries(self):
+        self.assertTrue(self.guard.admit('list', command('a', class_=None), query=True))
+        self.assertFalse(self.guard.admit('list', command('b', class_=None), query=True))
+        self.assertTrue(self.guard.admit('list', command('b', class_='scout'), query=True))
+        self.assertTrue(self.guard.admit('list', command('b', '#other', class_=None), query=True))
+        self.assertEquals(self.guard.folded, {'list': 1})
+        self.version += 1
+        self.assertTrue(self.guard.admit('list', command('c', class_=None), query=True))
+        self.clock.now = 10.0
+        self.assertTrue(self.guard.admit('list', command('c', class_=None), query=True))
+
+    def test_fold_per_sender(self):
+        self.assertTrue(self.guard.admit('list', command('a', class_='medic'), query=True, per_sender=True))
+        self.assertTrue(self.guard.admit('list', command('captain', class_='medic'), query=True, per_sender=True))
+        self.assertFalse(self.guard.admit('list', command('captain', class_='medic'), query=True, per_sender=True))
+
+    def test_folded_queries_take_no_tokens(self):
+        self.guard.admit('need', command('a'), query=True)
+        for _ in range(5):
+            self.guard.admit('need', command('a'), query=True)
+        self.assertEquals(self.guard.folded, {'need': 5})
+        self.assertTrue(self.guard.admit('add', command('a')))
+
+    def test_wrap(self):
+        calls = []
+
+        @asyncio.coroutine
+        def handler(bot, command):
+            calls.append(command.sender)
+        guarded = self.guard.wrap('add', handler)
+        loop = asyncio.new_event_loop()
+        try:
+            for _ in range(3):
+                loop.run_until_complete(guarded(None, command('a')))
+        finally:
+            loop.close()
+        self.assertEquals(calls, ['a', 'a'])
+
+    def test_folds_replay_reply(self):
+        replies = []
+        self.guard.reply = lambda target, text, key: replies.append((target, text, key))
+
+        @asyncio.coroutine
+        def handler(bot, command):
+            self.guard.said(command.target, 'Need: scout')
+        guarded = self.guard.wrap('need', handler, query=True)
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(guarded(None, command('a')))
+            self.guard.said('#channel', 'not a reply')
+            for nick in 'bc':
+                loop.run_until_complete(guarded(None, command(nick)))
+        finally:
+            loop.close()
+        key = irc_pugbot.flood.FloodGuard.fold_key('need', command('b'))
+        self.assertEquals(replies, [('#channel', 'Need: scout', key + (0,))] * 2)
+        self.assertEquals(self.guard.folded, {'need': 2})
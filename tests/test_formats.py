@@ -0,0 +1,97 @@
+import unittest
+import irc_pugbot.formats
+import irc_pugbot.pug
+
+
+class FormatTest(unittest.TestCase):
+    def test_compiled_slots(self):
+        sixes = irc_pugbot.formats.SIXES
+        self.assertEquals(sixes.allowed_classes, ['scout', 'soldier', 'demoman', 'medic'])
+        self.assertEquals(sixes.class_slots['scout'], ['scout', 'scout2'])
+        self.assertEquals(sixes.slot_capacities, {'scout': 4, 'soldier': 4, 'demoman': 2, 'medic': 2})
+        self.assertEquals(irc_pugbot.formats.FOURS.slot_capacities, None)
+
+    def test_slot_class(self):
+        self.assertEquals(irc_pugbot.formats.slot_class('scout2'), 'scout')
+        self.assertEquals(irc_pugbot.formats.slot_class('medic'), 'medic')
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            irc_pugbot.formats.Format('bad', 2, {'medic': (1, 1)})
+        with self.assertRaises(ValueError):
+            irc_pugbot.formats.Format('bad', 2, {'civilian': (1, 2)})
+
+    def test_unbalanced_pick_order(self):
+        with self.assertRaises(ValueError):
+            irc_pugbot.formats.Format('bad', 9, {c: (1, 1) for c in irc_pugbot.formats.CLASSES}, pick_order='abbbaa')
+        irc_pugbot.formats.Format('good', 9, {c: (1, 1) for c in irc_pugbot.formats.CLASSES}, pick_order='abab')
+
+    def test_load_formats(self):
+        formats = irc_pugbot.formats.load_formats({'prolander': {
+            'team_size': 7, 'classes': {c: [0, 2] if c == 'scout' else [0, 1] for c in irc_pugbot.formats.CLASSES}}})
+        self.assertEquals(formats['prolander'].picks, 6)
+        self.assertTrue(formats['sixes'] is irc_pugbot.formats.SIXES)
+        self.assertFalse('prolander' in irc_pugbot.formats.FORMATS)
+
+    def test_wrappers(self):
+        players = {'a': irc_pugbot.pug.Player(['scout'], True)}
+        self.assertEquals(irc_pugbot.pug.need_fours(players), (1, 7, {}))
+        self.assertFalse(irc_pugbot.pug.can_stage_fours(players))
+        self.assertEquals(irc_pugbot.pug.need_highlander(players)[:2], (1, 17))
+
+
+class SixesPugTest(unittest.TestCase):
+    def setUp(self):
+        self.pug = irc_pugbot.pug.Tf2Pug(True, format_=irc_pugbot.formats.SIXES)
+
+    def fill(self):
+        for i, class_ in enumerate(['scout', 'scout', 'soldier', 'soldier', 'demoman', 'medic'] * 2):
+            self.pug.add('{0}{1}'.format(class_, i), [class_], class_ == 'demoman')
+
+    def test_need(self):
+        self.assertEquals(self.pug.need, (2, 12, {'scout': 4, 'soldier': 4, 'demoman': 2, 'medic': 2}))
+        self.pug.add('a', ['scout', 'medic'], True)
+        self.assertEquals(self.pug.need, (1, 11, {'scout': 3, 'soldier': 4, 'demoman': 2, 'medic': 2}))
+        self.pug.remove('a')
+        self.fill()
+        self.assertTrue(self.pug.can_stage)
+
+    def test_rejects_other_classes(self):
+        with self.assertRaises(AssertionError):
+            self.pug.add('a', ['spy'])
+
+    def test_second_slot(self):
+        self.fill()
+        self.pug.stage(['demoman4', 'demoman10'])
+        for nick in ['scout0', 'scout1', 'scout6', 'scout7']:
+            self.pug.pick(nick, 'scout')
+        self.assertEquals(self.pug.teams[0], {'scout': 'scout0', 'scout2': 'scout7'})
+        self.assertEquals(self.pug.open_classes(0), ['soldier', 'demoman', 'medic'])
+        with self.assertRaises(irc_pugbot.pug.ClassAlreadyPickedError):
+            self.pug.pick('soldier2', 'scout')
+
+    def test_make_game_fills_captain_slots(self):
+        self.fill()
+        self.pug.stage(['demoman4', 'demoman10'])
+        for nick in ['scout0', 'scout1', 'scout6', 'scout7', 'soldier2', 'soldier3', 'soldier8', 'soldier9',
+                     'medic5', 'medic11']:
+            self.pug.pick(nick, irc_pugbot.formats.slot_class(nick))
+        self.assertTrue(self.pug.can_start)
+        teams = self.pug.make_game()
+        self.assertEquals(teams[0]['demoman'], 'demoman4')
+        self.assertEquals(teams[1]['scout2'], 'scout6')
+        self.assertEquals([len(team) for team in teams], [6, 6])
+
+
+class UltiduoPugTest(unittest.TestCase):
+    def test_stage_and_start(self):
+        pug = irc_pugbot.pug.Tf2Pug(format_=irc_pugbot.formats.ULTIDUO)
+        pug.add('a', ['soldier'], True)
+        pug.add('b', ['medic'], True)
+        pug.add('c', ['soldier'])
+        self.assertEquals(pug.need, (0, 1, {'medic': 1}))
+        pug.add('d', ['medic'])
+        pug.stage(['a', 'b'])
+        pug.pick('d', 'medic')
+        pug.pick('c', 'soldier')
+        self.assertEquals(pug.make_game(), [{'medic': 'd', 'soldier': 'a'}, {'soldier': 'c', 'medic': 'b'}])
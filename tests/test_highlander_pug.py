@@ -2,6 +2,7 @@ import unittest
 import unittest.mock
 import itertools
 import tests.utils
+import irc_pugbot.formats
 import irc_pugbot.pug
 
 
@@ -11,28 +12,28 @@ class HighlanderPugTest(unittest.TestCase):
             pb = irc_pugbot.pug.Tf2HighlanderPug()
             pb.add('nick', [c])
             self.assertEquals(len(pb.unstaged_players), 1)
-            self.assertEquals(pb.unstaged_players['nick'], ([c], False))
+            self.assertEquals(pb.unstaged_players['nick'], irc_pugbot.pug.Player([c], False))
 
     def test_add_multi_class(self):
         for i in range(0, len(tests.utils.CLASSES)-1, 2):
             pb = irc_pugbot.pug.Tf2HighlanderPug()
             pb.add('nick', [tests.utils.CLASSES[i], tests.utils.CLASSES[i+1]])
             self.assertEquals(len(pb.unstaged_players), 1)
-            self.assertEquals(pb.unstaged_players['nick'], ([tests.utils.CLASSES[i], tests.utils.CLASSES[i+1]], False))
+            self.assertEquals(pb.unstaged_players['nick'], irc_pugbot.pug.Player([tests.utils.CLASSES[i], tests.utils.CLASSES[i+1]], False))
 
     def test_readd_different_class(self):
         pb = irc_pugbot.pug.Tf2HighlanderPug()
         for c in tests.utils.CLASSES:
             pb.add('nick', [c])
             self.assertEquals(len(pb.unstaged_players), 1)
-            self.assertEquals(pb.unstaged_players['nick'], ([c], False))
+            self.assertEquals(pb.unstaged_players['nick'], irc_pugbot.pug.Player([c], False))
 
     def test_add_captain_with_class(self):
         for c in tests.utils.CLASSES:
             pb = irc_pugbot.pug.Tf2HighlanderPug()
             pb.add('nick', [c], True)
             self.assertEquals(len(pb.unstaged_players), 1)
-            self.assertEquals(pb.unstaged_players['nick'], ([c], True))
+            self.assertEquals(pb.unstaged_players['nick'], irc_pugbot.pug.Player([c], True))
 
     def test_captain_fails_without_class(self):
         pb = irc_pugbot.pug.Tf2HighlanderPug()
@@ -84,7 +85,7 @@ class HighlanderPugTest(unittest.TestCase):
         self.assertFalse(pb.can_stage)
 
     def test_random_captains(self):
-        captains = irc_pugbot.pug.random_captains({'a': ([], True), 'b': ([], True)})
+        captains = irc_pugbot.pug.random_captains({'a': irc_pugbot.pug.Player([], True), 'b': irc_pugbot.pug.Player([], True)})
         self.assertEquals(len(captains), 2)
         self.assertTrue('a' in captains)
         self.assertTrue('b' in captains)
@@ -106,12 +107,7 @@ class HighlanderPugTest(unittest.TestCase):
         self.assertEquals(pb.picking_team, 0)
 
     def test_river(self):
-        river = irc_pugbot.pug.river()
-        self.assertEquals(0, next(river))
-        self.assertEquals(1, next(river))
-        self.assertEquals(1, next(river))
-        self.assertEquals(0, next(river))
-        self.assertEquals(0, next(river))
+        self.assertEquals(irc_pugbot.pug.Tf2HighlanderPug.format.pick_order[:5], (0, 1, 1, 0, 0))
 
     @unittest.mock.patch('irc_pugbot.pug.random_captains')
     def test_simple_pick(self, random_captains):
@@ -126,6 +122,25 @@ class HighlanderPugTest(unittest.TestCase):
         self.assertFalse(players[2][0] in pb.staged_players)
         self.assertEquals(pb.picking_team, 1)
 
+    @unittest.mock.patch('irc_pugbot.pug.random_captains')
+    def test_undo(self, random_captains):
+        pb = irc_pugbot.pug.Tf2HighlanderPug()
+        players = list(itertools.chain.from_iterable(tests.utils.generate_highlander_game()))
+        for player in players:
+            pb.add(player.nick, player.classes, True)
+        random_captains.return_value = [players[0][0], players[1][0]]
+        pb.stage()
+        pb.pick(players[2][0], 'pyro')
+        pb.pick(players[3][0], 'demoman')
+        self.assertEquals(pb.undo(), players[3][0])
+        self.assertEquals(pb.teams[1], {})
+        self.assertEquals(pb.staged_players[players[3][0]], irc_pugbot.pug.Player(players[3][1], True))
+        self.assertEquals(pb.location(players[3][0]), (irc_pugbot.pug.STAGED, None, None))
+        self.assertEquals(pb.picking_team, 1)
+        pb.undo()
+        self.assertEquals(pb.picking_team, 0)
+        self.assertRaises(irc_pugbot.pug.NothingToUndoError, pb.undo)
+
     @unittest.mock.patch('irc_pugbot.pug.random_captains')
     def test_cannot_pick_class_twice(self, random_captains):
         pb = irc_pugbot.pug.Tf2HighlanderPug()
@@ -148,12 +163,7 @@ class HighlanderPugTest(unittest.TestCase):
         pb = irc_pugbot.pug.Tf2HighlanderPug()
         players = []
 
-        def my_order():
-            yield 0
-            yield 1
-            yield from irc_pugbot.pug.river()
-
-        order = my_order()
+        order = itertools.chain([0, 1], irc_pugbot.pug.Tf2HighlanderPug.format.pick_order)
         for i, c in enumerate(tests.utils.CLASSES):
             player1 = ('nick{0}{1}'.format(next(order), i), [c])
             player2 = ('nick{0}{1}'.format(next(order), i), [c])
@@ -178,12 +188,7 @@ class HighlanderPugTest(unittest.TestCase):
         pb = irc_pugbot.pug.Tf2HighlanderPug()
         players = []
 
-        def my_order():
-            yield 0
-            yield 1
-            yield from irc_pugbot.pug.river()
-
-        order = my_order()
+        order = itertools.chain([0, 1], irc_pugbot.pug.Tf2HighlanderPug.format.pick_order)
         for i, c in enumerate(tests.utils.CLASSES):
             player1 = ('nick{0}{1}'.format(next(order), i), [c])
             player2 = ('nick{0}{1}'.format(next(order), i), [c])
@@ -204,4 +209,198 @@ class HighlanderPugTest(unittest.TestCase):
         self.assertTrue(pb.staged_players is None)
         self.assertTrue(pb.order is None)
         self.assertTrue(pb.picking_team is None)
-        self.assertEquals(pb.unstaged_players, {'unpicked1': ([tests.utils.CLASSES[1]], False), 'unpicked2': ([tests.utils.CLASSES[2]], False)})
\ No newline at end of file
+        self.assertEquals(pb.unstaged_players, {'unpicked1': irc_pugbot.pug.Player([tests.utils.CLASSES[1]]), 'unpicked2': irc_pugbot.pug.Player([tests.utils.CLASSES[2]])})
+
+
+class HighlanderPugCounterTest(unittest.TestCase):
+    def test_counters_follow_add_and_remove(self):
+        pb = irc_pugbot.pug.Tf2HighlanderPug(check_counters=True)
+        pb.add('nick', ['scout', 'medic'], True)
+        self.assertEquals(pb.captain_count, 1)
+        self.assertEquals(pb.class_counts['scout'], 1)
+        self.assertEquals(pb.class_counts['medic'], 1)
+        pb.remove('nick')
+        self.assertEquals(pb.captain_count, 0)
+        self.assertEquals(pb.need, (2, 18, {c: 2 for c in tests.utils.CLASSES}))
+
+    def test_readd_replaces_counts(self):
+        pb = irc_pugbot.pug.Tf2HighlanderPug(check_counters=True)
+        pb.add('nick', ['scout'], True)
+        pb.add('nick', ['medic'])
+        self.assertEquals(pb.captain_count, 0)
+        self.assertEquals(pb.class_counts['scout'], 0)
+        self.assertEquals(pb.class_counts['medic'], 1)
+        self.assertEquals(pb.need[2]['scout'], 2)
+
+    def test_mismatch_detected_in_check_mode(self):
+        pb = irc_pugbot.pug.Tf2HighlanderPug(check_counters=True)
+        pb.add('nick', ['scout'])
+        pb.unstaged_players['other'] = irc_pugbot.pug.Player(['medic'], True)
+        self.assertRaises(irc_pugbot.pug.CounterMismatchError, lambda: pb.need)
+
+    @unittest.mock.patch('irc_pugbot.pug.random_captains')
+    def test_counters_through_game(self, random_captains):
+        pb = irc_pugbot.pug.Tf2HighlanderPug(check_counters=True)
+        players = list(itertools.chain.from_iterable(tests.utils.generate_highlander_game()))
+        for player in players:
+            pb.add(player.nick, player.classes, True)
+        pb.add('extra', ['medic'])
+        random_captains.return_value = [players[0].nick, players[9].nick]
+        pb.stage()
+        self.assertEquals(pb.need, (2, 18, {c: 2 for c in tests.utils.CLASSES}))
+        pb.add('late', ['spy'])
+        picks = [p for p in players if p.nick not in random_captains.return_value]
+        for team_picks in zip(picks[:8], picks[8:]):
+            for player in team_picks:
+                pb.pick(player.nick, player.classes[0])
+        pb.make_game()
+        self.assertEquals(pb.class_counts['medic'], 1)
+        self.assertEquals(pb.class_counts['spy'], 1)
+        self.assertEquals(pb.need[1], 16)
+
+    def test_multi_class_player_covers_one_slot(self):
+        pb = irc_pugbot.pug.Tf2HighlanderPug(check_counters=True)
+        players = list(itertools.chain.from_iterable(tests.utils.generate_highlander_game()))
+        for player in players[1:]:
+            if player.classes != ['medic']:
+                pb.add(player.nick, player.classes, True)
+        pb.add('flex', ['medic', 'scout'])
+        pb.add('medic', ['medic'])
+        pb.add('extra', ['pyro'])
+        self.assertEquals(irc_pugbot.pug.need_highlander(pb.unstaged_players), (0, 0, {}))
+        captain_need_count, player_need_count, class_need_count = pb.need
+        self.assertEquals(player_need_count, 1)
+        self.assertEquals(sum(class_need_count.values()), 1)
+        self.assertFalse(pb.can_stage)
+
+
+class HighlanderPugLocationTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = {}
+        self.pb = irc_pugbot.pug.Tf2HighlanderPug(check_counters=True, directory=self.directory)
+        self.players = list(itertools.chain.from_iterable(tests.utils.generate_highlander_game()))
+        for player in self.players:
+            self.pb.add(player.nick, player.classes, True)
+        self.captains = [self.players[0].nick, self.players[9].nick]
+
+    def stage(self):
+        with unittest.mock.patch('irc_pugbot.pug.random_captains') as random_captains:
+            random_captains.return_value = list(self.captains)
+            self.pb.stage()
+
+    def test_unstaged_rename(self):
+        self.assertEquals(self.pb.location(self.players[1].nick), (irc_pugbot.pug.UNSTAGED, None, None))
+        self.assertTrue(self.pb.rename(self.players[1].nick, 'renamed'))
+        self.assertTrue('renamed' in self.pb.unstaged_players)
+        self.assertFalse(self.players[1].nick in self.directory)
+        self.assertEquals(self.directory['renamed'], {self.pb})
+        self.assertTrue(self.pb.can_stage)
+
+    def test_unknown_rename(self):
+        self.assertFalse(self.pb.rename('stranger', 'renamed'))
+
+    def test_rename_to_participant_fails(self):
+        self.assertRaises(irc_pugbot.pug.NickInUseError, self.pb.rename, self.players[1].nick, self.players[2].nick)
+        self.assertTrue(self.players[1].nick in self.pb.unstaged_players)
+
+    def test_staged_and_captain_rename(self):
+        self.stage()
+        self.assertTrue(self.pb.is_captain(self.captains[0]))
+        self.pb.rename(self.captains[0], 'captain')
+        self.pb.rename(self.players[1].nick, 'staged')
+        self.assertEquals(self.pb.captains[0], 'captain')
+        self.assertTrue(self.pb.is_captain('captain'))
+        self.assertTrue('staged' in self.pb.staged_players)
+
+    def test_picked_rename(self):
+        self.stage()
+        self.pb.pick(self.players[1].nick, 'soldier')
+        self.assertEquals(self.pb.location(self.players[1].nick), (irc_pugbot.pug.PICKED, 0, 'soldier'))
+        self.pb.rename(self.players[1].nick, 'picked')
+        self.assertEquals(self.pb.teams[0], {'soldier': 'picked'})
+
+    def test_staged_player_cannot_add(self):
+        self.stage()
+        self.assertRaises(irc_pugbot.pug.AlreadyStagedError, self.pb.add, self.players[1].nick, ['scout'])
+
+    def test_pick_unknown_player_leaves_teams(self):
+        self.stage()
+        self.assertRaises(KeyError, self.pb.pick, 'stranger', 'scout')
+        self.assertEquals(self.pb.teams[0], {})
+
+    def test_make_game_clears_participants(self):
+        self.stage()
+        picks = [p for p in self.players if p.nick not in self.captains]
+        for team_picks in zip(picks[:8], picks[8:]):
+            for player in team_picks:
+                self.pb.pick(player.nick, player.classes[0])
+        self.pb.make_game()
+        self.assertEquals(self.pb.locations, {})
+        self.assertEquals(self.directory, {})
+
+
+class PlayerTest(unittest.TestCase):
+    def test_mask(self):
+        player = irc_pugbot.pug.Player(['medic', 'scout'])
+        self.assertEquals(player.mask, irc_pugbot.pug.CLASS_BITS['medic'] | irc_pugbot.pug.CLASS_BITS['scout'])
+        self.assertTrue(player.plays('scout'))
+        self.assertFalse(player.plays('spy'))
+        self.assertEquals(irc_pugbot.pug.mask_classes(player.mask), ['scout', 'medic'])
+
+    def test_classes_keep_order_without_duplicates(self):
+        player = irc_pugbot.pug.Player(['medic', 'scout', 'medic'], True)
+        self.assertEquals(player.classes, ('medic', 'scout'))
+        self.assertTrue(player.captain)
+
+    def test_count_classes(self):
+        players = [irc_pugbot.pug.Player(['medic', 'scout']), irc_pugbot.pug.Player(['medic']), irc_pugbot.pug.Player(['spy'])]
+        counts = irc_pugbot.pug.count_classes(players)
+        self.assertEquals(counts['medic'], 2)
+        self.assertEquals(counts['scout'], 1)
+        self.assertEquals(counts['spy'], 1)
+        self.assertEquals(counts['pyro'], 0)
+
+
+class ClassIndexTest(unittest.TestCase):
+    def test_unstaged_index(self):
+        pb = irc_pugbot.pug.Tf2HighlanderPug(check_counters=True)
+        pb.add('a', ['medic', 'scout'])
+        pb.add('b', ['medic'])
+        pb.add('c', ['scout'])
+        self.assertEquals(pb.class_players('medic'), ['a', 'b'])
+        pb.add('a', ['scout'])
+        pb.remove('c')
+        self.assertEquals(pb.class_players('medic'), ['b'])
+        self.assertEquals(pb.class_players('scout'), ['a'])
+        pb.rename('b', 'bee')
+        self.assertEquals(pb.class_players('medic'), ['bee'])
+        pb.need
+
+    def test_index_through_picking(self):
+        pb = irc_pugbot.pug.Tf2Pug(format_=irc_pugbot.formats.ULTIDUO)
+        for nick, classes in [('a', ['soldier']), ('b', ['medic']), ('c', ['soldier', 'medic']), ('d', ['medic']),
+                              ('dan', ['soldier'])]:
+            pb.add(nick, classes, nick in 'ab')
+        pb.stage(['a', 'b'])
+        self.assertEquals(pb.class_players('medic'), ['c', 'd'])
+        self.assertEquals(pb.unstaged_index.count('medic'), 0)
+        self.assertEquals(pb.complete('D'), ['d', 'dan'])
+        self.assertEquals(pb.complete('d', 'soldier'), ['dan'])
+        pb.pick('c', 'medic')
+        self.assertEquals(pb.class_players('medic'), ['d'])
+        pb.undo()
+        self.assertEquals(pb.class_players('soldier'), ['dan', 'c'])
+        pb.pick('d', 'medic')
+        pb.pick('c', 'soldier')
+        pb.make_game()
+        self.assertEquals(pb.staged_index.count('soldier'), 0)
+        self.assertEquals(pb.class_players('soldier'), ['dan'])
+
+    def test_restore_rebuilds_index(self):
+        pb = irc_pugbot.pug.Tf2Pug(format_=irc_pugbot.formats.ULTIDUO)
+        for nick, class_ in [('a', 'soldier'), ('b', 'medic'), ('c', 'soldier'), ('d', 'medic')]:
+            pb.add(nick, [class_], nick in 'ab')
+        pb.stage(['a', 'b'])
+        restored = irc_pugbot.pug.Tf2Pug(format_=irc_pugbot.formats.ULTIDUO)
+        restored.restore(pb.snapshot())
+        self.assertEquals(restored.class_players('medic'), ['d'])
@@ -0,0 +1,69 @@
+import unittest
+import irc_pugbot.formats
+import irc_pugbot.history
+import irc_pugbot.pug
+
+
+class PickHistoryTest(unittest.TestCase):
+    def setUp(self):
+        self.history = irc_pugbot.history.PickHistory(combo_games=2, combo_share=0.75)
+
+    def play(self, red, blu, picks, unpicked=()):
+        teams = [{'class{0}'.format(i): nick for i, nick in enumerate(team)} for team in (red, blu)]
+        self.history.record(teams, [(0, 'x', nick) for nick in picks], unpicked)
+
+    def test_together(self):
+        self.play(['a', 'b', 'c'], ['d', 'e'], [])
+        self.play(['a', 'b'], ['c', 'd'], [])
+        self.assertEquals(self.history.together('a', 'b'), 2)
+        self.assertEquals(self.history.together('b', 'a'), 2)
+        self.assertEquals(self.history.together('a', 'c'), 1)
+        self.assertEquals(self.history.together('a', 'd'), 0)
+        self.assertEquals(self.history.together('a', 'stranger'), 0)
+
+    def test_combo(self):
+        self.play(['a', 'b'], ['c', 'd'], [])
+        self.assertFalse(self.history.is_combo('a', 'b'))
+        self.play(['a', 'b'], ['c', 'd'], [])
+        self.assertTrue(self.history.is_combo('a', 'b'))
+        self.assertEquals(self.history.combo_partner('c', ['a', 'd']), 'd')
+        self.play(['a', 'c'], ['b', 'd'], [])
+        self.play(['a', 'd'], ['b', 'c'], [])
+        self.assertFalse(self.history.is_combo('a', 'b'))
+
+    def test_streaks(self):
+        self.play(['a', 'b'], ['c', 'd'], ['b', 'd'], unpicked=['e'])
+        self.assertEquals((self.history.streak('b'), self.history.streak('d'), self.history.streak('e')), (0, 1, 1))
+        self.play(['a', 'e'], ['c', 'd'], ['d', 'e'], unpicked=['b'])
+        self.assertEquals((self.history.streak('d'), self.history.streak('e'), self.history.streak('b')), (0, 2, 1))
+        self.assertEquals(self.history.priority(['a', 'b', 'd', 'e']), ['e', 'b'])
+
+    def test_matchmade(self):
+        self.play(['a', 'b'], ['c', 'd'], ['b'], unpicked=['e'])
+        self.play(['a', 'e'], ['b', 'c'], [])
+        self.assertEquals(self.history.together('a', 'e'), 1)
+        self.assertEquals((self.history.streak('b'), self.history.streak('e')), (0, 0))
+
+    def test_rename(self):
+        self.play(['a', 'b'], ['c', 'd'], ['b'])
+        self.history.rename('b', 'bee')
+        self.assertEquals(self.history.together('a', 'bee'), 1)
+        self.assertEquals(self.history.streak('bee'), 1)
+        self.assertFalse('b' in self.history)
+
+
+class PriorityPugTest(unittest.TestCase):
+    def test_stage_lists_priority_first(self):
+        pug = irc_pugbot.pug.Tf2Pug(format_=irc_pugbot.formats.ULTIDUO)
+        for nick, class_ in [('a', 'soldier'), ('b', 'medic'), ('c', 'soldier'), ('d', 'medic'), ('e', 'medic')]:
+            pug.add(nick, [class_], nick in 'ab')
+        pug.stage(['a', 'b'], ['e', 'gone'])
+        self.assertEquals(list(pug.staged_players), ['e', 'c', 'd'])
+
+    def test_matchmake_takes_priority_first(self):
+        pug = irc_pugbot.pug.Tf2Pug(format_=irc_pugbot.formats.ULTIDUO, matchmaking=True)
+        for nick, class_ in [('a', 'soldier'), ('b', 'medic'), ('c', 'soldier'), ('d', 'medic'), ('e', 'medic')]:
+            pug.add(nick, [class_])
+        teams = pug.matchmake(priority=['e'])
+        self.assertTrue('e' in set(teams[0].values()) | set(teams[1].values()))
+        self.assertEquals(list(pug.unstaged_players), ['d'])
@@ -4,6 +4,7 @@ import itertools
 import unittest.mock
 import tests.utils
 import irc_pugbot.irc
+import irc_pugbot.pug
 import irc.bot
 import irc.command
 import irc.messages
@@ -53,7 +54,7 @@ class IrcTest(unittest.TestCase):
         self.loop.run_until_complete(self.b._read_handler)
         self.loop.run_until_complete(asyncio.Task(self.b.tasks.join(), loop=self.loop))
         self.assertTrue('nick' in self.ip.pug.unstaged_players)
-        self.assertEquals(self.ip.pug.unstaged_players['nick'], (['scout'], False))
+        self.assertEquals(self.ip.pug.unstaged_players['nick'], irc_pugbot.pug.Player(['scout'], False))
 
     def test_add_captain(self):
         stream = irc.parser.StreamProtocol(loop=self.loop)
@@ -65,7 +66,7 @@ class IrcTest(unittest.TestCase):
         self.loop.run_until_complete(self.b._read_handler)
         self.loop.run_until_complete(asyncio.Task(self.b.tasks.join(), loop=self.loop))
         self.assertTrue('nick' in self.ip.pug.unstaged_players)
-        self.assertEquals(self.ip.pug.unstaged_players['nick'], (['scout'], True))
+        self.assertEquals(self.ip.pug.unstaged_players['nick'], irc_pugbot.pug.Player(['scout'], True))
 
     def test_add_stages_when_ready(self):
         stream = irc.parser.StreamProtocol(loop=self.loop)
@@ -143,6 +144,17 @@ class IrcTest(unittest.TestCase):
     def test_unstaged_nick_changes(self):
         pass
 
+    def test_nick_change_onto_nick_in_use(self):
+        self.ip.pug.add('nick', ['scout'])
+        self.ip.pug.add('taken', ['medic'])
+        self.ip.ratings.ratings['nick'] = 1600
+        self.ip.say = unittest.mock.Mock()
+        self.loop.run_until_complete(self.ip.handle_nick(self.b, unittest.mock.Mock(nick='nick', params=['taken'])))
+        self.assertTrue('nick' in self.ip.pug.unstaged_players)
+        self.assertEquals(self.ip.ratings.get('nick'), 1600)
+        self.assertFalse('taken' in self.ip.ratings)
+        self.assertEquals(self.ip.say.call_count, 1)
+
     def test_staged_nick_changes(self):
         pass
 
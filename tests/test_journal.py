@@ -0,0 +1,84 @@
+import unittest
+import asyncio
+import itertools
+import os
+import shutil
+import tempfile
+import unittest.mock
+import tests.utils
+import irc_pugbot.pug
+import irc_pugbot.manager
+import irc_pugbot.journal
+
+
+class JournalTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(None)
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'pug')
+
+    def tearDown(self):
+        self.loop.close()
+        shutil.rmtree(self.directory)
+
+    def new_manager(self, snapshot_interval=10000):
+        journal = irc_pugbot.journal.Journal(self.path, loop=self.loop, snapshot_interval=snapshot_interval)
+        manager = irc_pugbot.manager.PugManager(irc_pugbot.pug.Tf2HighlanderPug)
+        journal.replay(manager)
+        manager.add_channel('#channel')
+        return journal, manager
+
+    def close(self, journal):
+        last_write = journal.flush()
+        if last_write is not None:
+            self.loop.run_until_complete(last_write)
+        journal.executor.shutdown()
+
+    def play(self, manager):
+        pug = manager.open_pug('#channel')
+        players = list(itertools.chain.from_iterable(tests.utils.generate_highlander_game()))
+        for player in players:
+            pug.add(player.nick, player.classes, True)
+        pug.add('extra', ['medic'])
+        pug.remove('extra')
+        pug.stage()
+        manager.staged('#channel', pug)
+        manager.open_pug('#channel').add('late', ['spy'])
+        pug.rename(pug.captains[0], 'renamed')
+        staged = list(pug.staged_players.items())
+        for nick, player in staged[:3]:
+            try:
+                pug.pick(nick, player.classes[0])
+            except irc_pugbot.pug.ClassAlreadyPickedError:
+                pass
+        pug.undo()
+
+    def assert_replays(self, snapshot_interval):
+        journal, manager = self.new_manager(snapshot_interval)
+        self.play(manager)
+        expected = manager.snapshot()
+        picking_team = manager.lobbies['#channel'][1].picking_team
+        self.close(journal)
+        journal, restored = self.new_manager()
+        self.assertEquals(restored.snapshot(), expected)
+        pug = restored.lobbies['#channel'][1]
+        self.assertEquals(pug.picking_team, picking_team)
+        self.assertTrue(pug.is_captain('renamed'))
+        self.close(journal)
+
+    def test_replay_journal(self):
+        self.assert_replays(10000)
+
+    def test_replay_snapshot_and_tail(self):
+        self.assert_replays(7)
+
+    def test_partial_trailing_line_ignored(self):
+        journal, manager = self.new_manager()
+        manager.open_pug('#channel').add('nick', ['scout'])
+        self.close(journal)
+        with open(self.path + '.journal', 'a') as f:
+            f.write('[3, "#chan')
+        journal, restored = self.new_manager()
+        self.assertTrue('nick' in restored.open_pug('#channel').unstaged_players)
+        self.close(journal)
@@ -0,0 +1,104 @@
+import unittest
+import asyncio
+import os
+import shutil
+import struct
+import tempfile
+import irc_pugbot.logs
+
+LOG = '''L 10/18/2026 - 20:00:00: Log file started (file "logs/L1018000.log") (game "/tf") (version "8835751")
+L 10/18/2026 - 20:01:00: "Red Soldier<2><[U:1:2]><Red>" triggered "damage" against "Blu Scout<3><[U:1:3]><Blue>" (damage "90") (weapon "tf_projectile_rocket")
+L 10/18/2026 - 20:01:01: "Red Soldier<2><[U:1:2]><Red>" triggered "damage" against "Blu Scout<3><[U:1:3]><Blue>" (damage "35") (weapon "tf_projectile_rocket")
+L 10/18/2026 - 20:01:01: "Red Soldier<2><[U:1:2]><Red>" killed "Blu Scout<3><[U:1:3]><Blue>" with "tf_projectile_rocket" (attacker_position "0 0 0") (victim_position "1 1 1")
+L 10/18/2026 - 20:01:01: "Red Medic<4><[U:1:4]><Red>" triggered "kill assist" against "Blu Scout<3><[U:1:3]><Blue>" (assister_position "0 0 0")
+L 10/18/2026 - 20:01:02: "Red Medic<4><[U:1:4]><Red>" triggered "healed" against "Red Soldier<2><[U:1:2]><Red>" (healing "57")
+L 10/18/2026 - 20:01:03: "Red Soldier<2><[U:1:2]><Red>" say "gg"
+'''
+
+
+class ParseTest(unittest.TestCase):
+    def test_summarize(self):
+        totals = irc_pugbot.logs.summarize(irc_pugbot.logs.parse_events(LOG.splitlines()))
+        self.assertEquals(totals, {
+            'Red Soldier': [125, 1, 0, 0, 0],
+            'Blu Scout': [0, 0, 1, 0, 0],
+            'Red Medic': [0, 0, 0, 1, 57],
+        })
+
+    def test_events_are_lazy(self):
+        events = irc_pugbot.logs.parse_events(iter(LOG.splitlines()))
+        self.assertEquals(next(events), ('damage', 'Red Soldier', 'Blu Scout', 90))
+
+    def test_player_limit(self):
+        totals = irc_pugbot.logs.summarize(irc_pugbot.logs.parse_events(LOG.splitlines()), max_players=1)
+        self.assertEquals(totals, {'Red Soldier': [125, 1, 0, 0, 0]})
+
+    def test_match_players(self):
+        totals = {'red soldier': [1, 2, 3, 4, 5], 'Stranger': [0, 0, 0, 0, 0]}
+        self.assertEquals(irc_pugbot.logs.match_players(totals, ['Red Soldier', 'other']),
+                          {'Red Soldier': [1, 2, 3, 4, 5]})
+
+
+class FilesTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(None)
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.loop.close()
+        shutil.rmtree(self.directory)
+
+    def write(self, name, data, mtime=None):
+        path = os.path.join(self.directory, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+        return path
+
+    def demo(self):
+        return struct.pack('<8sii260s260s260s260sfiii', b'HL2DEMO\x00', 3, 24, b'Fake TF2', b'SourceTV',
+                           b'cp_badlands', b'tf', 1800.5, 119000, 59000, 123456)
+
+    def test_read_lines_skips_overlong(self):
+        path = self.write('a.log', b'short\n' + b'x' * 100 + b'\nend\n')
+        self.assertEquals(list(irc_pugbot.logs.read_lines(path, max_line=50)), ['short\n', 'end\n'])
+
+    def test_latest_log(self):
+        self.write('L1.log', b'', 1000)
+        latest = self.write('L2.log', b'', 2000)
+        self.write('notes.txt', b'', 3000)
+        self.assertEquals(irc_pugbot.logs.latest_log(self.directory), latest)
+
+    def test_latest_log_in_window(self):
+        game = self.write('L1.log', b'', 1000)
+        self.write('L2.log', b'', 2000)
+        self.assertEquals(irc_pugbot.logs.latest_log(self.directory, 500, 1500), game)
+        self.assertEquals(irc_pugbot.logs.latest_log(self.directory, 2500, 3000), None)
+
+    def test_latest_log_written_after_until(self):
+        game = self.write('L1.log', b'', 1030)
+        self.write('L2.log', b'', 1500)
+        self.assertEquals(irc_pugbot.logs.latest_log(self.directory, 500, 1000, slack=60), game)
+
+    def test_parse_demo(self):
+        demo = irc_pugbot.logs.parse_demo(self.write('pug_1.dem', self.demo() + b'\x00' * 64))
+        self.assertEquals(demo, {'server': 'Fake TF2', 'map': 'cp_badlands', 'duration': 1800.5,
+                                 'ticks': 119000, 'frames': 59000})
+        with self.assertRaises(ValueError):
+            irc_pugbot.logs.parse_demo(self.write('bad.dem', b'nope'))
+
+    def test_pipeline(self):
+        self.write('L1.log', LOG.encode())
+        demo_path = self.write('pug_1.dem', self.demo())
+        pipeline = irc_pugbot.logs.IngestPipeline(self.loop, workers=1)
+        try:
+            totals, demo = self.loop.run_until_complete(pipeline.ingest_server(self.directory, demo_path))
+            self.assertEquals(totals['Red Medic'], [0, 0, 0, 1, 57])
+            self.assertEquals(demo['map'], 'cp_badlands')
+            totals, demo = self.loop.run_until_complete(
+                pipeline.ingest_server(self.directory, os.path.join(self.directory, 'missing.dem')))
+            self.assertEquals(demo, None)
+        finally:
+            pipeline.close()
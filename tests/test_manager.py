@@ -0,0 +1,76 @@
+import unittest
+import itertools
+import unittest.mock
+import tests.utils
+import irc_pugbot.pug
+import irc_pugbot.manager
+
+
+class PugManagerTest(unittest.TestCase):
+    def setUp(self):
+        self.manager = irc_pugbot.manager.PugManager(irc_pugbot.pug.Tf2HighlanderPug)
+        self.manager.add_channel('#a')
+        self.manager.add_channel('#b')
+
+    def fill(self, pug, prefix=''):
+        for player in itertools.chain.from_iterable(tests.utils.generate_highlander_game()):
+            pug.add(prefix + player.nick, player.classes, True)
+
+    def test_channels_have_separate_pugs(self):
+        self.manager.open_pug('#a').add('nick', ['scout'])
+        self.assertTrue('#a' in self.manager)
+        self.assertFalse('#c' in self.manager)
+        self.assertEquals(self.manager.open_pug('#b').unstaged_players, {})
+
+    def test_staging_opens_overflow_lobby(self):
+        pug = self.manager.open_pug('#a')
+        self.fill(pug)
+        pug.stage()
+        self.manager.staged('#a', pug)
+        overflow = self.manager.open_pug('#a')
+        self.assertFalse(overflow is pug)
+        self.assertEquals(self.manager.picking_pugs('#a'), [pug])
+        self.assertTrue(self.manager.captain_pug('#a', pug.captains[0]) is pug)
+        self.fill(overflow, 'late_')
+        self.assertTrue(overflow.can_stage)
+
+    @unittest.mock.patch('irc_pugbot.pug.random_captains')
+    def test_finished_lobby_folds_into_open_lobby(self, random_captains):
+        pug = self.manager.open_pug('#a')
+        players = list(itertools.chain.from_iterable(tests.utils.generate_highlander_game()))
+        self.fill(pug)
+        pug.add('leftover', ['medic'])
+        random_captains.return_value = [players[0].nick, players[9].nick]
+        pug.stage()
+        self.manager.staged('#a', pug)
+        picks = [p for p in players if p.nick not in random_captains.return_value]
+        for team_picks in zip(picks[:8], picks[8:]):
+            for player in team_picks:
+                pug.pick(player.nick, player.classes[0])
+        pug.make_game()
+        self.manager.finished('#a', pug)
+        self.assertEquals(list(self.manager.lobbies['#a'].values()), [self.manager.open_pug('#a')])
+        self.assertTrue('leftover' in self.manager.open_pug('#a').unstaged_players)
+
+    def test_rename_across_lobbies(self):
+        self.manager.open_pug('#a').add('nick', ['scout'])
+        self.manager.open_pug('#b').add('nick', ['medic'])
+        self.manager.rename('nick', 'renamed')
+        self.assertEquals(self.manager.directory, {'renamed': {self.manager.open_pug('#a'), self.manager.open_pug('#b')}})
+        self.assertTrue('renamed' in self.manager.open_pug('#b').unstaged_players)
+
+    def test_rename_into_taken_nick(self):
+        self.manager.open_pug('#a').add('nick', ['scout'])
+        self.manager.open_pug('#b').add('nick', ['medic'])
+        self.manager.open_pug('#b').add('taken', ['soldier'])
+        self.assertRaises(irc_pugbot.pug.NickInUseError, self.manager.rename, 'nick', 'taken')
+        self.assertTrue('nick' in self.manager.open_pug('#a').unstaged_players)
+        self.assertTrue('nick' in self.manager.open_pug('#b').unstaged_players)
+
+    def test_picking_pug(self):
+        pug = self.manager.open_pug('#a')
+        self.fill(pug)
+        pug.stage()
+        self.manager.staged('#a', pug)
+        self.assertTrue(self.manager.picking_pug('#a', pug.captains[0]) is pug)
+        self.assertTrue(self.manager.picking_pug('#b', pug.captains[0]) is None)
@@ -0,0 +1,59 @@
+import unittest
+import random
+import tests.utils
+import irc_pugbot.matching
+
+
+class SlotMatcherTest(unittest.TestCase):
+    def setUp(self):
+        self.matcher = irc_pugbot.matching.SlotMatcher({c: 2 for c in tests.utils.CLASSES})
+
+    def test_empty(self):
+        self.assertEquals(self.matcher.size, 0)
+        self.assertEquals(self.matcher.shortfall(), {c: 2 for c in tests.utils.CLASSES})
+
+    def test_add_fills_slot(self):
+        self.matcher.add('nick', ['medic'])
+        self.assertEquals(self.matcher.assignments, {'nick': 'medic'})
+        self.assertEquals(self.matcher.shortfall()['medic'], 1)
+
+    def test_add_over_capacity_waits(self):
+        for i in range(3):
+            self.matcher.add('nick{0}'.format(i), ['medic'])
+        self.assertEquals(self.matcher.size, 2)
+        self.assertEquals(list(self.matcher.waiting['medic']), ['nick2'])
+
+    def test_add_reroutes_multi_class_player(self):
+        self.matcher.add('a', ['scout', 'medic'])
+        self.matcher.add('b', ['scout'])
+        self.matcher.add('c', ['scout'])
+        self.assertEquals(self.matcher.size, 3)
+        self.assertEquals(self.matcher.assignments['a'], 'medic')
+
+    def test_remove_pulls_in_waiting_player(self):
+        for i in range(3):
+            self.matcher.add('nick{0}'.format(i), ['medic'])
+        self.matcher.remove('nick0')
+        self.assertEquals(self.matcher.size, 2)
+        self.assertEquals(self.matcher.waiting['medic'], {})
+
+    def test_remove_shifts_through_chain(self):
+        self.matcher.add('a', ['scout', 'medic'])
+        self.matcher.add('b', ['medic'])
+        self.matcher.add('c', ['medic'])
+        self.assertEquals(self.matcher.assignments['a'], 'scout')
+        self.matcher.remove('b')
+        self.matcher.add('d', ['scout'])
+        self.matcher.add('e', ['scout'])
+        self.assertEquals(self.matcher.size, 4)
+        self.assertTrue(self.matcher.verify())
+
+    def test_random_churn_stays_maximum(self):
+        rng = random.Random(4)
+        for step in range(2000):
+            nick = 'nick{0}'.format(rng.randrange(60))
+            if nick in self.matcher and rng.random() < 0.5:
+                self.matcher.remove(nick)
+            else:
+                self.matcher.add(nick, rng.sample(tests.utils.CLASSES, rng.randint(1, 3)))
+            self.assertTrue(self.matcher.verify())
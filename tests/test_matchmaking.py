@@ -0,0 +1,110 @@
+import unittest
+import itertools
+import random
+import tests.utils
+import irc_pugbot.formats
+import irc_pugbot.matching
+import irc_pugbot.matchmaking
+import irc_pugbot.pug
+import irc_pugbot.ratings
+
+
+def queue(entries):
+    return {nick: irc_pugbot.pug.Player(classes) for nick, classes in entries}
+
+
+class AssignClassesTest(unittest.TestCase):
+    def test_prefers_earlier_players(self):
+        players = queue(('p{0}'.format(i), [c]) for i, c in enumerate(tests.utils.CLASSES * 3))
+        assignment = irc_pugbot.matchmaking.assign_classes(players, irc_pugbot.formats.HIGHLANDER)
+        self.assertEquals(sorted(assignment), sorted('p{0}'.format(i) for i in range(18)))
+
+    def test_prefers_listed_class_order(self):
+        players = queue([('a', ['medic', 'soldier']), ('b', ['soldier', 'medic'])])
+        assignment = irc_pugbot.matchmaking.assign_classes(players, irc_pugbot.formats.ULTIDUO)
+        self.assertEquals(assignment, None)
+        players.update(queue([('c', ['soldier']), ('d', ['medic'])]))
+        assignment = irc_pugbot.matchmaking.assign_classes(players, irc_pugbot.formats.ULTIDUO)
+        self.assertEquals(assignment, {'a': 'medic', 'b': 'soldier', 'c': 'soldier', 'd': 'medic'})
+
+    def test_moves_players_to_fill_classes(self):
+        players = queue([('a', ['soldier', 'medic']), ('b', ['soldier']), ('c', ['soldier']), ('d', ['medic'])])
+        assignment = irc_pugbot.matchmaking.assign_classes(players, irc_pugbot.formats.ULTIDUO)
+        self.assertEquals(assignment, {'a': 'medic', 'b': 'soldier', 'c': 'soldier', 'd': 'medic'})
+
+    def test_infeasible(self):
+        players = queue(('p{0}'.format(i), ['scout']) for i in range(20))
+        self.assertEquals(irc_pugbot.matchmaking.assign_classes(players, irc_pugbot.formats.FOURS), None)
+
+    def test_matches_maximum_matching(self):
+        rng = random.Random(0)
+        for i in range(50):
+            players = queue(('p{0}'.format(j), rng.sample(tests.utils.CLASSES, rng.randint(1, 3)))
+                            for j in range(rng.randint(18, 40)))
+            capacities = irc_pugbot.formats.HIGHLANDER.slot_capacities
+            matched = irc_pugbot.matching.max_matching_size({n: p.classes for n, p in players.items()}, capacities)
+            assignment = irc_pugbot.matchmaking.assign_classes(players, irc_pugbot.formats.HIGHLANDER)
+            self.assertEquals(assignment is not None, matched == 18)
+
+
+class SplitTeamsTest(unittest.TestCase):
+    def test_class_limits(self):
+        assignment = {'a': 'scout', 'b': 'scout', 'c': 'scout', 'd': 'scout', 'e': 'soldier', 'f': 'soldier',
+                      'g': 'soldier', 'h': 'soldier', 'i': 'demoman', 'j': 'demoman', 'k': 'medic', 'l': 'medic'}
+        teams = irc_pugbot.matchmaking.split_teams(assignment, irc_pugbot.formats.SIXES)
+        for team in teams:
+            self.assertEquals(sorted(team), ['demoman', 'medic', 'scout', 'scout2', 'soldier', 'soldier2'])
+
+    def test_odd_classes_balance_team_sizes(self):
+        assignment = {'a': 'scout', 'b': 'soldier', 'c': 'pyro', 'd': 'demoman',
+                      'e': 'scout', 'f': 'medic', 'g': 'sniper', 'h': 'spy'}
+        teams = irc_pugbot.matchmaking.split_teams(assignment, irc_pugbot.formats.FOURS)
+        self.assertEquals([len(team) for team in teams], [4, 4])
+        self.assertEquals([team['scout'] for team in teams], ['a', 'e'])
+
+    def test_balances_ratings(self):
+        ratings = irc_pugbot.ratings.Ratings()
+        ratings.ratings.update({'a': 2000, 'b': 1900, 'c': 1100, 'd': 1000})
+        assignment = {'a': 'soldier', 'b': 'soldier', 'c': 'medic', 'd': 'medic'}
+        teams = irc_pugbot.matchmaking.split_teams(assignment, irc_pugbot.formats.ULTIDUO, ratings)
+        self.assertEquals(teams, [{'soldier': 'a', 'medic': 'd'}, {'soldier': 'b', 'medic': 'c'}])
+
+
+class MatchmakePugTest(unittest.TestCase):
+    def setUp(self):
+        self.pug = irc_pugbot.pug.Tf2HighlanderPug(True, matchmaking=True)
+
+    def test_no_captains_needed(self):
+        for player in itertools.chain.from_iterable(tests.utils.generate_highlander_game()):
+            self.pug.add(player.nick, player.classes)
+        self.assertEquals(self.pug.need, (0, 0, {}))
+        self.assertTrue(self.pug.can_stage)
+
+    def test_overflow_stays_queued(self):
+        players = list(itertools.chain.from_iterable(tests.utils.generate_highlander_game()))
+        for player in players:
+            self.pug.add(player.nick, player.classes)
+        self.pug.add('late', ['medic'])
+        teams = self.pug.matchmake()
+        self.assertEquals([len(team) for team in teams], [9, 9])
+        self.assertEquals(sorted(nick for team in teams for nick in team.values()), sorted(p.nick for p in players))
+        self.assertEquals(list(self.pug.unstaged_players), ['late'])
+        self.assertEquals(self.pug.location(players[0].nick), None)
+        self.assertEquals(self.pug.need, (0, 17, {c: 2 if c != 'medic' else 1 for c in tests.utils.CLASSES}))
+
+    def test_replay(self):
+        events = []
+        self.pug.listeners.append(lambda key, event, args: events.append((event, args)))
+        for player in itertools.chain.from_iterable(tests.utils.generate_highlander_game()):
+            self.pug.add(player.nick, player.classes)
+        teams = self.pug.matchmake()
+        replayed = irc_pugbot.pug.Tf2HighlanderPug(matchmaking=True)
+        for event, args in events:
+            getattr(replayed, event)(*args)
+        self.assertEquals(replayed.unstaged_players, {})
+        self.assertEquals(events[-1], ('matchmake', (teams,)))
+
+    def test_not_enough_players(self):
+        self.pug.add('a', ['scout'])
+        self.assertEquals(self.pug.matchmake(), None)
+        self.assertEquals(list(self.pug.unstaged_players), ['a'])
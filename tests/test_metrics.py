@@ -0,0 +1,56 @@
+import unittest
+import asyncio
+import irc_pugbot.metrics
+
+
+class Clock:
+    def __init__(self, step):
+        self.now = 0.0
+        self.step = step
+
+    def __call__(self):
+        self.now += self.step
+        return self.now
+
+
+class MetricsTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(None)
+        self.metrics = irc_pugbot.metrics.Metrics(clock=Clock(0.0002))
+
+    def tearDown(self):
+        self.loop.close()
+
+    def test_wrap_records_calls(self):
+        @asyncio.coroutine
+        def handler(bot, message):
+            return message
+
+        wrapped = self.metrics.wrap('add', handler)
+        self.assertEquals(self.loop.run_until_complete(wrapped(None, 'message')), 'message')
+        stats = self.metrics.handlers['add']
+        self.assertEquals(stats.calls, 1)
+        self.assertEquals(stats.errors, 0)
+        self.assertEquals(stats.percentile(0.99), 2.5e-4)
+
+    def test_wrap_counts_errors(self):
+        @asyncio.coroutine
+        def handler(bot, message):
+            raise KeyError(message)
+
+        wrapped = self.metrics.wrap('pick', handler)
+        self.assertRaises(KeyError, self.loop.run_until_complete, wrapped(None, 'message'))
+        self.assertEquals(self.metrics.handlers['pick'].errors, 1)
+        self.assertEquals(self.metrics.handlers['pick'].calls, 1)
+
+    def test_render(self):
+        self.metrics.handlers['need'] = irc_pugbot.metrics.HandlerStats()
+        self.metrics.handlers['need'].observe(0.003)
+        self.metrics.gauge('lobbies', lambda: 3)
+        text = self.metrics.render()
+        self.assertTrue('pugbot_handler_seconds_bucket{handler="need",le="0.005"} 1' in text)
+        self.assertTrue('pugbot_handler_seconds_bucket{handler="need",le="0.0025"} 0' in text)
+        self.assertTrue('pugbot_handler_seconds_count{handler="need"} 1' in text)
+        self.assertTrue('pugbot_lobbies 3' in text)
+        self.assertTrue('need: 1 calls' in self.metrics.summary())
@@ -0,0 +1,87 @@
+import unittest
+import asyncio
+import tests.utils
+import irc_pugbot.mumble
+
+
+class ProtobufTest(unittest.TestCase):
+    def test_round_trip(self):
+        data = irc_pugbot.mumble.encode_fields([(1, 300), (3, 'RED'), (5, 0), (7, None)])
+        self.assertEquals(irc_pugbot.mumble.decode_fields(data), {1: 300, 3: b'RED', 5: 0})
+
+    def test_varint(self):
+        self.assertEquals(irc_pugbot.mumble.encode_varint(300), b'\xac\x02')
+        self.assertEquals(irc_pugbot.mumble.decode_varint(b'\x00\xac\x02', 1), (300, 3))
+
+    def test_skips_fixed_width(self):
+        self.assertEquals(irc_pugbot.mumble.decode_fields(b'\x09' + b'\x00' * 8 + b'\x15\x00\x00\x00\x00\x18\x01'),
+                          {3: 1})
+
+
+class AliasTableTest(unittest.TestCase):
+    def test_aliases(self):
+        table = irc_pugbot.mumble.AliasTable({'Nick': 'VoiceName'})
+        table.user_changed(1, 'voicename')
+        table.user_changed(2, 'other')
+        self.assertEquals(table.session('nick'), 1)
+        self.assertEquals(table.session('OTHER'), 2)
+        self.assertEquals(table.session('missing'), None)
+        table.user_changed(2, None)
+        self.assertEquals(table.session('other'), None)
+        table.rename('nick', 'newnick')
+        self.assertEquals(table.session('newnick'), 1)
+
+
+class MumbleClientTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(None)
+        self.server = tests.utils.FakeMumbleServer(self.loop, users=['a', 'B', 'voice_c'])
+        self.loop.run_until_complete(self.server.start())
+        self.client = irc_pugbot.mumble.MumbleClient(
+            self.loop, '127.0.0.1', self.server.port, aliases={'c': 'voice_c'}, backoff_initial=0.01)
+
+    def tearDown(self):
+        self.client.stop()
+        self.server.close()
+        self.loop.run_until_complete(asyncio.sleep(0.01, loop=self.loop))
+        self.loop.close()
+
+    def synced(self):
+        self.loop.run_until_complete(asyncio.wait_for(self.client.synced, 1, loop=self.loop))
+
+    def settle(self):
+        self.loop.run_until_complete(asyncio.sleep(0.05, loop=self.loop))
+
+    def test_move(self):
+        self.client.start()
+        self.synced()
+        self.assertEquals(self.server.logins, ['pugbot'])
+        self.assertEquals(self.client.session, 4)
+        missing = self.loop.run_until_complete(self.client.move([('a', 'red'), ('b', 'BLU'), ('c', 'BLU'), ('d', 'RED')]))
+        self.assertEquals(missing, ['d'])
+        self.settle()
+        self.assertEquals(self.server.moves, [('a', 'RED'), ('B', 'BLU'), ('voice_c', 'BLU')])
+
+    def test_move_while_disconnected(self):
+        missing = self.loop.run_until_complete(self.client.move([('a', 'RED')]))
+        self.assertEquals(missing, ['a'])
+
+    def test_reconnects(self):
+        self.client.start()
+        self.synced()
+        self.server.drop()
+        self.settle()
+        self.synced()
+        self.assertEquals(self.client.connects, 2)
+        self.loop.run_until_complete(self.client.move([('a', 'BLU')]))
+        self.settle()
+        self.assertEquals(self.server.moves, [('a', 'BLU')])
+
+    def test_backoff_on_reject(self):
+        self.server.reject = True
+        self.client.start()
+        self.loop.run_until_complete(asyncio.sleep(0.1, loop=self.loop))
+        self.assertFalse(self.client.connected)
+        attempts = len(self.server.logins)
+        self.assertTrue(2 <= attempts <= 5)
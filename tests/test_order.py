@@ -0,0 +1,54 @@
+import unittest
+import irc_pugbot.order
+
+
+class CompileOrderTest(unittest.TestCase):
+    def test_patterns(self):
+        self.assertEquals(irc_pugbot.order.compile_order('abba', 6), (0, 1, 1, 0, 0, 1))
+        self.assertEquals(irc_pugbot.order.compile_order('ABAB', 5), (0, 1, 0, 1, 0))
+        self.assertEquals(irc_pugbot.order.compile_order('snake', 4), (0, 1, 1, 0))
+
+    def test_custom(self):
+        self.assertEquals(irc_pugbot.order.compile_order('abbbaa', 8), (0, 1, 1, 1, 0, 0, 0, 1))
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            irc_pugbot.order.compile_order('abc', 4)
+        with self.assertRaises(ValueError):
+            irc_pugbot.order.compile_order('', 4)
+
+
+class PickOrderTest(unittest.TestCase):
+    def setUp(self):
+        self.order = irc_pugbot.order.PickOrder(irc_pugbot.order.compile_order('abba', 6))
+
+    def test_advance_and_undo(self):
+        self.assertEquals(self.order.current, 0)
+        self.assertEquals(self.order.advance(), 1)
+        self.assertEquals(self.order.advance(), 1)
+        self.assertEquals(self.order.undo(), 1)
+        self.assertEquals(self.order.undo(), 0)
+        self.assertRaises(IndexError, self.order.undo)
+
+    def test_team_at_step(self):
+        self.assertEquals(self.order.team(3), 0)
+        self.assertEquals(self.order.team(6), None)
+
+    def test_exhausted(self):
+        for i in range(6):
+            self.order.advance()
+        self.assertEquals(self.order.current, None)
+        self.assertEquals(self.order.upcoming(), ())
+
+    def test_upcoming(self):
+        self.order.advance()
+        self.assertEquals(self.order.upcoming(3), (1, 1, 0))
+        self.assertEquals(self.order.upcoming(), (1, 1, 0, 0, 1))
+
+    def test_snapshot(self):
+        self.order.advance()
+        state = self.order.snapshot()
+        self.assertEquals(state, {'table': 'ABBAAB', 'step': 1})
+        restored = irc_pugbot.order.PickOrder.restore(state)
+        self.assertEquals(restored.table, self.order.table)
+        self.assertEquals(restored.current, 1)
@@ -0,0 +1,79 @@
+import unittest
+import unittest.mock
+import irc_pugbot.metrics
+import irc_pugbot.outbound
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class OutboundQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.sent = []
+        self.clock = Clock()
+        self.loop = unittest.mock.Mock()
+        self.queue = irc_pugbot.outbound.OutboundQueue(
+            lambda target, text: self.sent.append((target, text)), self.loop, rate=1.0, burst=2, clock=self.clock)
+
+    def test_burst_then_throttle(self):
+        for i in range(4):
+            self.queue.privmsg('#channel', 'line {0}'.format(i))
+        self.assertEquals(self.sent, [('#channel', 'line 0'), ('#channel', 'line 1')])
+        self.assertEquals(self.queue.depth, 2)
+        self.assertEquals(self.loop.call_later.call_count, 1)
+        self.clock.now = 1.0
+        self.queue.drain()
+        self.assertEquals(self.sent[-1], ('#channel', 'line 2'))
+        self.assertEquals(self.queue.metrics()['latency_max'], 1.0)
+
+    def test_add_metrics(self):
+        metrics = irc_pugbot.metrics.Metrics()
+        self.queue.add_metrics(metrics)
+        for i in range(3):
+            self.queue.privmsg('#channel', 'line {0}'.format(i))
+        self.clock.now = 2.0
+        self.queue.drain()
+        rendered = metrics.render()
+        for line in ['pugbot_outbound_queue_depth 0', 'pugbot_outbound_max_depth 1', 'pugbot_outbound_sent 3',
+                     'pugbot_outbound_coalesced 0', 'pugbot_outbound_latency_max_seconds 2.0']:
+            self.assertTrue(line in rendered, line)
+        self.assertTrue('pugbot_outbound_latency_avg_seconds 0.666' in rendered)
+
+    def test_keyed_messages_coalesce(self):
+        self.queue.privmsg('#channel', 'a')
+        self.queue.privmsg('#channel', 'b')
+        self.queue.privmsg('#channel', 'Players added: x', key='unstaged')
+        self.queue.privmsg('#channel', 'Players added: x, y', key='unstaged')
+        self.queue.privmsg('#other', 'Players added: z', key='unstaged')
+        self.assertEquals(self.queue.depth, 2)
+        self.clock.now = 2.0
+        self.queue.drain()
+        self.assertEquals(self.sent[2:], [('#channel', 'Players added: x, y'), ('#other', 'Players added: z')])
+        self.assertEquals(self.queue.keyed, {})
+
+    def test_identical_text_uses_multi_target(self):
+        self.queue.max_targets = 3
+        self.queue.tokens = 0
+        for nick in ['a', 'b', 'c', 'd']:
+            self.queue.privmsg(nick, 'You have been picked')
+        self.clock.now = 2.0
+        self.queue.drain()
+        self.assertEquals(self.sent, [('a,b,c', 'You have been picked'), ('d', 'You have been picked')])
+
+    def test_split_message(self):
+        text = ' '.join('player{0}'.format(i) for i in range(100))
+        parts = irc_pugbot.outbound.split_message('#channel', text)
+        self.assertTrue(len(parts) > 1)
+        self.assertEquals(' '.join(parts), text)
+        for part in parts:
+            self.assertTrue(len('PRIVMSG #channel :{0}\r\n'.format(part).encode()) + 100 <= 512)
+
+    def test_split_keeps_utf8_intact(self):
+        text = 'é' * 600
+        parts = irc_pugbot.outbound.split_message('#channel', text)
+        self.assertEquals(''.join(parts), text)
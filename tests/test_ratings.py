@@ -0,0 +1,124 @@
+import unittest
+import random
+import tests.utils
+import irc_pugbot.pug
+import irc_pugbot.ratings
+
+
+class RatingsTest(unittest.TestCase):
+    def setUp(self):
+        self.ratings = irc_pugbot.ratings.Ratings()
+
+    def test_default(self):
+        self.assertEquals(self.ratings.get('nick'), irc_pugbot.ratings.DEFAULT_RATING)
+        self.assertFalse('nick' in self.ratings)
+
+    def test_record_moves_teams_apart(self):
+        self.ratings.record([{'scout': 'a', 'medic': 'b'}, {'scout': 'c', 'medic': 'd'}], 0)
+        self.assertEquals(self.ratings.get('a'), 1516)
+        self.assertEquals(self.ratings.get('b'), 1516)
+        self.assertEquals(self.ratings.get('c'), 1484)
+        self.assertEquals(self.ratings.games['a'], 1)
+
+    def test_record_counts_captain_once(self):
+        self.ratings.record([{'scout': 'a', 'medic': 'a'}, {'scout': 'c', 'medic': 'd'}], 1)
+        self.assertEquals(self.ratings.get('a'), 1484)
+        self.assertEquals(self.ratings.games['a'], 1)
+
+    def test_draw_between_equals(self):
+        self.ratings.record([{'scout': 'a'}, {'scout': 'b'}], None)
+        self.assertEquals(self.ratings.get('a'), 1500)
+
+    def test_batch_is_order_independent(self):
+        games = [([{'scout': 'a'}, {'scout': 'b'}], 0), ([{'scout': 'a'}, {'scout': 'c'}], 1)]
+        other = irc_pugbot.ratings.Ratings()
+        self.ratings.record_many(games)
+        other.record_many(reversed(games))
+        self.assertEquals(self.ratings.ratings, other.ratings)
+        self.assertEquals(self.ratings.get('a'), 1500)
+
+    def test_rename(self):
+        self.ratings.record([{'scout': 'a'}, {'scout': 'b'}], 0)
+        self.ratings.rename('a', 'z')
+        self.assertEquals(self.ratings.get('z'), 1516)
+        self.assertFalse('a' in self.ratings)
+
+
+class BalancedCaptainsTest(unittest.TestCase):
+    def test_closest_pair_lower_first(self):
+        ratings = irc_pugbot.ratings.Ratings()
+        ratings.ratings.update({'a': 1000, 'b': 1600, 'c': 1650, 'd': 2000})
+        players = {nick: irc_pugbot.pug.Player(['scout'], True) for nick in 'abcd'}
+        players['e'] = irc_pugbot.pug.Player(['scout'], False)
+        self.assertEquals(irc_pugbot.ratings.balanced_captains(players, ratings), ['b', 'c'])
+
+    def test_unrated_is_random_volunteer_pair(self):
+        players = {nick: irc_pugbot.pug.Player(['scout'], nick != 'e') for nick in 'abcde'}
+        captains = irc_pugbot.ratings.balanced_captains(players, irc_pugbot.ratings.Ratings(), random.Random(1))
+        self.assertEquals(len(set(captains)), 2)
+        self.assertFalse('e' in captains)
+
+
+class BalancedTeamsTest(unittest.TestCase):
+    def setUp(self):
+        self.ratings = irc_pugbot.ratings.Ratings()
+        self.rng = random.Random(0)
+        self.capacities = {c: 1 for c in irc_pugbot.pug.CLASSES}
+
+    def assertValid(self, teams, players, team_size):
+        self.assertEquals([len(team) for team in teams], [team_size, team_size])
+        nicks = [nick for team in teams for nick in team]
+        self.assertEquals(len(nicks), len(set(nicks)))
+        for team in teams:
+            for nick, class_ in team.items():
+                self.assertTrue(players[nick].plays(class_))
+
+    def gap(self, captains, teams):
+        sums = [self.ratings.get(c) + sum(self.ratings.get(n) for n in team) for c, team in zip(captains, teams)]
+        return abs(sums[0] - sums[1])
+
+    def test_highlander(self):
+        players = {}
+        for team in tests.utils.generate_highlander_game():
+            for player in team[:8]:
+                players[player.nick] = irc_pugbot.pug.Player(player.classes)
+                self.ratings.ratings[player.nick] = self.rng.gauss(1500, 200)
+        teams = irc_pugbot.ratings.balanced_teams(['cap0', 'cap1'], players, 8, self.capacities, self.ratings)
+        self.assertValid(teams, players, 8)
+        sums = sorted(self.ratings.get(nick) for nick in players)
+        self.assertTrue(self.gap(['cap0', 'cap1'], teams) <= sums[-1] - sums[0])
+
+    def test_finds_exact_split(self):
+        players = {nick: irc_pugbot.pug.Player(['scout', 'soldier']) for nick in 'abcd'}
+        self.ratings.ratings.update({'a': 1900, 'b': 1800, 'c': 1200, 'd': 1100})
+        teams = irc_pugbot.ratings.balanced_teams(['e', 'f'], players, 2, self.capacities, self.ratings)
+        self.assertValid(teams, players, 2)
+        self.assertEquals(self.gap(['e', 'f'], teams), 0)
+
+    def test_benches_extra_players(self):
+        players = {nick: irc_pugbot.pug.Player(['scout', 'soldier', 'medic']) for nick in 'abcdefg'}
+        self.ratings.ratings.update({'a': 3000, 'b': 1500, 'c': 1500, 'd': 1500, 'e': 1500, 'f': 1500, 'g': 1500})
+        teams = irc_pugbot.ratings.balanced_teams(['x', 'y'], players, 3, self.capacities, self.ratings)
+        self.assertValid(teams, players, 3)
+        self.assertFalse('a' in [nick for team in teams for nick in team])
+
+    def test_class_conflict(self):
+        players = {nick: irc_pugbot.pug.Player(['medic']) for nick in 'abc'}
+        teams = irc_pugbot.ratings.balanced_teams(['x', 'y'], players, 2, self.capacities, self.ratings)
+        self.assertEquals(teams, None)
+
+    def test_class_capacity(self):
+        players = {nick: irc_pugbot.pug.Player(['scout']) for nick in 'abcd'}
+        teams = irc_pugbot.ratings.balanced_teams(['x', 'y'], players, 2, {'scout': 2}, self.ratings)
+        self.assertValid(teams, players, 2)
+
+    def test_auto_pick(self):
+        pug = irc_pugbot.pug.Tf2HighlanderPug()
+        for team in tests.utils.generate_highlander_game():
+            for player in team:
+                pug.add(player.nick, player.classes, player.classes == ['spy'])
+                self.ratings.ratings[player.nick] = self.rng.gauss(1500, 200)
+        pug.stage(irc_pugbot.ratings.balanced_captains(pug.unstaged_players, self.ratings))
+        self.assertTrue(irc_pugbot.ratings.auto_pick(pug, self.ratings))
+        self.assertTrue(pug.can_start)
+        self.assertEquals([len(team) for team in pug.make_game()], [9, 9])
@@ -0,0 +1,119 @@
+import unittest
+import asyncio
+import tests.utils
+import irc_pugbot.servers
+
+
+class ServersTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(None)
+        self.fakes = []
+
+    def tearDown(self):
+        for fake in self.fakes:
+            fake.close()
+        self.loop.run_until_complete(asyncio.sleep(0, loop=self.loop))
+        self.loop.close()
+
+    def fake(self, **kwargs):
+        fake = tests.utils.FakeTf2Server(self.loop, **kwargs)
+        self.loop.run_until_complete(fake.start())
+        self.fakes.append(fake)
+        return fake
+
+    def pool(self, fakes, **kwargs):
+        return irc_pugbot.servers.ServerPool(self.loop, [
+            irc_pugbot.servers.GameServer('127.0.0.1', fake.port, 'secret') for fake in fakes], **kwargs)
+
+    def test_query_info(self):
+        fake = self.fake(players=3, bots=1)
+        info = self.loop.run_until_complete(irc_pugbot.servers.query_info('127.0.0.1', fake.port, loop=self.loop))
+        self.assertEquals(info, irc_pugbot.servers.ServerInfo('Fake TF2', 'cp_badlands', 3, 24, 1))
+
+    def test_query_info_challenge(self):
+        fake = self.fake(challenge=True)
+        info = self.loop.run_until_complete(irc_pugbot.servers.query_info('127.0.0.1', fake.port, loop=self.loop))
+        self.assertEquals(info.map, 'cp_badlands')
+        self.assertEquals(fake.queries, 2)
+
+    def test_parse_info_rejects_garbage(self):
+        with self.assertRaises(ValueError):
+            irc_pugbot.servers.parse_info(b'\xff\xff\xff\xffX')
+
+    def test_probe_all_concurrent_with_timeout(self):
+        fakes = [self.fake(), self.fake(players=5), self.fake()]
+        fakes[2].silent = True
+        pool = self.pool(fakes, timeout=0.2)
+        start = self.loop.time()
+        self.loop.run_until_complete(pool.probe_all())
+        self.assertTrue(self.loop.time() - start < 0.4)
+        self.assertEquals([s.humans for s in pool], [0, 5, None])
+        self.assertEquals(pool.free_servers(), pool.servers[:1])
+
+    def test_reserve_and_release(self):
+        pool = self.pool([self.fake(), self.fake()])
+        self.loop.run_until_complete(pool.probe_all())
+        first = pool.reserve('#a')
+        second = pool.reserve('#b')
+        self.assertEquals([first.game, second.game], ['#a', '#b'])
+        self.assertEquals(pool.reserve('#c'), None)
+        pool.release(first)
+        self.assertTrue(pool.reserve('#c') is first)
+
+    def test_unprobed_servers_are_not_free(self):
+        pool = self.pool([self.fake()])
+        self.assertEquals(pool.reserve('#a'), None)
+
+    def test_empty_reserved_server_released(self):
+        pool = self.pool([self.fake()], release_after=0)
+        self.loop.run_until_complete(pool.probe_all())
+        server = pool.reserve('#a')
+        self.loop.run_until_complete(pool.probe_all())
+        self.assertEquals(server.game, None)
+
+    def test_stale_release_ignored(self):
+        pool = self.pool([self.fake()], release_after=0)
+        self.loop.run_until_complete(pool.probe_all())
+        server = pool.reserve(1)
+        self.loop.run_until_complete(pool.probe_all())
+        self.assertTrue(pool.reserve(2) is server)
+        self.assertFalse(pool.release(server, 1))
+        self.assertEquals(server.game, 2)
+        self.assertTrue(pool.release(server, 2))
+        self.assertEquals(server.game, None)
+
+    def test_setup(self):
+        fake = self.fake()
+        pool = self.pool([fake])
+        self.loop.run_until_complete(pool.setup(pool.servers[0], 'pw', 'etf2l_6v6', 'pug_1'))
+        self.assertEquals(fake.commands, ['sv_password "pw"', 'exec etf2l_6v6', 'tv_stoprecord', 'tv_record pug_1'])
+
+    def test_rcon_bad_password(self):
+        fake = self.fake(rcon_password='other')
+        with self.assertRaises(irc_pugbot.servers.RconError):
+            self.loop.run_until_complete(irc_pugbot.servers.rcon(
+                '127.0.0.1', fake.port, 'secret', ['status'], loop=self.loop))
+        self.assertEquals(fake.commands, [])
+
+    def test_setup_without_rcon_password(self):
+        fake = self.fake()
+        server = irc_pugbot.servers.GameServer('127.0.0.1', fake.port)
+        pool = irc_pugbot.servers.ServerPool(self.loop, [server])
+        with self.assertRaises(irc_pugbot.servers.RconError):
+            self.loop.run_until_complete(pool.setup(server, 'pw'))
+
+    def test_from_config_requires_rcon_password(self):
+        with self.assertRaises(KeyError):
+            irc_pugbot.servers.ServerPool.from_config(self.loop, [{'host': '127.0.0.1'}])
+
+    def test_rcon_connection_closed(self):
+        fake = self.fake()
+        fake.hang_up = True
+        with self.assertRaises(EOFError):
+            self.loop.run_until_complete(irc_pugbot.servers.rcon(
+                '127.0.0.1', fake.port, 'secret', ['status'], loop=self.loop))
+
+    def test_connect_string(self):
+        server = irc_pugbot.servers.GameServer('tf2.example.com', 27016)
+        self.assertEquals(server.connect_string('abc'), 'connect tf2.example.com:27016; password "abc"')
@@ -0,0 +1,107 @@
+import unittest
+import tests.utils
+import irc_pugbot.pug
+import irc_pugbot.staging
+
+
+class StagingSchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = tests.utils.VirtualLoop()
+        self.pug = irc_pugbot.pug.Tf2HighlanderPug()
+        self.said = []
+        self.staged = []
+
+    def scheduler(self, **config):
+        return irc_pugbot.staging.StagingScheduler(
+            self.loop, lambda channel, pug: self.staged.append(pug), lambda channel, text: self.said.append(text),
+            self.drop, **config)
+
+    def drop(self, channel, pug, nick):
+        pug.remove(nick)
+
+    def fill(self, scheduler):
+        for team in tests.utils.generate_highlander_game():
+            for player in team:
+                self.pug.add(player.nick, player.classes, True)
+                scheduler.update('#channel', self.pug)
+
+    def test_no_delay_stages_at_once(self):
+        self.fill(self.scheduler())
+        self.assertEquals(self.staged, [self.pug])
+        self.assertEquals(self.loop.pending, 0)
+
+    def test_countdown_with_reminders(self):
+        scheduler = self.scheduler(delay=30, remind_every=10)
+        self.fill(scheduler)
+        self.assertEquals(self.said, ['Staging pug in 30 seconds'])
+        self.assertEquals(self.loop.pending, 1)
+        self.loop.advance(10)
+        self.assertEquals(self.said[-1], 'Staging pug in 20 seconds')
+        self.assertEquals(self.loop.pending, 1)
+        self.loop.advance(19)
+        self.assertEquals(self.staged, [])
+        self.loop.advance(1)
+        self.assertEquals(self.staged, [self.pug])
+        self.assertFalse(self.pug in scheduler)
+        self.assertEquals(self.loop.pending, 0)
+
+    def test_remove_cancels_and_add_rearms(self):
+        scheduler = self.scheduler(delay=30, remind_every=10)
+        self.fill(scheduler)
+        self.loop.advance(15)
+        self.pug.remove('RED_player_0')
+        scheduler.update('#channel', self.pug)
+        self.assertEquals(self.said[-1], 'Staging cancelled, waiting for more players')
+        self.assertEquals(self.loop.pending, 0)
+        self.loop.advance(60)
+        self.assertEquals(self.staged, [])
+        self.pug.add('RED_player_0', ['scout'], True)
+        scheduler.update('#channel', self.pug)
+        self.assertEquals(self.said[-1], 'Staging pug in 30 seconds')
+        self.loop.advance(30)
+        self.assertEquals(self.staged, [self.pug])
+
+    def test_stages_again_after_firing(self):
+        scheduler = self.scheduler(delay=5)
+        self.fill(scheduler)
+        self.loop.advance(5)
+        self.pug = irc_pugbot.pug.Tf2HighlanderPug()
+        self.fill(scheduler)
+        self.loop.advance(5)
+        self.assertEquals(len(self.staged), 2)
+
+    def test_ready_check_all_ready(self):
+        scheduler = self.scheduler(delay=10, ready_timeout=20)
+        self.fill(scheduler)
+        self.loop.advance(10)
+        self.assertEquals(scheduler.phase(self.pug), irc_pugbot.staging.READY_CHECK)
+        self.assertTrue(self.said[-1].startswith('Ready check: '))
+        for nick in list(self.pug.unstaged_players):
+            self.assertTrue(scheduler.ready(self.pug, nick))
+        self.assertEquals(self.staged, [self.pug])
+        self.assertEquals(self.loop.pending, 0)
+        self.assertFalse(scheduler.ready(self.pug, 'RED_player_0'))
+
+    def test_ready_check_drops_unready(self):
+        scheduler = self.scheduler(ready_timeout=20)
+        self.fill(scheduler)
+        self.pug.add('extra', ['scout'], True)
+        scheduler.update('#channel', self.pug)
+        for nick in list(self.pug.unstaged_players):
+            if nick != 'RED_player_8':
+                scheduler.ready(self.pug, nick)
+        self.loop.advance(20)
+        self.assertFalse('RED_player_8' in self.pug.unstaged_players)
+        self.assertEquals(self.staged, [])
+        self.assertEquals(self.said[-1], 'Staging cancelled, waiting for more players')
+
+    def test_ready_check_removal_of_last_waiting_stages(self):
+        scheduler = self.scheduler(ready_timeout=20)
+        self.fill(scheduler)
+        self.pug.add('extra', ['scout'], True)
+        for nick in list(self.pug.unstaged_players):
+            if nick != 'extra':
+                scheduler.ready(self.pug, nick)
+        self.pug.remove('extra')
+        scheduler.update('#channel', self.pug)
+        self.assertEquals(self.staged, [self.pug])
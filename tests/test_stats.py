@@ -0,0 +1,88 @@
+import unittest
+import asyncio
+import os
+import shutil
+import tempfile
+import irc_pugbot.stats
+
+
+def make_game(prefix):
+    captains = [prefix + 'red_captain', prefix + 'blu_captain']
+    teams = [{'medic': prefix + 'red_medic', 'scout': captains[0]}, {'medic': captains[1], 'scout': prefix + 'blu_scout'}]
+    picks = [(0, 'medic', prefix + 'red_medic'), (1, 'scout', prefix + 'blu_scout')]
+    return captains, teams, picks
+
+
+class StatsStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(None)
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'stats.db')
+        self.store = irc_pugbot.stats.StatsStore(self.path, loop=self.loop)
+
+    def tearDown(self):
+        self.loop.run_until_complete(self.store.close())
+        self.loop.close()
+        shutil.rmtree(self.directory)
+
+    def test_game_rows(self):
+        captains, teams, picks = make_game('')
+        rows = irc_pugbot.stats.game_rows(7, captains, teams, picks)
+        self.assertEquals(rows, [
+            (7, 'red_medic', 0, 'medic', 0, 1),
+            (7, 'red_captain', 0, 'scout', 1, None),
+            (7, 'blu_captain', 1, 'medic', 1, None),
+            (7, 'blu_scout', 1, 'scout', 0, 2),
+        ])
+
+    def test_player_stats(self):
+        game_id = self.store.record_game('#channel', *make_game(''))
+        self.store.record_result(game_id, 0)
+        self.store.record_game('#channel', *make_game(''))
+        stats = self.loop.run_until_complete(self.store.player_stats('red_captain'))
+        self.assertEquals(stats, {'games': 2, 'wins': 1, 'captained': 2, 'classes': [('scout', 2)], 'combat': None})
+        self.assertEquals(self.loop.run_until_complete(self.store.player_stats('nobody')), None)
+
+    def test_combat_totals(self):
+        game_id = self.store.record_game('#channel', *make_game(''))
+        self.store.record_combat(game_id, {'red_medic': [100, 0, 2, 1, 3000]})
+        self.store.record_demo(game_id, {'map': 'cp_badlands', 'duration': 1800.0, 'ticks': 120000})
+        game_id = self.store.record_game('#channel', *make_game(''))
+        self.store.record_combat(game_id, {'red_medic': [300, 2, 4, 1, 5000]})
+        stats = self.loop.run_until_complete(self.store.player_stats('red_medic'))
+        self.assertEquals(stats['combat'], {'games': 2, 'damage': 400, 'kills': 2, 'deaths': 6, 'assists': 2,
+                                            'heals': 8000})
+        self.assertEquals(self.store.connection.execute('SELECT map FROM demos').fetchall(), [('cp_badlands',)])
+
+    def test_draw_records_no_wins(self):
+        game_id = self.store.record_game('#channel', *make_game(''))
+        self.store.record_result(game_id, None)
+        stats = self.loop.run_until_complete(self.store.player_stats('red_medic'))
+        self.assertEquals(stats['wins'], 0)
+
+    def test_leaderboard_invalidated_by_new_game(self):
+        self.store.record_game('#channel', *make_game('a_'))
+        self.store.record_game('#channel', *make_game('b_'))
+        self.assertEquals(self.loop.run_until_complete(self.store.leaderboard('captained'))[:2],
+                          [('a_blu_captain', 1), ('a_red_captain', 1)])
+        self.store.record_game('#channel', *make_game('b_'))
+        self.assertEquals(self.loop.run_until_complete(self.store.leaderboard('captained'))[:2],
+                          [('b_blu_captain', 2), ('b_red_captain', 2)])
+
+    def test_leaderboard_kind(self):
+        with self.assertRaises(ValueError):
+            self.loop.run_until_complete(self.store.leaderboard('nick; DROP TABLE games'))
+
+    def test_class_pick_rates(self):
+        self.store.record_game('#channel', *make_game(''))
+        rates = self.loop.run_until_complete(self.store.class_pick_rates())
+        self.assertEquals(rates, {'medic': (1, 1.0), 'scout': (1, 2.0)})
+
+    def test_reopen_continues_ids(self):
+        self.store.record_game('#channel', *make_game(''))
+        self.loop.run_until_complete(self.store.close())
+        self.store = irc_pugbot.stats.StatsStore(self.path, loop=self.loop)
+        self.assertEquals(self.store.next_game_id, 2)
+        stats = self.loop.run_until_complete(self.store.player_stats('red_medic'))
+        self.assertEquals(stats['games'], 1)
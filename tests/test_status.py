@@ -0,0 +1,47 @@
+import unittest
+import unittest.mock
+import irc_pugbot.pug
+import irc_pugbot.status
+
+
+class StatusBoardTest(unittest.TestCase):
+    def setUp(self):
+        self.sent = []
+        self.loop = unittest.mock.Mock()
+        self.board = irc_pugbot.status.StatusBoard(self.loop, 5, lambda target, text: self.sent.append((target, text)))
+        self.pug = irc_pugbot.pug.Tf2HighlanderPug()
+
+    def add(self, nick):
+        self.pug.add(nick, ['scout'])
+        self.board.joined('#channel', nick, self.pug)
+
+    def remove(self, nick):
+        self.pug.remove(nick)
+        self.board.left('#channel', nick, self.pug)
+
+    def test_one_timer_per_window(self):
+        self.add('a')
+        self.add('b')
+        self.assertEquals(self.loop.call_later.call_count, 1)
+        self.assertEquals(self.sent, [])
+
+    def test_flush_summarises_diff(self):
+        self.pug.add('old', ['medic'])
+        self.add('a')
+        self.add('b')
+        self.remove('old')
+        self.board.flush('#channel')
+        self.assertEquals(self.sent, [('#channel', 'Joined: a, b. Left: old. 2 added, 16 more needed')])
+        self.assertEquals(self.board.pending, {})
+
+    def test_join_and_leave_cancel_out(self):
+        self.add('a')
+        self.remove('a')
+        self.board.flush('#channel')
+        self.assertEquals(self.sent, [])
+
+    def test_discard(self):
+        self.add('a')
+        self.board.discard('#channel')
+        self.board.flush('#channel')
+        self.assertEquals(self.sent, [])
@@ -0,0 +1,132 @@
+import unittest
+import unittest.mock
+import asyncio
+import base64
+import json
+import irc_pugbot.events
+import irc_pugbot.formats
+import irc_pugbot.manager
+import irc_pugbot.pug
+import irc_pugbot.web
+
+
+class MergePatchTest(unittest.TestCase):
+    def test_diff_round_trip(self):
+        old = {'a': {'x': 1, 'y': [1, 2]}, 'b': 2, 'c': {'z': 3}}
+        new = {'a': {'x': 1, 'y': [1]}, 'c': {'z': 3, 'w': {'q': 1}}, 'd': 4}
+        patch = irc_pugbot.web.merge_diff(old, new)
+        self.assertEquals(patch, {'a': {'y': [1]}, 'b': None, 'c': {'w': {'q': 1}}, 'd': 4})
+        self.assertEquals(irc_pugbot.web.merge_patch(old, patch), new)
+        self.assertEquals(irc_pugbot.web.merge_diff(new, new), {})
+
+    def test_websocket_accept(self):
+        self.assertEquals(irc_pugbot.web.websocket_accept(b'dGhlIHNhbXBsZSBub25jZQ=='),
+                          b's3pPLMBiTxaQ9kYGzzhZRbK+xOo=')
+
+
+class LobbyViewTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(None)
+        self.bus = irc_pugbot.events.EventBus(self.loop)
+        self.manager = irc_pugbot.manager.PugManager(
+            lambda **kwargs: irc_pugbot.pug.Tf2Pug(format_=irc_pugbot.formats.ULTIDUO, **kwargs), bus=self.bus)
+        self.manager.add_channel('#a')
+        self.view = irc_pugbot.web.LobbyView(self.manager, self.loop)
+        self.bus.subscribe('web', self.view.update)
+        self.server = self.loop.run_until_complete(self.view.serve(0, loop=self.loop))
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    def tearDown(self):
+        self.bus.close()
+        self.server.close()
+        self.loop.run_until_complete(asyncio.sleep(0.01, loop=self.loop))
+        self.loop.close()
+
+    def settle(self):
+        self.loop.run_until_complete(asyncio.sleep(0.02, loop=self.loop))
+
+    def get(self, path):
+        @asyncio.coroutine
+        def get():
+            reader, writer = yield from asyncio.open_connection('127.0.0.1', self.port, loop=self.loop)
+            writer.write('GET {0} HTTP/1.0\r\n\r\n'.format(path).encode())
+            response = yield from reader.read()
+            writer.close()
+            return response
+        head, _, body = self.loop.run_until_complete(get()).partition(b'\r\n\r\n')
+        return head.split(b'\r\n')[0], body
+
+    def connect(self):
+        @asyncio.coroutine
+        def connect():
+            reader, writer = yield from asyncio.open_connection('127.0.0.1', self.port, loop=self.loop)
+            key = base64.b64encode(b'0123456789abcdef')
+            writer.write(b'GET /live HTTP/1.1\r\nHost: x\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                         b'Sec-WebSocket-Key: ' + key + b'\r\nSec-WebSocket-Version: 13\r\n\r\n')
+            status = yield from reader.readline()
+            while (yield from reader.readline()) != b'\r\n':
+                pass
+            return status, reader, writer
+        return self.loop.run_until_complete(connect())
+
+    def messages(self, reader, version):
+        @asyncio.coroutine
+        def read():
+            messages = []
+            while not messages or messages[-1]['version'] < version:
+                opcode, payload = yield from irc_pugbot.web.read_websocket_frame(reader)
+                messages.append(json.loads(payload.decode()))
+            return messages
+        return self.loop.run_until_complete(asyncio.wait_for(read(), 1, loop=self.loop))
+
+    def test_snapshot(self):
+        self.manager.open_pug('#a').add('a', ['medic'], True)
+        self.settle()
+        status, body = self.get('/lobbies.json')
+        self.assertEquals(status, b'HTTP/1.0 200 OK')
+        state = json.loads(body.decode())
+        self.assertEquals(state['version'], 1)
+        self.assertEquals(state['lobbies']['#a/1']['unstaged'], {'a': {'classes': ['medic'], 'captain': True}})
+        self.assertEquals(state['lobbies']['#a/1']['need'], {'captains': 1, 'players': 3, 'classes': {'soldier': 2, 'medic': 1}})
+        self.assertTrue(self.view.snapshot() is self.view.snapshot())
+        self.assertEquals(self.get('/nope')[0], b'HTTP/1.0 404 Not Found')
+
+    def test_live_diffs(self):
+        status, reader, writer = self.connect()
+        self.assertEquals(status, b'HTTP/1.1 101 Switching Protocols\r\n')
+        pug = self.manager.open_pug('#a')
+        pug.add('a', ['soldier'], True)
+        self.settle()
+        for nick, class_ in [('b', 'medic'), ('c', 'soldier'), ('d', 'medic')]:
+            pug.add(nick, [class_], nick == 'b')
+        pug.stage(['a', 'b'])
+        self.manager.staged('#a', pug)
+        pug.pick('d', 'medic')
+        self.settle()
+        messages = self.messages(reader, self.view.version)
+        self.assertEquals(messages[1], {'version': 1, 'lobbies': {'#a/1': {
+            'unstaged': {'a': {'classes': ['soldier'], 'captain': True}},
+            'need': {'captains': 1, 'players': 3, 'classes': {'soldier': 1}}}}})
+        state = {}
+        for message in messages:
+            state = irc_pugbot.web.merge_patch(state, message)
+        self.assertEquals(state, json.loads(self.get('/lobbies.json')[1].decode()))
+        self.assertEquals(state['lobbies']['#a/1']['teams'], {'red': {'medic': 'd'}, 'blue': {}})
+        self.assertEquals(state['lobbies']['#a/1']['picking'], 'b')
+        self.assertTrue('#a/2' in state['lobbies'])
+        writer.write(b'\x88\x82abcd' + bytes(x ^ y for x, y in zip(b'\x03\xe8', b'ab')))
+        self.assertEquals(self.loop.run_until_complete(irc_pugbot.web.read_websocket_frame(reader))[0], 0x8)
+        self.settle()
+        self.assertEquals(self.view.clients, set())
+
+    def test_slow_viewer_dropped(self):
+        slow = unittest.mock.Mock()
+        slow.transport.get_write_buffer_size.return_value = irc_pugbot.web.MAX_BUFFER + 1
+        fast = unittest.mock.Mock()
+        fast.transport.get_write_buffer_size.return_value = 0
+        self.view.clients.update([slow, fast])
+        self.view.broadcast(b'{}')
+        self.assertEquals(self.view.clients, {fast})
+        self.assertTrue(slow.close.called)
+        self.assertEquals(fast.write.call_count, 1)
@@ -1,5 +1,9 @@
 import collections
 import asyncio
+import heapq
+import itertools
+import struct
+import irc_pugbot.mumble
 
 CLASSES = ['scout', 'soldier', 'pyro', 'demoman', 'heavy', 'engineer', 'medic', 'sniper', 'spy']
 TEAMS = ['RED', 'BLU']
@@ -26,4 +30,179 @@ def run_briefly(loop):
     def once():
         pass
     t = asyncio.Task(once(), loop=loop)
-    loop.run_until_complete(t)
\ No newline at end of file
+    loop.run_until_complete(t)
+
+
+class VirtualLoop:
+    """Just enough of an event loop to run call_later timers on a virtual clock"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.scheduled = []
+        self.counter = itertools.count()
+
+    def time(self):
+        return self.now
+
+    def call_later(self, delay, callback, *args):
+        handle = asyncio.TimerHandle(self.now + delay, callback, args, self)
+        heapq.heappush(self.scheduled, (handle.when(), next(self.counter), handle))
+        return handle
+
+    def call_soon(self, callback, *args):
+        return self.call_later(0, callback, *args)
+
+    def _timer_handle_cancelled(self, handle):
+        pass
+
+    def get_debug(self):
+        return False
+
+    @property
+    def pending(self):
+        return sum(1 for _, _, handle in self.scheduled if not handle.cancelled())
+
+    def advance(self, seconds):
+        until = self.now + seconds
+        while self.scheduled and self.scheduled[0][0] <= until:
+            when, _, handle = heapq.heappop(self.scheduled)
+            self.now = max(self.now, when)
+            if not handle.cancelled():
+                handle._run()
+        self.now = until
+
+
+class FakeTf2Server:
+    """A2S_INFO over UDP and Source RCON over TCP on one localhost port"""
+
+    def __init__(self, loop, rcon_password='secret', players=0, bots=0, challenge=False):
+        self.loop = loop
+        self.rcon_password = rcon_password
+        self.players = players
+        self.bots = bots
+        self.challenge = b'\x01\x02\x03\x04' if challenge else None
+        self.silent = False
+        self.hang_up = False
+        self.queries = 0
+        self.commands = []
+        self.port = None
+        self.udp = None
+        self.tcp = None
+
+    @asyncio.coroutine
+    def start(self):
+        self.udp, _ = yield from self.loop.create_datagram_endpoint(
+            lambda: _A2SResponder(self), local_addr=('127.0.0.1', 0))
+        self.port = self.udp.get_extra_info('sockname')[1]
+        self.tcp = yield from asyncio.start_server(self.handle_rcon, '127.0.0.1', self.port, loop=self.loop)
+
+    def close(self):
+        self.udp.close()
+        self.tcp.close()
+
+    def info_reply(self):
+        strings = b''.join(s.encode() + b'\x00' for s in ['Fake TF2', 'cp_badlands', 'tf', 'Team Fortress'])
+        return (b'\xff\xff\xff\xffI\x11' + strings + struct.pack('<HBBB', 440, self.players, 24, self.bots) +
+                b'dl\x00\x01')
+
+    def query(self, data):
+        if self.silent or not data.startswith(b'\xff\xff\xff\xffTSource Engine Query\x00'):
+            return None
+        self.queries += 1
+        if self.challenge is not None and data[25:29] != self.challenge:
+            return b'\xff\xff\xff\xffA' + self.challenge
+        return self.info_reply()
+
+    @asyncio.coroutine
+    def handle_rcon(self, reader, writer):
+        authed = False
+        try:
+            while True:
+                size, = struct.unpack('<i', (yield from reader.readexactly(4)))
+                data = yield from reader.readexactly(size)
+                request_id, type_ = struct.unpack_from('<ii', data)
+                body = data[8:-2].decode()
+                if type_ == 3 and self.hang_up:
+                    break
+                if type_ == 3:
+                    authed = body == self.rcon_password
+                    writer.write(rcon_reply(request_id, 0, ''))
+                    writer.write(rcon_reply(request_id if authed else -1, 2, ''))
+                elif authed:
+                    self.commands.append(body)
+                    writer.write(rcon_reply(request_id, 0, ''))
+        except asyncio.IncompleteReadError:
+            pass
+        writer.close()
+
+
+def rcon_reply(request_id, type_, body):
+    payload = struct.pack('<ii', request_id, type_) + body.encode() + b'\x00\x00'
+    return struct.pack('<i', len(payload)) + payload
+
+
+class _A2SResponder(asyncio.DatagramProtocol):
+    def __init__(self, server):
+        self.server = server
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        reply = self.server.query(data)
+        if reply is not None:
+            self.transport.sendto(reply, addr)
+
+
+class FakeMumbleServer:
+    """Mumble control protocol over plain TCP with a fixed channel tree and user list"""
+
+    def __init__(self, loop, channels=('Root', 'RED', 'BLU'), users=()):
+        self.loop = loop
+        self.channels = list(channels)
+        self.users = list(users)
+        self.moves = []
+        self.logins = []
+        self.writers = []
+        self.reject = False
+        self.port = None
+        self.server = None
+
+    @asyncio.coroutine
+    def start(self):
+        self.server = yield from asyncio.start_server(self.handle, '127.0.0.1', 0, loop=self.loop)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    def close(self):
+        self.server.close()
+        self.drop()
+
+    def drop(self):
+        for writer in self.writers:
+            writer.close()
+        self.writers = []
+
+    @asyncio.coroutine
+    def handle(self, reader, writer):
+        self.writers.append(writer)
+        try:
+            while True:
+                type_, payload = yield from irc_pugbot.mumble.read_frame(reader)
+                fields = irc_pugbot.mumble.decode_fields(payload)
+                if type_ == irc_pugbot.mumble.AUTHENTICATE:
+                    self.logins.append(fields[1].decode())
+                    if self.reject:
+                        writer.write(irc_pugbot.mumble.frame(irc_pugbot.mumble.REJECT, [(1, 4), (2, 'server full')]))
+                        continue
+                    messages = [irc_pugbot.mumble.frame(irc_pugbot.mumble.CHANNEL_STATE, [(1, i), (3, name)])
+                                for i, name in enumerate(self.channels)]
+                    messages.extend(irc_pugbot.mumble.frame(irc_pugbot.mumble.USER_STATE, [(1, i + 1), (3, name), (5, 0)])
+                                    for i, name in enumerate(self.users))
+                    messages.append(irc_pugbot.mumble.frame(irc_pugbot.mumble.SERVER_SYNC, [(1, len(self.users) + 1)]))
+                    writer.write(b''.join(messages))
+                elif type_ == irc_pugbot.mumble.USER_STATE:
+                    self.moves.append((self.users[fields[1] - 1], self.channels[fields[5]]))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        writer.close()